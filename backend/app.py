@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import base64
 import copy
 import importlib.util
 import json
@@ -9,21 +10,22 @@ import secrets
 from collections import defaultdict, deque
 from collections.abc import AsyncIterator, AsyncGenerator
 from contextlib import asynccontextmanager
-from datetime import datetime, timezone
+from datetime import date, datetime, timezone
 from pathlib import Path
 from time import perf_counter
 from uuid import uuid4
 
-from typing import Callable, List, Optional
+from typing import Callable, Iterable, List, Optional
 import threading
 
 from fastapi import FastAPI, File, Form, HTTPException, Query, Request, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.encoders import jsonable_encoder
 from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from redis import Redis
 
-from backend.db import get_database
+from backend.db import get_async_database, get_database
 import backend.db as db_module
 from backend.idempotency import (
     InMemoryIdempotencyStore,
@@ -37,8 +39,20 @@ from backend.jobs import (
     run_generation_job,
     run_transcription_job,
 )
-from backend.chat import get_chat_response  # Import chat logic
-from backend.auth import get_current_user, hash_password, verify_password, create_jwt, verify_apple_token, verify_google_token
+from backend.chat import (  # Import chat logic
+    get_chat_response,
+    get_chat_responses_batch,
+    stream_chat_response,
+)
+from backend.auth import (
+    create_jwt,
+    get_current_user,
+    hash_password,
+    password_needs_rehash,
+    verify_apple_token,
+    verify_google_token,
+    verify_password,
+)
 from backend.iap_validation import (
     PRODUCT_CATALOG,
     get_product_list,
@@ -64,7 +78,10 @@ async def app_lifespan(_: FastAPI) -> AsyncIterator[None]:
     from backend.logging_config import configure_logging
     configure_logging()
     validate_runtime_environment("api")
+    _ensure_dirs()
     yield
+    db_module.close_pools()
+    await db_module.close_async_pools()
 
 
 app = FastAPI(title="Pegasus Lecture Copilot API", lifespan=app_lifespan)
@@ -90,7 +107,9 @@ async def request_context_middleware(request: Request, call_next):
     request.state.request_id = request_id
 
     started_at = perf_counter()
-    response = await call_next(request)
+    # Handlers chaining several lookups share one pooled connection.
+    with db_module.request_session():
+        response = await call_next(request)
     duration_ms = (perf_counter() - started_at) * 1000
 
     response.headers["x-request-id"] = request_id
@@ -246,12 +265,18 @@ def _remember_response(request: Request, operation: str, payload: dict, response
         response_payload=response_payload,
     )
 
+_STORAGE_SUBDIRS = ("audio", "documents", "metadata", "transcripts", "exports")
+_DIRS_READY_FOR: Optional[Path] = None
+
+
 def _ensure_dirs() -> None:
-    (STORAGE_DIR / "audio").mkdir(parents=True, exist_ok=True)
-    (STORAGE_DIR / "documents").mkdir(parents=True, exist_ok=True)
-    (STORAGE_DIR / "metadata").mkdir(parents=True, exist_ok=True)
-    (STORAGE_DIR / "transcripts").mkdir(parents=True, exist_ok=True)
-    (STORAGE_DIR / "exports").mkdir(parents=True, exist_ok=True)
+    """Create the storage subdirectories once per STORAGE_DIR (at startup)."""
+    global _DIRS_READY_FOR
+    if _DIRS_READY_FOR == STORAGE_DIR:
+        return
+    for name in _STORAGE_SUBDIRS:
+        (STORAGE_DIR / name).mkdir(parents=True, exist_ok=True)
+    _DIRS_READY_FOR = STORAGE_DIR
 
 
 
@@ -510,20 +535,73 @@ def _record_deletion_audit_event(
     if not callable(create_event):
         return None
 
-    event_id = str(uuid4())
-    create_event(
-        {
-            "id": event_id,
-            "entity_type": entity_type,
-            "entity_id": entity_id,
-            "actor": _request_actor(request),
-            "request_id": getattr(request.state, "request_id", None),
-            "purge_storage": purge_storage,
-            "result": copy.deepcopy(_deletion_audit_result_summary(entity_type, result)),
-            "created_at": _iso_now(),
-        }
+    event = _deletion_audit_event(
+        request=request,
+        entity_type=entity_type,
+        entity_id=entity_id,
+        purge_storage=purge_storage,
+        result=result,
     )
-    return event_id
+    create_event(event)
+    return event["id"]
+
+
+def _deletion_audit_event(
+    *,
+    request: Request,
+    entity_type: str,
+    entity_id: str,
+    purge_storage: bool,
+    result: dict,
+) -> dict:
+    return {
+        "id": str(uuid4()),
+        "entity_type": entity_type,
+        "entity_id": entity_id,
+        "actor": _request_actor(request),
+        "request_id": getattr(request.state, "request_id", None),
+        "purge_storage": purge_storage,
+        "result": copy.deepcopy(_deletion_audit_result_summary(entity_type, result)),
+        "created_at": _iso_now(),
+    }
+
+
+def _record_lecture_deletion_audit_events(
+    db,
+    *,
+    request: Request,
+    purge_storage: bool,
+    lecture_results: list[dict],
+) -> None:
+    """Audit a sweep's lecture deletions in one batch, tagging each result with its event id."""
+    create_events = getattr(db, "create_deletion_audit_events", None)
+    if not callable(create_events):
+        for lecture_result in lecture_results:
+            event_id = _record_deletion_audit_event(
+                db,
+                request=request,
+                entity_type="lecture",
+                entity_id=lecture_result["lectureId"],
+                purge_storage=purge_storage,
+                result=lecture_result,
+            )
+            if event_id:
+                lecture_result["auditEventId"] = event_id
+        return
+
+    events = [
+        _deletion_audit_event(
+            request=request,
+            entity_type="lecture",
+            entity_id=lecture_result["lectureId"],
+            purge_storage=purge_storage,
+            result=lecture_result,
+        )
+        for lecture_result in lecture_results
+    ]
+    create_events(events)
+    for lecture_result, event in zip(lecture_results, events):
+        lecture_result["auditEventId"] = event["id"]
 
 
 def _validate_deletion_entity_type(entity_type: Optional[str]) -> Optional[str]:
@@ -643,6 +721,7 @@ def _pagination_payload(
     offset: Optional[int],
     count: int,
     total: int,
+    last_row: Optional[dict] = None,
 ) -> dict:
     normalized_offset = offset or 0
     normalized_limit = limit if limit is not None else count
@@ -650,7 +729,7 @@ def _pagination_payload(
     has_more = normalized_offset + count < total
     next_offset = normalized_offset + count if has_more else None
     prev_offset = max(0, normalized_offset - page_size_for_prev) if normalized_offset > 0 else None
-    return {
+    payload = {
         "limit": limit,
         "offset": normalized_offset,
         "count": count,
@@ -659,10 +738,68 @@ def _pagination_payload(
         "nextOffset": next_offset,
         "prevOffset": prev_offset,
     }
+    next_cursor = _encode_cursor(last_row) if has_more and last_row else None
+    if next_cursor:
+        payload["nextCursor"] = next_cursor
+    return payload
+
+
+def _encode_cursor(row: dict) -> Optional[str]:
+    created_at, row_id = row.get("created_at"), row.get("id")
+    if created_at is None or row_id is None:
+        return None
+    if isinstance(created_at, datetime):
+        created_at = created_at.isoformat()
+    raw = json.dumps([str(created_at), str(row_id)], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, str]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return datetime.fromisoformat(created_at), str(row_id)
+    except (ValueError, TypeError) as exc:
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor.") from exc
+
+
+def _fetch_keyset_page(
+    db,
+    seek_method: str,
+    cursor: str,
+    limit: Optional[int],
+    offset: Optional[int],
+    *args,
+    **kwargs,
+) -> tuple[list[dict], dict]:
+    # Seek from the cursor row instead of skipping `offset` rows; no total is computed.
+    if offset:
+        raise HTTPException(status_code=400, detail="Use either cursor or offset, not both.")
+    seek = getattr(db, seek_method, None)
+    if not callable(seek):
+        raise HTTPException(status_code=400, detail="Cursor pagination is not supported.")
+    rows, has_more = seek(*args, before=_decode_cursor(cursor), limit=limit, **kwargs)
+    return rows, _keyset_pagination(rows, has_more, limit)
+
+
+def _keyset_pagination(rows: list[dict], has_more: bool, limit: Optional[int]) -> dict:
+    return {
+        "limit": limit,
+        "count": len(rows),
+        "hasMore": has_more,
+        "nextCursor": _encode_cursor(rows[-1]) if has_more and rows else None,
+    }
+
+
+def _iter_all_jobs(db) -> Iterable[dict]:
+    iter_jobs = getattr(db, "iter_jobs", None)
+    if callable(iter_jobs):
+        return iter_jobs()
+    return db.fetch_jobs() if hasattr(db, "fetch_jobs") else []
 
 
 def _queue_depth_snapshot(db) -> dict[str, int]:
-    jobs = db.fetch_jobs() if hasattr(db, "fetch_jobs") else []
+    jobs = _iter_all_jobs(db)
     depth = {"queued": 0, "running": 0, "failed": 0}
     for job in jobs:
         status = str(job.get("status") or "").strip().lower()
@@ -687,6 +824,21 @@ def _count_with_fallback(
     return len(fallback_rows)
 
 
+def _fetch_page(
+    db,
+    page_method: str,
+    fallback: Callable[[], tuple[list[dict], int]],
+    *args,
+    **kwargs,
+) -> tuple[list[dict], int]:
+    # Page and total from one count(*) over () query where the backend supports it.
+    pager = getattr(db, page_method, None)
+    if callable(pager):
+        rows, total = pager(*args, **kwargs)
+        return rows, int(total)
+    return fallback()
+
+
 @app.get("/ops/metrics")
 def ops_metrics() -> dict:
     db = get_database()
@@ -740,10 +892,11 @@ def readiness() -> JSONResponse:
             overall_status = "degraded"
             checks["queue"] = {"status": "error", "reason": str(exc)}
 
+    checked_at = _iso_now()
     try:
         _ensure_dirs()
         probe = STORAGE_DIR / ".ready"
-        probe.write_text(_iso_now(), encoding="utf-8")
+        probe.write_text(checked_at, encoding="utf-8")
         probe.unlink(missing_ok=True)
         checks["storage"] = {"status": "ok"}
     except Exception as exc:
@@ -755,7 +908,7 @@ def readiness() -> JSONResponse:
         status_code=status_code,
         content={
             "status": overall_status,
-            "time": _iso_now(),
+            "time": checked_at,
             "checks": checks,
         },
     )
@@ -994,7 +1147,7 @@ async def ingest_lecture(
     # Route to appropriate storage function based on file type
     if storage_path:
         stored_path = storage_path
-        LOGGER.info(f"Using provided storage path: {stored_path}")
+        LOGGER.info("Using provided storage path: %s", stored_path)
     else:
         try:
             if is_pdf:
@@ -1012,13 +1165,14 @@ async def ingest_lecture(
         except ValueError as exc:
             raise HTTPException(status_code=413, detail=str(exc)) from exc
 
+    now = _iso_now()
     metadata = {
         "id": lecture_id,
         "courseId": course_id,
         "presetId": preset_id,
         "title": title,
         "lectureMode": lecture_mode,
-        "recordedAt": _iso_now(),
+        "recordedAt": now,
         "durationSec": duration_sec,
         "audioSource": {
             "sourceType": source_type,
@@ -1030,8 +1184,8 @@ async def ingest_lecture(
         },
         "status": "uploaded",
         "artifacts": [],
-        "createdAt": _iso_now(),
-        "updatedAt": _iso_now(),
+        "createdAt": now,
+        "updatedAt": now,
     }
     metadata_path = STORAGE_DIR / "metadata" / f"{lecture_id}.json"
     metadata_path.write_text(json.dumps(metadata, indent=2), encoding="utf-8")
@@ -1040,8 +1194,8 @@ async def ingest_lecture(
         {
             "id": course_id,
             "title": course_title or course_id,
-            "created_at": _iso_now(),
-            "updated_at": _iso_now(),
+            "created_at": now,
+            "updated_at": now,
         }
     )
     db.upsert_lecture(
@@ -1054,8 +1208,8 @@ async def ingest_lecture(
             "audio_path": stored_path,
             "transcript_path": None,
             "source_type": file_type,
-            "created_at": _iso_now(),
-            "updated_at": _iso_now(),
+            "created_at": now,
+            "updated_at": now,
         }
     )
 
@@ -1102,8 +1256,12 @@ async def ingest_lecture(
 def list_courses(
     limit: Optional[int] = Query(default=None, ge=0),
     offset: Optional[int] = Query(default=None, ge=0),
+    cursor: Optional[str] = None,
 ) -> dict:
     db = get_database()
+    if cursor:
+        courses, pagination = _fetch_keyset_page(db, "fetch_courses_before", cursor, limit, offset)
+        return {"courses": courses, "pagination": pagination}
     courses = db.fetch_courses(limit=limit, offset=offset)
     total = _count_with_fallback(
         db,
@@ -1118,6 +1276,7 @@ def list_courses(
             offset=offset,
             count=len(courses),
             total=total,
+            last_row=courses[-1] if courses else None,
         ),
     }
 
@@ -1138,39 +1297,68 @@ def list_course_lectures(
     preset_id: Optional[str] = None,
     limit: Optional[int] = Query(default=None, ge=0),
     offset: Optional[int] = Query(default=None, ge=0),
+    cursor: Optional[str] = None,
 ) -> dict:
     if preset_id:
         _ensure_valid_preset_id(preset_id)
 
     db = get_database()
     _fetch_course_or_404(db, course_id)
-    lectures = db.fetch_lectures(
-        course_id=course_id,
-        status=status,
-        preset_id=preset_id,
-        limit=limit,
-        offset=offset,
-    )
-    total = _count_with_fallback(
-        db,
-        "count_lectures",
-        lectures,
-        course_id=course_id,
-        status=status,
-        preset_id=preset_id,
-        fallback_counter=lambda: len(
-            db.fetch_lectures(course_id=course_id, status=status, preset_id=preset_id)
-        ),
-    )
-    return {
-        "courseId": course_id,
-        "lectures": lectures,
-        "pagination": _pagination_payload(
+
+    def _separate_queries() -> tuple[list[dict], int]:
+        lectures = db.fetch_lectures(
+            course_id=course_id,
+            status=status,
+            preset_id=preset_id,
+            limit=limit,
+            offset=offset,
+        )
+        total = _count_with_fallback(
+            db,
+            "count_lectures",
+            lectures,
+            course_id=course_id,
+            status=status,
+            preset_id=preset_id,
+            fallback_counter=lambda: len(
+                db.fetch_lectures(course_id=course_id, status=status, preset_id=preset_id)
+            ),
+        )
+        return lectures, total
+
+    if cursor:
+        lectures, pagination = _fetch_keyset_page(
+            db,
+            "fetch_lectures_before",
+            cursor,
+            limit,
+            offset,
+            course_id=course_id,
+            status=status,
+            preset_id=preset_id,
+        )
+    else:
+        lectures, total = _fetch_page(
+            db,
+            "fetch_lectures_page",
+            _separate_queries,
+            course_id=course_id,
+            status=status,
+            preset_id=preset_id,
+            limit=limit,
+            offset=offset,
+        )
+        pagination = _pagination_payload(
             limit=limit,
             offset=offset,
             count=len(lectures),
             total=total,
-        ),
+            last_row=lectures[-1] if lectures else None,
+        )
+    return {
+        "courseId": course_id,
+        "lectures": lectures,
+        "pagination": pagination,
     }
 
 
@@ -1179,17 +1367,37 @@ def list_course_threads(
     course_id: str,
     limit: Optional[int] = Query(default=None, ge=0),
     offset: Optional[int] = Query(default=None, ge=0),
+    cursor: Optional[str] = None,
 ) -> dict:
     db = get_database()
     _fetch_course_or_404(db, course_id)
-    threads = db.fetch_threads_for_course(course_id, limit=limit, offset=offset)
-    total = _count_with_fallback(
-        db,
-        "count_threads_for_course",
-        threads,
-        course_id,
-        fallback_counter=lambda: len(db.fetch_threads_for_course(course_id)),
-    )
+
+    def _separate_queries() -> tuple[list[dict], int]:
+        threads = db.fetch_threads_for_course(course_id, limit=limit, offset=offset)
+        total = _count_with_fallback(
+            db,
+            "count_threads_for_course",
+            threads,
+            course_id,
+            fallback_counter=lambda: len(db.fetch_threads_for_course(course_id)),
+        )
+        return threads, total
+
+    if cursor:
+        threads, pagination = _fetch_keyset_page(
+            db, "fetch_threads_for_course_before", cursor, limit, offset, course_id
+        )
+    else:
+        threads, total = _fetch_page(
+            db, "fetch_threads_for_course_page", _separate_queries, course_id, limit=limit, offset=offset
+        )
+        pagination = _pagination_payload(
+            limit=limit,
+            offset=offset,
+            count=len(threads),
+            total=total,
+            last_row=threads[-1] if threads else None,
+        )
     # Build lectureTitles map from all lecture_refs across threads
     all_lecture_ids = set()
     for t in threads:
@@ -1205,12 +1413,7 @@ def list_course_threads(
         "courseId": course_id,
         "threads": threads,
         "lectureTitles": lecture_titles,
-        "pagination": _pagination_payload(
-            limit=limit,
-            offset=offset,
-            count=len(threads),
-            total=total,
-        ),
+        "pagination": pagination,
     }
 
 
@@ -1220,19 +1423,26 @@ def get_thread_detail(thread_id: str) -> dict:
     thread = db.fetch_thread_by_id(thread_id)
     if not thread:
         raise HTTPException(status_code=404, detail="Thread not found")
-    occurrences = db.fetch_thread_occurrences(thread_id)
-    updates = db.fetch_thread_updates_for_thread(thread_id)
-    # Build lectureTitles from thread refs + occurrence/update lecture_ids
+    fetch_activity = getattr(db, "fetch_thread_activity", None)
+    if callable(fetch_activity):
+        activity = fetch_activity(thread_id)
+        occurrences, updates = activity["occurrences"], activity["updates"]
+    else:
+        occurrences = db.fetch_thread_occurrences(thread_id)
+        updates = db.fetch_thread_updates_for_thread(thread_id)
+    # Build lectureTitles from thread refs + occurrence/update lecture_ids.
+    # Activity rows already carry their lecture's title from the join.
     all_lecture_ids = set()
     refs = thread.get("lecture_refs") or []
     if isinstance(refs, list):
         all_lecture_ids.update(refs)
-    for occ in occurrences:
-        all_lecture_ids.add(occ["lecture_id"])
-    for upd in updates:
-        all_lecture_ids.add(upd["lecture_id"])
     lecture_titles: dict[str, str] = {}
-    for lid in all_lecture_ids:
+    for row in (*occurrences, *updates):
+        if row.get("lecture_title"):
+            lecture_titles[row["lecture_id"]] = row["lecture_title"]
+        else:
+            all_lecture_ids.add(row["lecture_id"])
+    for lid in all_lecture_ids - lecture_titles.keys():
         lec = db.fetch_lecture(lid)
         if lec:
             lecture_titles[lid] = lec.get("title", lid)
@@ -1328,9 +1538,9 @@ def course_progress(course_id: str, include_lectures: bool = True) -> dict:
 
 
 @app.get("/lectures/{lecture_id}")
-def get_lecture(lecture_id: str) -> dict:
-    db = get_database()
-    lecture = db.fetch_lecture(lecture_id)
+async def get_lecture(lecture_id: str) -> dict:
+    db = get_async_database()
+    lecture = await db.fetch_lecture(lecture_id)
     if not lecture:
         raise HTTPException(status_code=404, detail="Lecture not found.")
     return lecture
@@ -1369,43 +1579,39 @@ def get_lecture_transcript(
     }
 
 @app.get("/lectures")
-def list_lectures(
+async def list_lectures(
     course_id: Optional[str] = None,
     status: Optional[str] = None,
     preset_id: Optional[str] = None,
     limit: Optional[int] = Query(default=None, ge=0),
     offset: Optional[int] = Query(default=None, ge=0),
+    cursor: Optional[str] = None,
 ) -> dict:
     if preset_id:
         _ensure_valid_preset_id(preset_id)
 
-    db = get_database()
-    lectures = db.fetch_lectures(
-        course_id=course_id,
-        status=status,
-        preset_id=preset_id,
-        limit=limit,
-        offset=offset,
-    )
-    total = _count_with_fallback(
-        db,
-        "count_lectures",
-        lectures,
-        course_id=course_id,
-        status=status,
-        preset_id=preset_id,
-        fallback_counter=lambda: len(
-            db.fetch_lectures(course_id=course_id, status=status, preset_id=preset_id)
-        ),
-    )
-    return {
-        "lectures": lectures,
-        "pagination": _pagination_payload(
+    db = get_async_database()
+    filters = {"course_id": course_id, "status": status, "preset_id": preset_id}
+
+    if cursor:
+        if offset:
+            raise HTTPException(status_code=400, detail="Use either cursor or offset, not both.")
+        lectures, has_more = await db.fetch_lectures_before(
+            before=_decode_cursor(cursor), limit=limit, **filters
+        )
+        pagination = _keyset_pagination(lectures, has_more, limit)
+    else:
+        lectures, total = await db.fetch_lectures_page(limit=limit, offset=offset, **filters)
+        pagination = _pagination_payload(
             limit=limit,
             offset=offset,
             count=len(lectures),
             total=total,
-        ),
+            last_row=lectures[-1] if lectures else None,
+        )
+    return {
+        "lectures": lectures,
+        "pagination": pagination,
     }
 
 
@@ -1705,19 +1911,14 @@ def delete_course(course_id: str, request: Request, purge_storage: bool = Query(
 
     lectures = db.fetch_lectures(course_id=course_id) if hasattr(db, "fetch_lectures") else []
     deleted_lectures: list[dict] = []
-    for lecture in lectures:
-        lecture_result = _delete_lecture_data(db, lecture["id"], purge_storage=purge_storage)
-        lecture_audit_event_id = _record_deletion_audit_event(
-            db,
-            request=request,
-            entity_type="lecture",
-            entity_id=lecture["id"],
-            purge_storage=purge_storage,
-            result=lecture_result,
+    try:
+        for lecture in lectures:
+            deleted_lectures.append(_delete_lecture_data(db, lecture["id"], purge_storage=purge_storage))
+    finally:
+        # Lectures already deleted are audited even if a later one fails.
+        _record_lecture_deletion_audit_events(
+            db, request=request, purge_storage=purge_storage, lecture_results=deleted_lectures
         )
-        if lecture_audit_event_id:
-            lecture_result["auditEventId"] = lecture_audit_event_id
-        deleted_lectures.append(lecture_result)
 
     delete_course_method = getattr(db, "delete_course", None)
     if not callable(delete_course_method):
@@ -1783,6 +1984,30 @@ def list_deletion_audit_events(
         ),
     }
 
+
+@app.get("/ops/deletion-audit/export")
+def export_deletion_audit_events(
+    request: Request,
+    entity_type: Optional[str] = Query(default=None),
+    entity_id: Optional[str] = Query(default=None),
+) -> StreamingResponse:
+    """Every matching deletion audit event as newline-delimited JSON, newest first."""
+    _enforce_write_auth(request)
+
+    normalized_entity_type = _validate_deletion_entity_type(entity_type)
+
+    db = get_database()
+    iter_events = getattr(db, "iter_deletion_audit_events", None)
+    if not callable(iter_events):
+        raise HTTPException(status_code=501, detail="Deletion audit storage is not configured.")
+
+    def lines():
+        for row in iter_events(entity_type=normalized_entity_type, entity_id=entity_id):
+            yield json.dumps(jsonable_encoder(row)) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
 @app.post("/jobs/{job_id}/replay")
 def replay_job(request: Request, job_id: str) -> dict:
     _enforce_write_auth(request)
@@ -1802,8 +2027,7 @@ def list_dead_letter_jobs(
     offset: Optional[int] = Query(default=None, ge=0),
 ) -> dict:
     db = get_database()
-    all_jobs = db.fetch_jobs()
-    failed_jobs = [job for job in all_jobs if _is_failed_job(job, lecture_id, job_type)]
+    failed_jobs = [job for job in _iter_all_jobs(db) if _is_failed_job(job, lecture_id, job_type)]
 
     start = offset or 0
     end = start + limit if limit is not None else None
@@ -1836,7 +2060,7 @@ def replay_dead_letter_jobs(
     _enforce_write_rate_limit(request)
 
     db = get_database()
-    failed_jobs = [job for job in db.fetch_jobs() if _is_failed_job(job, lecture_id, job_type)]
+    failed_jobs = [job for job in _iter_all_jobs(db) if _is_failed_job(job, lecture_id, job_type)]
     selected_jobs = failed_jobs[:limit] if limit is not None else failed_jobs
 
     replayed: list[dict] = []
@@ -1888,28 +2112,43 @@ def list_lecture_jobs(
     lecture_id: str,
     limit: Optional[int] = Query(default=None, ge=0),
     offset: Optional[int] = Query(default=None, ge=0),
+    cursor: Optional[str] = None,
 ) -> dict:
     db = get_database()
     lecture = db.fetch_lecture(lecture_id)
     if not lecture:
         raise HTTPException(status_code=404, detail="Lecture not found.")
-    jobs = db.fetch_jobs(lecture_id=lecture_id, limit=limit, offset=offset)
-    total = _count_with_fallback(
-        db,
-        "count_jobs",
-        jobs,
-        lecture_id=lecture_id,
-        fallback_counter=lambda: len(db.fetch_jobs(lecture_id=lecture_id)),
-    )
-    return {
-        "lectureId": lecture_id,
-        "jobs": [_job_api_payload(job) for job in jobs],
-        "pagination": _pagination_payload(
+
+    def _separate_queries() -> tuple[list[dict], int]:
+        jobs = db.fetch_jobs(lecture_id=lecture_id, limit=limit, offset=offset)
+        total = _count_with_fallback(
+            db,
+            "count_jobs",
+            jobs,
+            lecture_id=lecture_id,
+            fallback_counter=lambda: len(db.fetch_jobs(lecture_id=lecture_id)),
+        )
+        return jobs, total
+
+    if cursor:
+        jobs, pagination = _fetch_keyset_page(
+            db, "fetch_jobs_before", cursor, limit, offset, lecture_id=lecture_id
+        )
+    else:
+        jobs, total = _fetch_page(
+            db, "fetch_jobs_page", _separate_queries, lecture_id=lecture_id, limit=limit, offset=offset
+        )
+        pagination = _pagination_payload(
             limit=limit,
             offset=offset,
             count=len(jobs),
             total=total,
-        ),
+            last_row=jobs[-1] if jobs else None,
+        )
+    return {
+        "lectureId": lecture_id,
+        "jobs": [_job_api_payload(job) for job in jobs],
+        "pagination": pagination,
     }
 
 
@@ -1998,28 +2237,42 @@ def review_artifacts(
         _ensure_valid_preset_id(preset_id)
 
     db = get_database()
-    artifact_records = db.fetch_artifacts(
+
+    def _separate_queries() -> tuple[list[dict], int]:
+        artifact_records = db.fetch_artifacts(
+            lecture_id,
+            artifact_type=artifact_type,
+            preset_id=preset_id,
+            limit=limit,
+            offset=offset,
+        )
+        total = _count_with_fallback(
+            db,
+            "count_artifacts",
+            artifact_records,
+            lecture_id,
+            artifact_type=artifact_type,
+            preset_id=preset_id,
+            fallback_counter=lambda: len(
+                db.fetch_artifacts(
+                    lecture_id,
+                    artifact_type=artifact_type,
+                    preset_id=preset_id,
+                )
+            ),
+        )
+        return artifact_records, total
+
+    artifact_records, total = _fetch_page(
+        db,
+        "fetch_artifacts_page",
+        _separate_queries,
         lecture_id,
         artifact_type=artifact_type,
         preset_id=preset_id,
         limit=limit,
         offset=offset,
     )
-    total = _count_with_fallback(
-        db,
-        "count_artifacts",
-        artifact_records,
-        lecture_id,
-        artifact_type=artifact_type,
-        preset_id=preset_id,
-        fallback_counter=lambda: len(
-            db.fetch_artifacts(
-                lecture_id,
-                artifact_type=artifact_type,
-                preset_id=preset_id,
-            )
-        ),
-    )
     payload: dict[str, object] = {}
     artifact_paths: dict[str, str] = {}
     artifact_downloads: dict[str, str] = {}
@@ -2124,7 +2377,7 @@ def list_action_items(
                     "createdAt": artifact["created_at"],
                 })
         except Exception as e:
-            LOGGER.warning(f"Failed to load action items from {storage_path}: {e}")
+            LOGGER.warning("Failed to load action items from %s: %s", storage_path, e)
             continue
             
     return {"actionItems": items}
@@ -2135,15 +2388,21 @@ def list_action_items(
 def get_lecture_thread_metrics(request: Request, lecture_id: str):
     """Get thread detection metrics for a specific lecture."""
     db = get_database()
-    metrics = db_module.fetch_thread_metrics_by_lecture(db.conn, lecture_id)
+    with db.connect() as conn:
+        metrics = db_module.fetch_thread_metrics_by_lecture(conn, lecture_id)
     return {"metrics": metrics}
 
 
 @app.get("/courses/{course_id}/thread-metrics")
 def get_course_thread_metrics(request: Request, course_id: str, limit: int = 50):
-    """Get thread detection metrics for all lectures in a course."""
+    """Get thread detection metrics for all lectures in a course.
+
+    Rows carry the summary fields only; ``GET /thread-metrics/{metrics_id}``
+    returns one detection in full.
+    """
     db = get_database()
-    metrics = db_module.fetch_thread_metrics_by_course(db.conn, course_id, limit)
+    with db.connect() as conn:
+        metrics = db_module.fetch_thread_metrics_list(conn, course_id, limit)
     return {"metrics": metrics}
 
 
@@ -2151,7 +2410,8 @@ def get_course_thread_metrics(request: Request, course_id: str, limit: int = 50)
 def get_course_thread_metrics_summary(request: Request, course_id: str):
     """Get aggregated thread metrics summary for a course."""
     db = get_database()
-    summary = db_module.fetch_thread_metrics_summary(db.conn, course_id)
+    with db.connect() as conn:
+        summary = db_module.fetch_thread_metrics_summary(conn, course_id)
     return summary if summary else {"error": "No metrics found"}
 
 
@@ -2159,10 +2419,22 @@ def get_course_thread_metrics_summary(request: Request, course_id: str):
 def get_global_thread_metrics_summary(request: Request):
     """Get aggregated thread metrics summary across all courses."""
     db = get_database()
-    summary = db_module.fetch_thread_metrics_summary(db.conn, None)
+    with db.connect() as conn:
+        summary = db_module.fetch_thread_metrics_summary(conn, None)
     return summary if summary else {"error": "No metrics found"}
 
 
+@app.get("/thread-metrics/{metrics_id}")
+def get_thread_metric_detail(request: Request, metrics_id: str):
+    """Get every recorded metric for one thread detection run."""
+    db = get_database()
+    with db.connect() as conn:
+        metric = db_module.fetch_thread_metric_detail(conn, metrics_id)
+    if not metric:
+        raise HTTPException(status_code=404, detail="Thread metrics not found")
+    return metric
+
+
 # Context Files Upload Endpoint
 @app.post("/context/upload")
 async def upload_context_files(
@@ -2188,6 +2460,8 @@ async def upload_context_files(
     }
     
     uploaded_files = []
+    context_rows = []
+    now = _iso_now()
     
     for file in files:
         # Validate file size
@@ -2236,22 +2510,17 @@ async def upload_context_files(
             print(f"[ContextUpload] WARNING: Failed to extract text from {file.filename}: {e}")
             extracted_text = f"[Text extraction failed: {str(e)}]"
         
-        # Store metadata in database
-        db = get_database()
-        now = _iso_now()
-        
-        db_module.insert_context_file(
-            db.conn,
-            file_id=file_id,
-            course_id=course_id,
-            filename=file.filename,
-            file_path=str(file_path),
-            file_size=len(content),
-            file_type=content_type or ext,
-            tag=tag,
-            extracted_text=extracted_text,
-            created_at=now,
-        )
+        context_rows.append({
+            "file_id": file_id,
+            "course_id": course_id,
+            "filename": file.filename,
+            "file_path": str(file_path),
+            "file_size": len(content),
+            "file_type": content_type or ext,
+            "tag": tag,
+            "extracted_text": extracted_text,
+            "created_at": now,
+        })
         
         uploaded_files.append({
             "id": file_id,
@@ -2260,6 +2529,11 @@ async def upload_context_files(
             "tag": tag,
         })
     
+    # Store metadata in database, one pipelined batch for all files
+    db = get_database()
+    with db.connect() as conn:
+        db_module.bulk_insert_context_files(conn, context_rows)
+    
     return {"uploaded": uploaded_files}
 
 
@@ -2267,7 +2541,8 @@ async def upload_context_files(
 def get_context_files(request: Request, course_id: str | None = None, tag: str | None = None):
     """Get all context files, optionally filtered by course and/or tag."""
     db = get_database()
-    files = db_module.fetch_context_files(db.conn, course_id, tag)
+    with db.connect() as conn:
+        files = db_module.fetch_context_files(conn, course_id, tag)
     return {"files": files}
 
 
@@ -2277,7 +2552,8 @@ def delete_context_file(request: Request, file_id: str):
     _enforce_write_auth(request)
 
     db = get_database()
-    file_record = db_module.fetch_context_file_by_id(db.conn, file_id)
+    with db.connect() as conn:
+        file_record = db_module.fetch_context_file_by_id(conn, file_id)
 
     if not file_record:
         raise HTTPException(status_code=404, detail="File not found")
@@ -2288,7 +2564,8 @@ def delete_context_file(request: Request, file_id: str):
         file_path.unlink()
 
     # Delete from database
-    db_module.delete_context_file(db.conn, file_id)
+    with db.connect() as conn:
+        db_module.delete_context_file(conn, file_id)
 
     return {"message": "File deleted successfully"}
 
@@ -2372,25 +2649,64 @@ class SimpleChatRequest(BaseModel):
     context: Optional[dict] = None
 
 
-@app.post("/chat")
-def chat_endpoint(payload: SimpleChatRequest):
-    """Chat endpoint using OpenAI."""
-    from backend.chat import get_chat_response
+class ChatBatchRequest(BaseModel):
+    items: List[SimpleChatRequest]
 
-    context_str = ""
+
+MAX_CHAT_BATCH_ITEMS = 20
+
+
+def _chat_context(payload: SimpleChatRequest) -> str:
     if payload.context:
         course_id = payload.context.get("courseId", "")
         if course_id and course_id != "default-course":
-            context_str = f"Course ID: {course_id}"
+            return f"Course ID: {course_id}"
+    return ""
 
+
+@app.post("/chat")
+def chat_endpoint(payload: SimpleChatRequest):
+    """Chat endpoint using OpenAI."""
     response_text = get_chat_response(
         message=payload.message,
         history=payload.history,
-        context=context_str,
+        context=_chat_context(payload),
     )
     return {"response": response_text}
 
 
+@app.post("/chat/stream")
+def chat_stream_endpoint(payload: SimpleChatRequest):
+    """Server-sent events variant of /chat: one ``data:`` event per text delta."""
+    deltas = stream_chat_response(
+        message=payload.message,
+        history=payload.history,
+        context=_chat_context(payload),
+    )
+
+    def event_stream():
+        for delta in deltas:
+            yield f"data: {json.dumps({'delta': delta})}\n\n"
+        yield f"data: {json.dumps({'done': True})}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/chat/batch")
+async def chat_batch_endpoint(payload: ChatBatchRequest):
+    """Answer several chat turns concurrently; replies keep the request order."""
+    if len(payload.items) > MAX_CHAT_BATCH_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_CHAT_BATCH_ITEMS} chat items per batch.")
+    responses = await get_chat_responses_batch(
+        [(item.message, item.history, _chat_context(item)) for item in payload.items]
+    )
+    return {"responses": responses}
+
+
 # =========================================================================
 # Dice Rotation State Endpoints
 # =========================================================================
@@ -2604,9 +2920,16 @@ def auth_login(payload: LoginRequest):
     if not user:
         raise HTTPException(status_code=401, detail="Invalid email or password.")
 
-    if not verify_password(payload.password, user["password_hash"]):
+    if not user["password_hash"] or not verify_password(payload.password, user["password_hash"]):
         raise HTTPException(status_code=401, detail="Invalid email or password.")
 
+    # Upgrade legacy bcrypt hashes to Argon2id transparently on login.
+    if password_needs_rehash(user["password_hash"]):
+        try:
+            db.update_user_password_hash(user["id"], hash_password(payload.password))
+        except Exception as exc:
+            LOGGER.warning("Password rehash failed for user %s: %s", user["id"], exc)
+
     token = create_jwt(user["id"], user["email"])
     return {
         "token": token,
@@ -2708,13 +3031,24 @@ def auth_google(payload: GoogleAuthRequest):
 # Credits endpoints
 # =========================================================================
 
+def _parse_month(month: str) -> date:
+    try:
+        parsed = datetime.strptime(month, "%Y-%m")
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail="month must be YYYY-MM.") from exc
+    return parsed.date()
+
+
 @app.get("/credits/summary")
-def credits_summary(request: Request):
+def credits_summary(request: Request, month: Optional[str] = Query(default=None)):
+    """All-time usage, or usage from the start of ``month`` (``YYYY-MM``, UTC) onwards."""
     current_user = get_current_user(request)
     if not current_user:
         raise HTTPException(status_code=401, detail="Not authenticated.")
     db = get_database()
-    return db.fetch_user_credits_summary(current_user["id"])
+    if month is None:
+        return db.fetch_user_credits_summary(current_user["id"])
+    return db.fetch_user_credits_summary(current_user["id"], since_month=_parse_month(month))
 
 
 @app.get("/credits/history")
@@ -2775,6 +3109,14 @@ class GooglePurchaseRequest(BaseModel):
     product_id: str
 
 
+def _already_processed_purchase(db, user_id: str, tokens_granted: int) -> dict:
+    return {
+        "status": "already_processed",
+        "tokensGranted": tokens_granted,
+        "balance": db.get_user_token_balance(user_id),
+    }
+
+
 @app.post("/purchases/verify-apple")
 def verify_apple_purchase(request: Request, payload: ApplePurchaseRequest):
     current_user = get_current_user(request)
@@ -2787,11 +3129,7 @@ def verify_apple_purchase(request: Request, payload: ApplePurchaseRequest):
     # Idempotency: check if we already processed this transaction
     existing = db.fetch_purchase_receipt_by_txn_id(payload.transaction_id)
     if existing:
-        return {
-            "status": "already_processed",
-            "tokensGranted": existing["tokens_granted"],
-            "balance": db.get_user_token_balance(user_id),
-        }
+        return _already_processed_purchase(db, user_id, existing["tokens_granted"])
 
     # Validate receipt with Apple
     result = validate_apple_receipt(payload.transaction_id, payload.receipt_data)
@@ -2807,7 +3145,7 @@ def verify_apple_purchase(request: Request, payload: ApplePurchaseRequest):
     receipt_id = str(uuid4())
 
     # Store receipt and grant tokens
-    db.insert_purchase_receipt(
+    inserted = db.insert_purchase_receipt(
         receipt_id=receipt_id,
         user_id=user_id,
         platform="apple",
@@ -2817,6 +3155,9 @@ def verify_apple_purchase(request: Request, payload: ApplePurchaseRequest):
         tokens_granted=tokens,
         price_usd=price_usd,
     )
+    if not inserted:
+        # A concurrent retry recorded this transaction first and granted its tokens.
+        return _already_processed_purchase(db, user_id, tokens)
     balance = db.grant_purchased_tokens(user_id, tokens, receipt_id)
 
     return {
@@ -2845,11 +3186,7 @@ def verify_google_purchase(request: Request, payload: GooglePurchaseRequest):
     # Idempotency
     existing = db.fetch_purchase_receipt_by_txn_id(order_id)
     if existing:
-        return {
-            "status": "already_processed",
-            "tokensGranted": existing["tokens_granted"],
-            "balance": db.get_user_token_balance(user_id),
-        }
+        return _already_processed_purchase(db, user_id, existing["tokens_granted"])
 
     product_id = result["product_id"]
     tokens = get_product_tokens(product_id)
@@ -2859,7 +3196,7 @@ def verify_google_purchase(request: Request, payload: GooglePurchaseRequest):
     price_usd = PRODUCT_CATALOG[product_id]["price_usd"]
     receipt_id = str(uuid4())
 
-    db.insert_purchase_receipt(
+    inserted = db.insert_purchase_receipt(
         receipt_id=receipt_id,
         user_id=user_id,
         platform="google",
@@ -2869,6 +3206,9 @@ def verify_google_purchase(request: Request, payload: GooglePurchaseRequest):
         tokens_granted=tokens,
         price_usd=price_usd,
     )
+    if not inserted:
+        # A concurrent retry recorded this transaction first and granted its tokens.
+        return _already_processed_purchase(db, user_id, tokens)
     balance = db.grant_purchased_tokens(user_id, tokens, receipt_id)
 
     return {
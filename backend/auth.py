@@ -4,12 +4,16 @@ from __future__ import annotations
 
 import logging
 import os
+import threading
+import time
 from datetime import datetime, timezone, timedelta
 from typing import Any, Dict, Optional
 
 import bcrypt
 import httpx
 import jwt
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
 from fastapi import Request
 
 
@@ -19,8 +23,27 @@ JWT_SECRET_ENV = "PLC_JWT_SECRET"
 JWT_ALGORITHM = "HS256"
 JWT_EXPIRY_DAYS = 30
 
-# Cache Apple JWKS to avoid fetching on every request
-_apple_jwks_cache: dict | None = None
+# Argon2id for new password hashes. Legacy bcrypt hashes ("$2a$"/"$2b$"/"$2y$")
+# still verify and are upgraded on the next successful login.
+_PASSWORD_HASHER = PasswordHasher(time_cost=2, memory_cost=64 * 1024, parallelism=2)
+_BCRYPT_PREFIXES = ("$2a$", "$2b$", "$2y$")
+
+# Shared HTTP client so OAuth verification reuses keep-alive connections
+# instead of paying a fresh TCP/TLS handshake on every login; HTTP/2 like the
+# chat clients.
+_HTTPX_CLIENT = httpx.Client(
+    http2=True,
+    timeout=10,
+    limits=httpx.Limits(max_keepalive_connections=20),
+)
+
+APPLE_JWKS_URL = "https://appleid.apple.com/auth/keys"
+APPLE_JWKS_TTL_SECONDS = 6 * 60 * 60
+
+GOOGLE_JWKS_URL = "https://www.googleapis.com/oauth2/v3/certs"
+GOOGLE_JWKS_TTL_SECONDS = 60 * 60
+GOOGLE_TOKENINFO_URL = "https://oauth2.googleapis.com/tokeninfo"
+GOOGLE_ISSUERS = ["https://accounts.google.com", "accounts.google.com"]
 
 
 def _get_jwt_secret() -> str:
@@ -31,11 +54,26 @@ def _get_jwt_secret() -> str:
 
 
 def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+    return _PASSWORD_HASHER.hash(password)
 
 
 def verify_password(password: str, password_hash: str) -> bool:
-    return bcrypt.checkpw(password.encode("utf-8"), password_hash.encode("utf-8"))
+    if password_hash.startswith(_BCRYPT_PREFIXES):
+        return bcrypt.checkpw(password.encode("utf-8"), password_hash.encode("utf-8"))
+    try:
+        return _PASSWORD_HASHER.verify(password_hash, password)
+    except (VerificationError, InvalidHashError):
+        return False
+
+
+def password_needs_rehash(password_hash: str) -> bool:
+    """True for legacy bcrypt hashes or Argon2 hashes with outdated parameters."""
+    if password_hash.startswith(_BCRYPT_PREFIXES):
+        return True
+    try:
+        return _PASSWORD_HASHER.check_needs_rehash(password_hash)
+    except InvalidHashError:
+        return True
 
 
 def create_jwt(user_id: str, email: str) -> str:
@@ -69,15 +107,76 @@ def get_current_user(request: Request) -> Optional[Dict[str, Any]]:
 # Apple Sign-In verification
 # =========================================================================
 
-def _fetch_apple_jwks() -> dict:
-    """Fetch Apple's public keys (JWKS) for verifying identity tokens."""
-    global _apple_jwks_cache
-    if _apple_jwks_cache is not None:
-        return _apple_jwks_cache
-    resp = httpx.get("https://appleid.apple.com/auth/keys", timeout=10)
-    resp.raise_for_status()
-    _apple_jwks_cache = resp.json()
-    return _apple_jwks_cache
+def _parse_jwks(jwks: dict) -> Dict[str, Any]:
+    """Parse every RSA key in a JWKS document into ``{kid: public_key}``."""
+    keys: Dict[str, Any] = {}
+    for key_data in jwks.get("keys", []):
+        kid = key_data.get("kid")
+        if not kid:
+            continue
+        try:
+            keys[kid] = jwt.algorithms.RSAAlgorithm.from_jwk(key_data)
+        except (jwt.InvalidKeyError, ValueError, TypeError) as exc:
+            LOGGER.warning("Skipping unparseable JWKS key kid=%s: %s", kid, exc)
+    return keys
+
+
+def _cache_control_max_age(resp: httpx.Response) -> Optional[int]:
+    for directive in resp.headers.get("cache-control", "").split(","):
+        name, _, value = directive.strip().partition("=")
+        if name.lower() == "max-age" and value.isdigit():
+            return int(value)
+    return None
+
+
+class _JWKSCache:
+    """Thread-safe JWKS cache holding the parsed public keys keyed by ``kid``.
+
+    Entries expire after the response's ``Cache-Control: max-age`` (or
+    ``default_ttl_seconds`` when absent); concurrent refreshes are collapsed
+    into a single upstream request.
+    """
+
+    def __init__(self, url: str, default_ttl_seconds: int) -> None:
+        self.url = url
+        self.default_ttl_seconds = default_ttl_seconds
+        self._lock = threading.Lock()
+        self._jwks: dict | None = None
+        self._keys: Dict[str, Any] = {}
+        self._expires_at = 0.0
+
+    def clear(self) -> None:
+        with self._lock:
+            self._jwks = None
+            self._keys = {}
+            self._expires_at = 0.0
+
+    def fetch(self, force_refresh: bool = False) -> dict:
+        with self._lock:
+            if self._jwks is not None and not force_refresh and time.monotonic() < self._expires_at:
+                return self._jwks
+            resp = _HTTPX_CLIENT.get(self.url)
+            resp.raise_for_status()
+            jwks = resp.json()
+            ttl = _cache_control_max_age(resp)
+            self._keys = _parse_jwks(jwks)
+            self._jwks = jwks
+            self._expires_at = time.monotonic() + (ttl if ttl is not None else self.default_ttl_seconds)
+            return jwks
+
+    def get_key(self, kid: str) -> Any:
+        """Return the public key for ``kid``, refreshing once on a miss."""
+        self.fetch()
+        public_key = self._keys.get(kid)
+        if public_key is None:
+            # Refresh cache in case the provider rotated keys
+            self.fetch(force_refresh=True)
+            public_key = self._keys.get(kid)
+        return public_key
+
+
+_APPLE_JWKS = _JWKSCache(APPLE_JWKS_URL, APPLE_JWKS_TTL_SECONDS)
+_GOOGLE_JWKS = _JWKSCache(GOOGLE_JWKS_URL, GOOGLE_JWKS_TTL_SECONDS)
 
 
 def verify_apple_token(identity_token: str) -> Dict[str, Any]:
@@ -96,30 +195,10 @@ def verify_apple_token(identity_token: str) -> Dict[str, Any]:
     if not kid:
         raise ValueError("Apple token missing 'kid' header.")
 
-    # Fetch Apple's public keys and find the matching one
-    jwks = _fetch_apple_jwks()
-    matching_key = None
-    for key_data in jwks.get("keys", []):
-        if key_data.get("kid") == kid:
-            matching_key = key_data
-            break
-
-    if not matching_key:
-        # Refresh cache in case Apple rotated keys
-        global _apple_jwks_cache
-        _apple_jwks_cache = None
-        jwks = _fetch_apple_jwks()
-        for key_data in jwks.get("keys", []):
-            if key_data.get("kid") == kid:
-                matching_key = key_data
-                break
-
-    if not matching_key:
+    public_key = _APPLE_JWKS.get_key(kid)
+    if public_key is None:
         raise ValueError(f"No matching Apple public key for kid={kid}")
 
-    # Build the public key and verify the token
-    public_key = jwt.algorithms.RSAAlgorithm.from_jwk(matching_key)
-
     bundle_id = os.getenv("APPLE_BUNDLE_ID", "")
     try:
         payload = jwt.decode(
@@ -145,17 +224,22 @@ def verify_apple_token(identity_token: str) -> Dict[str, Any]:
 # Google Sign-In verification
 # =========================================================================
 
-def verify_google_token(id_token: str) -> Dict[str, Any]:
-    """Verify a Google ID token via Google's tokeninfo endpoint.
+def _google_user(claims: Dict[str, Any]) -> Dict[str, Any]:
+    email = claims.get("email")
+    sub = claims.get("sub")
+    if not email or not sub:
+        raise ValueError("Google token missing email or sub.")
 
-    Returns: { "email": str, "sub": str, "name": str | None }
-    Raises: ValueError on verification failure.
-    """
-    resp = httpx.get(
-        "https://oauth2.googleapis.com/tokeninfo",
-        params={"id_token": id_token},
-        timeout=10,
-    )
+    return {
+        "email": email,
+        "sub": sub,
+        "name": claims.get("name"),
+    }
+
+
+def _verify_google_token_remote(id_token: str) -> Dict[str, Any]:
+    """Verify a Google ID token via Google's tokeninfo endpoint."""
+    resp = _HTTPX_CLIENT.get(GOOGLE_TOKENINFO_URL, params={"id_token": id_token})
     if resp.status_code != 200:
         raise ValueError(f"Google token verification failed: {resp.text}")
 
@@ -166,13 +250,44 @@ def verify_google_token(id_token: str) -> Dict[str, Any]:
     if google_client_id and data.get("aud") != google_client_id:
         raise ValueError("Google token audience mismatch.")
 
-    email = data.get("email")
-    sub = data.get("sub")
-    if not email or not sub:
-        raise ValueError("Google token missing email or sub.")
+    return _google_user(data)
 
-    return {
-        "email": email,
-        "sub": sub,
-        "name": data.get("name"),
-    }
+
+def verify_google_token(id_token: str) -> Dict[str, Any]:
+    """Verify a Google ID token (RS256 JWT) locally against Google's JWKS.
+
+    Falls back to the tokeninfo endpoint only when no matching signing key
+    can be found (or the JWKS cannot be fetched).
+
+    Returns: { "email": str, "sub": str, "name": str | None }
+    Raises: ValueError on verification failure.
+    """
+    try:
+        unverified_header = jwt.get_unverified_header(id_token)
+    except jwt.DecodeError as exc:
+        raise ValueError(f"Invalid Google token format: {exc}") from exc
+
+    kid = unverified_header.get("kid")
+    public_key = None
+    if kid:
+        try:
+            public_key = _GOOGLE_JWKS.get_key(kid)
+        except httpx.HTTPError as exc:
+            LOGGER.warning("Google JWKS fetch failed, falling back to tokeninfo: %s", exc)
+    if public_key is None:
+        return _verify_google_token_remote(id_token)
+
+    google_client_id = os.getenv("GOOGLE_OAUTH_CLIENT_ID", "")
+    try:
+        payload = jwt.decode(
+            id_token,
+            public_key,
+            algorithms=["RS256"],
+            audience=google_client_id if google_client_id else None,
+            issuer=GOOGLE_ISSUERS,
+            options={"verify_aud": bool(google_client_id)},
+        )
+    except jwt.InvalidTokenError as exc:
+        raise ValueError(f"Google token verification failed: {exc}") from exc
+
+    return _google_user(payload)
@@ -1,9 +1,19 @@
-import os
+import asyncio
+import functools
+import hashlib
+import json
 import logging
+import os
+from typing import Iterator, Optional
+
+import numpy as np
+
+from backend import semantic_cache
+from backend.observability import METRICS
 
 LOGGER = logging.getLogger("pegasus.chat")
 
-SYSTEM_INSTRUCTION = """You are Pegasus.
+SYSTEM_INSTRUCTION_VERBOSE = """You are Pegasus.
 
 At all times, your reasoning, outputs, and decisions must be grounded in the Dice Protocol.
 
@@ -33,74 +43,429 @@ Help the user retain, understand, and meaningfully integrate knowledge they have
 
 If a request conflicts with the Dice Protocol, gently reframe the response so it aligns with the protocol rather than rejecting the request outright."""
 
+# Compact structured form of SYSTEM_INSTRUCTION_VERBOSE (same rules, roughly
+# 40% fewer input tokens); it is prefilled on every chat turn.
+SYSTEM_INSTRUCTION = """<role>You are Pegasus. Always ground reasoning and replies in the Dice Protocol, even if unmentioned.</role>
+<dice>Red=past/grounding/what; Orange=action/process/how; Yellow=present/structure/when; Green=reflection/integration/where; Blue=context/systems/who; Purple=meaning/ethics/why</dice>
+<rules>
+- Orient on Dice first; balance time, direction, cognitive load; prioritise clarity, accessibility and safeguarding for neurodivergent users.
+- Never use all dimensions at once; stabilise (Red/Orange/Yellow) before abstract (Blue/Purple).
+- If uncertain, re-ground; don't speculate.
+- Reflect at least one dimension per reply.
+- Gently reframe conflicting requests; don't refuse.
+</rules>
+<mission>Help users retain, understand and integrate knowledge they paid for; reduce overload; preserve agency.</mission>"""
+
+
+@functools.lru_cache(maxsize=128)
+def _system_content(instruction: str, context: str) -> str:
+    return f"{instruction}\n\nContext:\n{context}" if context else instruction
+
+
+@functools.lru_cache(maxsize=128)
+def _system_message(system_content: str) -> dict:
+    """Shared system message per prompt, so repeat turns on a course reuse one dict."""
+    return {"role": "system", "content": system_content}
 
-def get_chat_response(message: str, history: list, context: str = "") -> str:
+
+# Transient failures (connection errors, 408/409/429, 5xx) are retried by the
+# SDK with jittered exponential backoff (0.5s doubling, capped at 8s).
+_MAX_RETRIES = int(os.getenv("PLC_CHAT_MAX_RETRIES", "3"))
+
+
+@functools.lru_cache(maxsize=1)
+def _openai_client():
+    """Process-wide OpenAI client so chat calls share one HTTP/2 connection pool.
+
+    Built lazily (not at import) so the app can start without OPENAI_API_KEY.
+    """
+    import httpx
+    from openai import OpenAI
+
+    http_client = httpx.Client(
+        http2=True,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=100, keepalive_expiry=30.0),
+        timeout=httpx.Timeout(60.0, connect=5.0),
+    )
+    return OpenAI(http_client=http_client, max_retries=_MAX_RETRIES)
+
+
+@functools.lru_cache(maxsize=1)
+def _async_openai_client():
+    """AsyncOpenAI counterpart of ``_openai_client`` for concurrent batch turns."""
+    import httpx
+    from openai import AsyncOpenAI
+
+    http_client = httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=100, keepalive_expiry=30.0),
+        timeout=httpx.Timeout(60.0, connect=5.0),
+    )
+    return AsyncOpenAI(http_client=http_client, max_retries=_MAX_RETRIES)
+
+
+@functools.lru_cache(maxsize=4)
+def _gemini_client(project: str, location: str):
+    """Vertex AI client cached per project/location to avoid re-auth per call."""
+    from google import genai
+
+    return genai.Client(vertexai=True, project=project, location=location)
+
+
+_EMBEDDING_MODEL = "text-embedding-3-small"
+_FALLBACK_REPLY = "I'm having trouble connecting right now. Please try again later."
+
+
+# Chat configuration is read once at import; deployments set these per process.
+_PROVIDER = os.getenv("PLC_LLM_PROVIDER", "openai").strip().lower()
+_MODEL_NAME = os.getenv("PLC_CHAT_MODEL") or os.getenv("PLC_LLM_MODEL") or "gpt-4o-mini"
+_INSTRUCTION = (
+    SYSTEM_INSTRUCTION_VERBOSE
+    if os.getenv("PLC_CHAT_VERBOSE_PROMPT", "").strip().lower() in {"1", "true", "yes", "on"}
+    else SYSTEM_INSTRUCTION
+)
+_HISTORY_TOKEN_BUDGET = int(os.getenv("PLC_HISTORY_TOKEN_BUDGET", "3000"))
+_GEMINI_PROJECT = os.getenv("GOOGLE_CLOUD_PROJECT", "delta-student-486911-n5")
+_GEMINI_REGION = os.getenv("PLC_GENAI_REGION", "us-central1")
+
+
+def _chat_settings(context: str, model: Optional[str] = None) -> tuple[str, str, str]:
+    return _PROVIDER, model or _MODEL_NAME, _system_content(_INSTRUCTION, context)
+
+
+def get_chat_response(message: str, history: list, context: str = "", model: Optional[str] = None) -> str:
     """
     Generates a response for a chat message, given history and context.
-    Uses the configured LLM provider (Gemini or OpenAI).
+    Uses the configured LLM provider (Gemini or OpenAI); ``model`` overrides
+    the configured chat model for this call.
     """
-    provider = os.getenv("PLC_LLM_PROVIDER", "openai").strip().lower()
-    model_name = os.getenv("PLC_CHAT_MODEL", os.getenv("PLC_LLM_MODEL", "gpt-4o-mini"))
-
-    system_content = SYSTEM_INSTRUCTION
-    if context:
-        system_content += f"\n\nContext:\n{context}"
+    provider, model_name, system_content = _chat_settings(context, model)
 
     if provider in ("gemini", "google"):
         return _chat_gemini(message, history, system_content, model_name)
-    return _chat_openai(message, history, system_content, model_name)
 
+    messages = _openai_messages(message, history, system_content)
+    exact_key = _exact_cache_key(model_name, messages)
+    cached = _cached_exact_reply(exact_key)
+    if cached is not None:
+        return cached
 
-def _chat_openai(message: str, history: list, system_content: str, model_name: str) -> str:
-    from openai import OpenAI
+    cache_key = _semantic_cache_key(model_name, message, history, context)
+    cached = _cached_reply(cache_key)
+    if cached is not None:
+        return cached
+
+    reply = _chat_openai(messages, model_name)
+    _remember_reply(cache_key, reply, exact_key)
+    return reply
+
+
+def stream_chat_response(
+    message: str, history: list, context: str = "", model: Optional[str] = None
+) -> Iterator[str]:
+    """
+    Streaming variant of ``get_chat_response``: yields text deltas as the
+    provider produces them so callers can forward them immediately.
+    """
+    provider, model_name, system_content = _chat_settings(context, model)
+
+    if provider in ("gemini", "google"):
+        return _stream_gemini(message, history, system_content, model_name)
+
+    messages = _openai_messages(message, history, system_content)
+    exact_key = _exact_cache_key(model_name, messages)
+    cached = _cached_exact_reply(exact_key)
+    if cached is not None:
+        return iter((cached,))
+
+    cache_key = _semantic_cache_key(model_name, message, history, context)
+    cached = _cached_reply(cache_key)
+    if cached is not None:
+        return iter((cached,))
+
+    deltas = _stream_openai(messages, model_name)
+    if cache_key is None and exact_key is None:
+        return deltas
+    return _stream_and_remember(cache_key, deltas, exact_key)
+
+
+async def get_chat_responses_batch(items: list[tuple[str, list, str]]) -> list[str]:
+    """
+    Answers several ``(message, history, context)`` turns concurrently and
+    returns the replies in input order. Failed turns get the fallback reply.
+    """
+    return list(await asyncio.gather(*(_achat_one(*item) for item in items)))
+
+
+def submit_chat_batch(items: list[dict], model: Optional[str] = None) -> str:
+    """
+    Queues chat turns on the OpenAI Batch API (24h window, half the price of
+    synchronous calls) for bulk, non-interactive work. Each item needs a
+    ``custom_id`` and ``message``, with optional ``history`` and ``context``.
+    Returns the batch id for ``poll_batch`` / ``fetch_batch_results``.
+    """
+    lines = []
+    for item in items:
+        _provider, model_name, system_content = _chat_settings(item.get("context", ""), model)
+        lines.append(json.dumps({
+            "custom_id": item["custom_id"],
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {
+                "model": model_name,
+                "messages": _openai_messages(item["message"], item.get("history", []), system_content),
+            },
+        }, separators=(",", ":"), ensure_ascii=False))
+
+    client = _openai_client()
+    batch_file = client.files.create(
+        file=("chat-batch.jsonl", ("\n".join(lines) + "\n").encode("utf-8")),
+        purpose="batch",
+    )
+    batch = client.batches.create(
+        input_file_id=batch_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h",
+    )
+    return batch.id
+
+
+def poll_batch(batch_id: str) -> dict:
+    batch = _openai_client().batches.retrieve(batch_id)
+    counts = batch.request_counts
+    return {
+        "id": batch.id,
+        "status": batch.status,
+        "completed": counts.completed if counts else 0,
+        "failed": counts.failed if counts else 0,
+        "total": counts.total if counts else 0,
+        "output_file_id": batch.output_file_id,
+    }
+
+
+def fetch_batch_results(batch_id: str) -> dict[str, Optional[str]]:
+    """Reply text per ``custom_id``; ``None`` for requests that errored."""
+    client = _openai_client()
+    batch = client.batches.retrieve(batch_id)
+    if not batch.output_file_id:
+        raise RuntimeError(f"Batch {batch_id} has no output yet (status: {batch.status}).")
 
-    client = OpenAI()
-    messages = [{"role": "system", "content": system_content}]
-    for msg in history:
-        role = "user" if msg.get("isUser") else "assistant"
-        messages.append({"role": role, "content": msg.get("text", "")})
-    messages.append({"role": "user", "content": message})
+    results: dict[str, Optional[str]] = {}
+    for line in client.files.content(batch.output_file_id).text.splitlines():
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        response = record.get("response") or {}
+        choices = (response.get("body") or {}).get("choices") or []
+        if response.get("status_code") == 200 and choices:
+            results[record["custom_id"]] = choices[0]["message"].get("content") or ""
+        else:
+            results[record["custom_id"]] = None
+    return results
 
+
+async def _achat_one(message: str, history: list, context: str) -> str:
+    provider, model_name, system_content = _chat_settings(context)
+
+    if provider in ("gemini", "google"):
+        return await _achat_gemini(message, history, system_content, model_name)
+    return await _achat_openai(_openai_messages(message, history, system_content), model_name)
+
+
+def _stream_and_remember(
+    cache_key: Optional[tuple[str, np.ndarray]], deltas: Iterator[str], exact_key: Optional[str] = None
+) -> Iterator[str]:
+    parts = []
+    for delta in deltas:
+        parts.append(delta)
+        yield delta
+    # A failed stream ends with the fallback reply; never cache that.
+    if parts and parts[-1] != _FALLBACK_REPLY:
+        _remember_reply(cache_key, "".join(parts), exact_key)
+
+
+def _semantic_cache_key(
+    model_name: str, message: str, history: list, context: str
+) -> Optional[tuple[str, np.ndarray]]:
+    """Embed ``message`` for the semantic cache; ``None`` when caching is off or unavailable."""
+    if not semantic_cache.semantic_cache_enabled():
+        return None
+    # Long conversations embed mostly shared topic, so paraphrase hits there are
+    # unreliable; skip the lookup (and the embedding call) entirely.
+    if len(history) > semantic_cache.max_history_turns():
+        METRICS.increment_chat_cache("skipped")
+        return None
     try:
+        response = _openai_client().embeddings.create(model=_EMBEDDING_MODEL, input=message)
+        vector = semantic_cache.normalize(response.data[0].embedding)
+    except Exception as e:
+        LOGGER.warning("Chat semantic cache embedding failed: %s", e)
+        return None
+    return semantic_cache.cache_namespace(model_name, context, history), vector
+
+
+def _exact_cache_key(model_name: str, messages: list[dict]) -> Optional[str]:
+    if not semantic_cache.exact_cache_enabled():
+        return None
+    payload = json.dumps({"m": model_name, "msgs": messages}, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _cached_exact_reply(exact_key: Optional[str]) -> Optional[str]:
+    if exact_key is None:
+        return None
+    cached = semantic_cache.lookup_exact(exact_key)
+    METRICS.increment_chat_cache("exact_miss" if cached is None else "exact_hit")
+    return cached
+
+
+def _cached_reply(cache_key: Optional[tuple[str, np.ndarray]]) -> Optional[str]:
+    if cache_key is None:
+        return None
+    cached = semantic_cache.lookup(*cache_key)
+    METRICS.increment_chat_cache("miss" if cached is None else "hit")
+    return cached
+
+
+def _remember_reply(
+    cache_key: Optional[tuple[str, np.ndarray]], reply: str, exact_key: Optional[str] = None
+) -> None:
+    if not reply or reply == _FALLBACK_REPLY:
+        return
+    if cache_key is not None:
+        semantic_cache.insert(*cache_key, reply)
+    if exact_key is not None:
+        semantic_cache.insert_exact(exact_key, reply)
+
+
+def _estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English BPE, plus per-message framing.
+    return len(text) // 4 + 4
+
+
+def _trim_history(history: list) -> list:
+    """Newest turns of ``history`` that fit in PLC_HISTORY_TOKEN_BUDGET (oldest dropped first)."""
+    budget = _HISTORY_TOKEN_BUDGET
+    kept = 0
+    used = 0
+    for msg in reversed(history):
+        used += _estimate_tokens(msg.get("text", ""))
+        if used > budget:
+            break
+        kept += 1
+    return history[len(history) - kept:]
+
+
+def _openai_messages(message: str, history: list, system_content: str) -> list[dict]:
+    return [
+        _system_message(system_content),
+        *[{"role": "user" if msg.get("isUser") else "assistant", "content": msg.get("text", "")}
+          for msg in _trim_history(history)],
+        {"role": "user", "content": message},
+    ]
+
+
+def _log_request(model_name: str, messages: list[dict]) -> None:
+    # repr() of a long history is costly; only build it when DEBUG is on.
+    if LOGGER.isEnabledFor(logging.DEBUG):
+        LOGGER.debug("Chat request model=%s messages=%r", model_name, messages)
+
+
+def _chat_openai(messages: list[dict], model_name: str) -> str:
+    _log_request(model_name, messages)
+    try:
+        client = _openai_client()
         response = client.chat.completions.create(model=model_name, messages=messages)
         if not response.choices:
             LOGGER.error("OpenAI returned empty choices list")
-            return "I'm having trouble connecting right now. Please try again later."
+            return _FALLBACK_REPLY
         return response.choices[0].message.content or ""
     except Exception as e:
         LOGGER.error("OpenAI Chat Error: %s", e)
-        return "I'm having trouble connecting right now. Please try again later."
+        return _FALLBACK_REPLY
 
 
-def _chat_gemini(message: str, history: list, system_content: str, model_name: str) -> str:
-    from google import genai
-    from google.genai import types
+async def _achat_openai(messages: list[dict], model_name: str) -> str:
+    _log_request(model_name, messages)
+    try:
+        client = _async_openai_client()
+        response = await client.chat.completions.create(model=model_name, messages=messages)
+        if not response.choices:
+            LOGGER.error("OpenAI returned empty choices list")
+            return _FALLBACK_REPLY
+        return response.choices[0].message.content or ""
+    except Exception as e:
+        LOGGER.error("OpenAI Chat Error: %s", e)
+        return _FALLBACK_REPLY
 
-    client = genai.Client(
-        vertexai=True,
-        project=os.getenv("GOOGLE_CLOUD_PROJECT", "delta-student-486911-n5"),
-        location=os.getenv("PLC_GENAI_REGION", "us-central1"),
-    )
 
-    contents = []
-    for msg in history:
-        role = "model" if not msg.get("isUser") else "user"
-        contents.append(types.Content(
-            role=role,
+def _stream_openai(messages: list[dict], model_name: str) -> Iterator[str]:
+    _log_request(model_name, messages)
+    try:
+        client = _openai_client()
+        stream = client.chat.completions.create(model=model_name, messages=messages, stream=True)
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
+    except Exception as e:
+        LOGGER.error("OpenAI Chat Stream Error: %s", e)
+        yield _FALLBACK_REPLY
+
+
+def _gemini_request(message: str, history: list, system_content: str):
+    from google.genai import types
+
+    contents = [
+        *[types.Content(
+            role="user" if msg.get("isUser") else "model",
             parts=[types.Part.from_text(text=msg.get("text", ""))],
-        ))
-    contents.append(types.Content(
-        role="user",
-        parts=[types.Part.from_text(text=message)],
-    ))
+        ) for msg in _trim_history(history)],
+        types.Content(
+            role="user",
+            parts=[types.Part.from_text(text=message)],
+        ),
+    ]
 
     config = types.GenerateContentConfig(system_instruction=system_content)
+    client = _gemini_client(_GEMINI_PROJECT, _GEMINI_REGION)
+    return client, contents, config
+
 
+def _chat_gemini(message: str, history: list, system_content: str, model_name: str) -> str:
     try:
+        client, contents, config = _gemini_request(message, history, system_content)
         response = client.models.generate_content(
             model=model_name, contents=contents, config=config,
         )
         return response.text or ""
     except Exception as e:
         LOGGER.error("Gemini Chat Error: %s", e)
-        return "I'm having trouble connecting right now. Please try again later."
+        return _FALLBACK_REPLY
+
+
+async def _achat_gemini(message: str, history: list, system_content: str, model_name: str) -> str:
+    try:
+        client, contents, config = _gemini_request(message, history, system_content)
+        response = await client.aio.models.generate_content(
+            model=model_name, contents=contents, config=config,
+        )
+        return response.text or ""
+    except Exception as e:
+        LOGGER.error("Gemini Chat Error: %s", e)
+        return _FALLBACK_REPLY
+
+
+def _stream_gemini(message: str, history: list, system_content: str, model_name: str) -> Iterator[str]:
+    try:
+        client, contents, config = _gemini_request(message, history, system_content)
+        for chunk in client.models.generate_content_stream(
+            model=model_name, contents=contents, config=config,
+        ):
+            if chunk.text:
+                yield chunk.text
+    except Exception as e:
+        LOGGER.error("Gemini Chat Stream Error: %s", e)
+        yield _FALLBACK_REPLY
@@ -1,14 +1,493 @@
 from __future__ import annotations
 
+import atexit
 import os
+import re
+import threading
+import time
+import uuid
+from contextlib import ExitStack, contextmanager, nullcontext
+from collections import OrderedDict
+from contextvars import ContextVar
 from dataclasses import dataclass
-from datetime import datetime, timezone
+from functools import cache, lru_cache
+from datetime import date, datetime
+from decimal import Decimal
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Iterator, Optional
 
 import psycopg
-from psycopg.rows import dict_row
-from psycopg.types.json import Jsonb
+from psycopg.rows import dict_row, no_result, tuple_row
+from psycopg.types.numeric import FloatLoader
+from psycopg.types.json import Jsonb, set_json_dumps, set_json_loads
+from psycopg_pool import AsyncConnectionPool, ConnectionPool
+
+try:
+    import orjson
+except ImportError:  # optional: psycopg falls back to the stdlib json module
+    orjson = None
+
+# Explicit select lists: rows only carry the columns the API serves, and a new
+# wide column never silently starts riding along on every list query.
+LECTURE_COLUMNS = (
+    "id, course_id, preset_id, title, status, audio_path, transcript_path, "
+    "source_type, user_id, created_at, updated_at"
+)
+JOB_COLUMNS = "id, lecture_id, job_type, status, result, error, created_at, updated_at"
+ARTIFACT_COLUMNS = (
+    "id, lecture_id, course_id, preset_id, artifact_type, storage_path, "
+    "summary_overview, summary_section_count, created_at"
+)
+# List views skip evolution_notes (JSONB history); fetch_thread_by_id returns it.
+THREAD_LIST_COLUMNS = "id, course_id, title, summary, status, complexity_level, lecture_refs, face, created_at"
+THREAD_COLUMNS = f"{THREAD_LIST_COLUMNS}, evolution_notes"
+DELETION_AUDIT_COLUMNS = "id, entity_type, entity_id, actor, request_id, purge_storage, result, created_at"
+# Everything but receipt_data: the raw store receipt is kept for disputes, never read back.
+PURCHASE_RECEIPT_COLUMNS = (
+    "id, user_id, platform, product_id, transaction_id, tokens_granted, price_usd, status, created_at"
+)
+
+
+# Static statements are built once at import; the dynamic list queries come
+# from lru_cache'd builders keyed on which filters are present, so each call
+# reuses one interned string (and psycopg's prepared statement for it).
+_FETCH_LECTURE_SQL = f"select {LECTURE_COLUMNS} from lectures where id = %s;"
+_FETCH_JOB_SQL = f"select {JOB_COLUMNS} from jobs where id = %s;"
+_FETCH_THREAD_SQL = f"select {THREAD_COLUMNS} from threads where id = %s;"
+_FETCH_THREADS_FOR_LECTURE_SQL = (
+    f"select {THREAD_LIST_COLUMNS} from threads where lecture_refs @> %s order by created_at desc;"
+)
+_RECENT_FIRST = "created_at desc, id desc"
+# Occurrences and updates for the thread detail view in one statement. The two
+# row shapes are padded to a common column list; fetch_thread_activity drops
+# the other kind's columns again.
+_THREAD_ACTIVITY_ONLY = {
+    "occurrences": ("change_type", "summary", "details"),
+    "updates": ("artifact_id", "evidence", "confidence"),
+}
+_FETCH_THREAD_ACTIVITY_SQL = """
+    select 'occurrences' as kind, o.id, o.thread_id, o.course_id, o.lecture_id, o.captured_at,
+        o.artifact_id, o.evidence, o.confidence,
+        null::text as change_type, null::text as summary, null::jsonb as details,
+        l.title as lecture_title
+    from thread_occurrences o
+    left join lectures l on o.lecture_id = l.id
+    where o.thread_id = %(thread_id)s
+    union all
+    select 'updates' as kind, u.id, u.thread_id, u.course_id, u.lecture_id, u.captured_at,
+        null::text, null::text, null::real,
+        u.change_type, u.summary, u.details,
+        l.title
+    from thread_updates u
+    left join lectures l on u.lecture_id = l.id
+    where u.thread_id = %(thread_id)s
+    order by kind, captured_at asc;
+"""
+# Balance change and its token_transactions audit row in one statement: the
+# insert reads the post-update balances straight from the update's RETURNING.
+_CREDIT_PURCHASED_TOKENS_SQL = """
+    with updated as (
+        update users
+        set purchased_token_balance = purchased_token_balance + %(amount)s
+        where id = %(user_id)s
+        returning free_token_balance, purchased_token_balance
+    )
+    insert into token_transactions (id, user_id, transaction_type, token_amount,
+        balance_after_free, balance_after_purchased, reference_id, description)
+    select %(txn_id)s, %(user_id)s, %(transaction_type)s, %(amount)s,
+        free_token_balance, purchased_token_balance, %(reference_id)s, %(description)s
+    from updated
+    returning balance_after_free as free_token_balance, balance_after_purchased as purchased_token_balance;
+"""
+# Deduct (free first, then purchased) and log in one statement. The balance
+# guard sits in the UPDATE's WHERE, so concurrent reservations serialise on the
+# row update itself rather than an explicit lock. No row: unknown user; null
+# balances: not enough tokens (``available`` is the pre-update total).
+_RESERVE_TOKENS_SQL = """
+    with updated as (
+        update users
+        set free_token_balance = free_token_balance - least(free_token_balance, %(amount)s),
+            purchased_token_balance = purchased_token_balance
+                - (%(amount)s - least(free_token_balance, %(amount)s))
+        where id = %(user_id)s and free_token_balance + purchased_token_balance >= %(amount)s
+        returning free_token_balance, purchased_token_balance
+    ),
+    logged as (
+        insert into token_transactions (id, user_id, transaction_type, token_amount,
+            balance_after_free, balance_after_purchased, reference_id, description)
+        select %(txn_id)s, %(user_id)s, 'generation_reserve', -%(amount)s,
+            free_token_balance, purchased_token_balance, NULL, 'Token reservation for generation'
+        from updated
+    )
+    select users.free_token_balance + users.purchased_token_balance as available,
+        updated.free_token_balance as balance_after_free,
+        updated.purchased_token_balance as balance_after_purchased
+    from users
+    left join updated on true
+    where users.id = %(user_id)s;
+"""
+# Read the balance, applying (and logging) the lazy monthly free-token reset
+# when the last one is 30+ days old. The reset only touches the row when it is
+# due and re-checks the date on the row it updates, so two racing reads grant
+# the allowance once and the common path takes no lock at all.
+_TOKEN_BALANCE_SQL = """
+    with balance as (
+        select free_token_balance, purchased_token_balance, free_tokens_reset_at
+        from users where id = %(user_id)s
+    ),
+    reset as (
+        update users
+        set free_token_balance = %(allowance)s, free_tokens_reset_at = now()
+        where id = %(user_id)s and free_tokens_reset_at <= now() - interval '30 days'
+        returning free_token_balance, purchased_token_balance, free_tokens_reset_at
+    ),
+    logged as (
+        insert into token_transactions (id, user_id, transaction_type, token_amount,
+            balance_after_free, balance_after_purchased, reference_id, description)
+        select %(txn_id)s, %(user_id)s, 'free_grant', %(allowance)s,
+            free_token_balance, purchased_token_balance, NULL, 'Monthly free token reset'
+        from reset
+    )
+    select coalesce(reset.free_token_balance, balance.free_token_balance) as free_token_balance,
+        coalesce(reset.purchased_token_balance, balance.purchased_token_balance) as purchased_token_balance,
+        coalesce(reset.free_tokens_reset_at, balance.free_tokens_reset_at) as free_tokens_reset_at
+    from balance
+    left join reset on true;
+"""
+_LOG_TOKEN_DEDUCTION_SQL = """
+    insert into token_transactions (id, user_id, transaction_type, token_amount,
+        balance_after_free, balance_after_purchased, reference_id, description)
+    select %(txn_id)s, id, 'generation_deduct', %(amount)s,
+        free_token_balance, purchased_token_balance, %(reference_id)s, %(description)s
+    from users where id = %(user_id)s;
+"""
+_CREDITS_SUMMARY_SQL = """
+    select llm_model, prompt_tokens, completion_tokens, total_tokens, cost_usd, generation_count
+    from credit_ledger_summary where user_id = %(user_id)s
+    order by cost_usd desc;
+"""
+_CREDITS_SUMMARY_SINCE_SQL = """
+    select llm_model,
+        sum(prompt_tokens)::bigint as prompt_tokens,
+        sum(completion_tokens)::bigint as completion_tokens,
+        sum(total_tokens)::bigint as total_tokens,
+        sum(cost_usd) as cost_usd,
+        sum(generation_count)::bigint as generation_count
+    from credit_ledger_monthly_rollup
+    where user_id = %(user_id)s and month >= %(month)s
+    group by llm_model
+    order by cost_usd desc;
+"""
+_CREDIT_LEDGER_COPY_SQL = (
+    "copy credit_ledger (id, user_id, lecture_id, job_id, llm_provider, llm_model, "
+    "prompt_tokens, completion_tokens, total_tokens, estimated_cost_usd) from stdin with (format binary)"
+)
+# Binary COPY needs the exact column types: Python ints would otherwise go out
+# as int8, and the numeric cost must arrive as a Decimal.
+_CREDIT_LEDGER_COPY_TYPES = ["text", "text", "text", "text", "text", "text", "int4", "int4", "int4", "numeric"]
+# One statement for every combination of fields update_job is given: a None
+# parameter leaves its column as is, so the plan is prepared once.
+_UPDATE_JOB_SQL = """
+    update jobs set
+        status = coalesce(%(status)s, status),
+        result = coalesce(%(result)s, result),
+        error = coalesce(%(error)s, error),
+        updated_at = coalesce(%(updated_at)s, updated_at)
+    where id = %(id)s;
+"""
+# Every per-lecture delete as one statement: one parse, one round-trip, and
+# atomic without an explicit transaction.
+_DELETE_LECTURE_RECORDS_SQL = """
+    with occurrences as (delete from thread_occurrences where lecture_id = %(lecture_id)s returning 1),
+    updates as (delete from thread_updates where lecture_id = %(lecture_id)s returning 1),
+    artifacts as (delete from artifacts where lecture_id = %(lecture_id)s returning 1),
+    exports as (delete from exports where lecture_id = %(lecture_id)s returning 1),
+    jobs as (delete from jobs where lecture_id = %(lecture_id)s returning 1),
+    lectures as (delete from lectures where id = %(lecture_id)s returning 1)
+    select
+        (select count(*) from occurrences) as thread_occurrences,
+        (select count(*) from updates) as thread_updates,
+        (select count(*) from artifacts) as artifacts,
+        (select count(*) from exports) as exports,
+        (select count(*) from jobs) as jobs,
+        (select count(*) from lectures) as lectures;
+"""
+
+
+def _present(filters: Dict[str, Any]) -> Dict[str, Any]:
+    """The truthy entries of ``filters``; their keys pick the cached SQL shape."""
+    return {column: value for column, value in filters.items() if value}
+
+
+def _paging_params(params: Dict[str, Any], limit: Optional[int], offset: Optional[int]) -> Dict[str, Any]:
+    if limit is not None:
+        params["limit"] = limit
+    if offset is not None:
+        params["offset"] = offset
+    return params
+
+
+@lru_cache(maxsize=256)
+def _where_sql(filters: tuple[str, ...], seek: bool = False) -> str:
+    """`` where a = %(a)s and ...``, optionally seeking past ``(before_created_at, before_id)``."""
+    clauses = [f"{column} = %({column})s" for column in filters]
+    if seek:
+        clauses.append("(created_at, id) < (%(before_created_at)s, %(before_id)s)")
+    return f" where {' and '.join(clauses)}" if clauses else ""
+
+
+@lru_cache(maxsize=256)
+def _select_sql(
+    table: str,
+    columns: str,
+    filters: tuple[str, ...],
+    order_by: str,
+    *,
+    has_limit: bool = False,
+    has_offset: bool = False,
+    seek: bool = False,
+    window_total: bool = False,
+) -> str:
+    total = ", count(*) over () as _total" if window_total else ""
+    limit_clause = (" limit %(limit)s" if has_limit else "") + (" offset %(offset)s" if has_offset else "")
+    return f"select {columns}{total} from {table}{_where_sql(filters, seek)} order by {order_by}{limit_clause};"
+
+
+@lru_cache(maxsize=128)
+def _count_sql(table: str, filters: tuple[str, ...]) -> str:
+    return f"select count(*) as total from {table}{_where_sql(filters)};"
+
+
+# Postgres caps a statement at 65535 bind parameters; multi-row upserts are
+# split into batches of at most this many rows.
+_MAX_BIND_PARAMS = 65535
+_BULK_UPSERT_ROWS = 5000
+
+
+@lru_cache(maxsize=64)
+def _bulk_upsert_sql(table: str, columns: tuple[str, ...], updates: tuple[str, ...], rows: int) -> str:
+    row = f"({', '.join(['%s'] * len(columns))})"
+    set_clause = ", ".join(f"{column} = excluded.{column}" for column in updates)
+    return (
+        f"insert into {table} ({', '.join(columns)}) values {', '.join([row] * rows)} "
+        f"on conflict (id) do update set {set_clause};"
+    )
+
+
+def _last_per_id(payloads: list[Dict[str, Any]]) -> list[Dict[str, Any]]:
+    # One statement cannot upsert the same id twice; keep the last, as sequential upserts would.
+    return list({payload["id"]: payload for payload in payloads}.values())
+
+
+@cache
+def _migrations() -> tuple[tuple[str, str], ...]:
+    """``(file name, sql)`` for every migration, read once per process.
+
+    The directory only changes on deploy, so later ``migrate()`` calls touch the
+    database alone.
+    """
+    migrations_dir = Path(__file__).resolve().parent / "migrations"
+    return tuple(
+        (path.name, path.read_text(encoding="utf-8")) for path in sorted(migrations_dir.glob("*.sql"))
+    )
+
+
+_MIGRATION_LOCK_ID = 727272
+# Range-partitioned by month of created_at (migration 019).
+_PARTITIONED_LEDGERS = ("credit_ledger", "token_transactions")
+_CONCURRENT_DDL = re.compile(r"\bconcurrently\b", re.IGNORECASE)
+
+
+def _pending_migrations(cur, migrations: tuple[tuple[str, str], ...]) -> list[tuple[str, str]]:
+    cur.execute("select id from schema_migrations order by id;")
+    applied = {row["id"] for row in cur.fetchall()}
+    return [migration for migration in migrations if migration[0] not in applied]
+
+
+def _migration_batches(pending: list[tuple[str, str]]) -> list[tuple[bool, list[tuple[str, str]]]]:
+    """Group consecutive migrations into ``(transactional, migrations)`` batches.
+
+    ``create index concurrently`` cannot run inside a transaction, so such a
+    migration forms a non-transactional batch of its own.
+    """
+    batches: list[tuple[bool, list[tuple[str, str]]]] = []
+    for migration in pending:
+        transactional = not _CONCURRENT_DDL.search(migration[1])
+        if transactional and batches and batches[-1][0]:
+            batches[-1][1].append(migration)
+        else:
+            batches.append((transactional, [migration]))
+    return batches
+
+
+_AUDIT_EXPORT_BATCH = 2000
+_DELETION_AUDIT_KEYS = tuple(column.strip() for column in DELETION_AUDIT_COLUMNS.split(","))
+_INSERT_DELETION_AUDIT_SQL = (
+    f"insert into deletion_audit_events ({DELETION_AUDIT_COLUMNS}) "
+    f"values ({', '.join(f'%({column})s' for column in _DELETION_AUDIT_KEYS)});"
+)
+_DELETION_AUDIT_COPY_SQL = f"copy deletion_audit_events ({DELETION_AUDIT_COLUMNS}) from stdin"
+# COPY's setup costs more than it saves on a handful of rows.
+_AUDIT_COPY_ROWS = 64
+
+
+def _deletion_audit_params(payload: Dict[str, Any]) -> Dict[str, Any]:
+    return {**payload, "result": Jsonb(payload.get("result") or {})}
+
+
+def _count(cur) -> int:
+    """The ``total`` column of a ``select count(*) as total`` query."""
+    row = cur.fetchone()
+    return int(row["total"]) if row else 0
+
+
+# One pool per DSN for the whole process; Database instances are cheap views onto it.
+_POOLS: dict[str, ConnectionPool] = {}
+_POOLS_LOCK = threading.Lock()
+# Checked-out connections are pinged first, so one dropped by a failover or an
+# idle timeout upstream is replaced instead of failing the caller's query.
+_CHECK_CONNECTION = ConnectionPool.check_connection
+
+
+def _prepare_threshold() -> Optional[int]:
+    """Executions before psycopg server-prepares a query; 0 prepares on first use.
+
+    Set PLC_DB_PREPARE_THRESHOLD=none behind poolers that cannot track prepared
+    statements (e.g. pgbouncer < 1.21 in transaction mode). Multi-statement
+    strings, such as migration files, must pass ``prepare=False`` to execute.
+    """
+    raw_value = os.getenv("PLC_DB_PREPARE_THRESHOLD", "0").strip().lower()
+    if raw_value in {"none", "off", "disable", "disabled"}:
+        return None
+    return int(raw_value)
+
+
+def _orjson_dumps(obj: Any) -> bytes:
+    # Non-string keys (e.g. complexity levels) are stringified, as json.dumps does.
+    return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+
+
+def _configure_connection(conn: psycopg.Connection) -> None:
+    # Money columns are fixed-scale numeric; reading them as float serves them
+    # as JSON numbers directly instead of Decimals rounded per row.
+    conn.adapters.register_loader("numeric", FloatLoader)
+    # json/jsonb values (Jsonb-wrapped dicts such as a rotation's full_state)
+    # go through orjson in both directions when it is installed.
+    if orjson is not None:
+        set_json_loads(orjson.loads, conn)
+        set_json_dumps(_orjson_dumps, conn)
+
+
+def _pool_for(dsn: str) -> ConnectionPool:
+    pool = _POOLS.get(dsn)
+    if pool is not None:
+        return pool
+    with _POOLS_LOCK:
+        pool = _POOLS.get(dsn)
+        if pool is None:
+            pool = ConnectionPool(
+                dsn,
+                min_size=int(os.getenv("PLC_DB_POOL_MIN_SIZE", "4")),
+                max_size=int(os.getenv("PLC_DB_POOL_MAX_SIZE", "20")),
+                kwargs={
+                    "row_factory": dict_row,
+                    "autocommit": True,
+                    "prepare_threshold": _prepare_threshold(),
+                },
+                configure=_configure_connection,
+                check=_CHECK_CONNECTION,
+                max_idle=float(os.getenv("PLC_DB_POOL_MAX_IDLE_SEC", "300")),
+                timeout=float(os.getenv("PLC_DB_POOL_TIMEOUT_SEC", "30")),
+                name="pegasus-db",
+                open=True,
+            )
+            _POOLS[dsn] = pool
+    return pool
+
+
+class _Session:
+    """One pooled connection shared by every query inside ``Database.session()``.
+
+    Checked out lazily, so a request that never touches the database never
+    holds a connection.
+    """
+
+    def __init__(self, dsn: str) -> None:
+        self.dsn = dsn
+        self.active = True
+        self._stack = ExitStack()
+        self._conn: Optional[psycopg.Connection] = None
+
+    def connection(self) -> psycopg.Connection:
+        if self._conn is None:
+            self._conn = self._stack.enter_context(_pool_for(self.dsn).connection())
+        return self._conn
+
+    def release(self) -> None:
+        """Return the connection to the pool; the next query checks out a fresh one."""
+        self._conn = None
+        self._stack.close()
+
+
+_SESSION: ContextVar[Optional[_Session]] = ContextVar("pegasus_db_session", default=None)
+
+
+def close_pools() -> None:
+    with _POOLS_LOCK:
+        pools = list(_POOLS.values())
+        _POOLS.clear()
+    for pool in pools:
+        pool.close()
+
+
+# Scripts and workers that never run the app lifespan still close their pools.
+atexit.register(close_pools)
+
+
+class _UserTTLCache:
+    """Per-user read cache for dashboard polling; writers call ``invalidate``.
+
+    Process-local: another worker's write is seen once the entry expires.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: OrderedDict[tuple[str, str], tuple[float, Dict[str, Any]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, dsn: str, user_id: str) -> Optional[Dict[str, Any]]:
+        key = (dsn, user_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() >= entry[0]:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return dict(entry[1])
+
+    def put(self, dsn: str, user_id: str, value: Dict[str, Any]) -> None:
+        key = (dsn, user_id)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, dict(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, dsn: str, user_id: str) -> None:
+        with self._lock:
+            self._entries.pop((dsn, user_id), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+_USER_CACHE_TTL_SECONDS = float(os.getenv("PLC_USER_CACHE_TTL_SEC", "15"))
+_CREDITS_SUMMARY_CACHE = _UserTTLCache(_USER_CACHE_TTL_SECONDS, 10_000)
+_TOKEN_BALANCE_CACHE = _UserTTLCache(_USER_CACHE_TTL_SECONDS, 10_000)
 
 
 @dataclass(frozen=True)
@@ -16,7 +495,35 @@ class Database:
     dsn: str
 
     def connect(self):
-        return psycopg.connect(self.dsn, row_factory=dict_row, autocommit=True)
+        """Check out a pooled autocommit connection; it is returned when the block exits.
+
+        Inside ``session()`` every call yields the session's connection instead.
+        """
+        session = _SESSION.get()
+        if session is not None and session.active and session.dsn == self.dsn:
+            return nullcontext(session.connection())
+        return _pool_for(self.dsn).connection()
+
+    @contextmanager
+    def session(self) -> Iterator[Database]:
+        """Run every query issued in the block on one pooled connection.
+
+        Saves a pool checkout per call when a handler chains several lookups.
+        Nested sessions reuse the outer one.
+        """
+        if _SESSION.get() is not None:
+            yield self
+            return
+        session = _Session(self.dsn)
+        token = _SESSION.set(session)
+        try:
+            yield self
+        finally:
+            # Work that outlives the block (e.g. a streamed response body)
+            # sees an inactive session and checks out its own connection.
+            session.active = False
+            _SESSION.reset(token)
+            session.release()
 
     def healthcheck(self) -> None:
         with self.connect() as conn:
@@ -25,31 +532,145 @@ class Database:
                 cur.fetchone()
 
     def migrate(self) -> None:
-        migrations_dir = Path(__file__).resolve().parent / "migrations"
-        migrations = sorted(migrations_dir.glob("*.sql"))
+        """Apply pending migrations under an advisory lock, committing each batch once."""
+        migrations = _migrations()
         if not migrations:
             return
         with self.connect() as conn:
             with conn.cursor() as cur:
-                cur.execute(
-                    """
-                    create table if not exists schema_migrations (
-                        id text primary key,
-                        applied_at timestamptz not null default now()
-                    );
-                    """
-                )
-                cur.execute("select id from schema_migrations order by id;")
-                applied = {row["id"] for row in cur.fetchall()}
-                for migration in migrations:
-                    migration_id = migration.name
-                    if migration_id in applied:
-                        continue
-                    sql = migration.read_text(encoding="utf-8")
-                    cur.execute(sql)
+                # Only a fresh database lacks the table, so the DDL is skipped
+                # on every other start (autocommit: the failed select is harmless).
+                try:
+                    pending = _pending_migrations(cur, migrations)
+                except psycopg.errors.UndefinedTable:
+                    cur.execute(
+                        """
+                        create table if not exists schema_migrations (
+                            id text primary key,
+                            applied_at timestamptz not null default now()
+                        );
+                        """
+                    )
+                    pending = list(migrations)
+                if not pending:
+                    return
+                # Serialises workers starting together; the loser re-reads and finds nothing left.
+                cur.execute("select pg_advisory_lock(%s);", (_MIGRATION_LOCK_ID,))
+                try:
+                    for transactional, batch in _migration_batches(_pending_migrations(cur, migrations)):
+                        with conn.transaction() if transactional else nullcontext():
+                            for migration_id, sql in batch:
+                                # A file holds several statements, which Postgres
+                                # refuses to prepare; the pool prepares on first use.
+                                cur.execute(sql, prepare=False)
+                                cur.execute(
+                                    "insert into schema_migrations (id) values (%s);",
+                                    (migration_id,),
+                                )
+                finally:
+                    cur.execute("select pg_advisory_unlock(%s);", (_MIGRATION_LOCK_ID,))
+
+    def ensure_ledger_partitions(self, months_ahead: int = 12) -> None:
+        """Create the monthly ledger partitions through ``months_ahead`` months from now.
+
+        Rows for a month without a partition land in the default one, so this
+        only has to run often enough (e.g. from the daily retention job) to
+        stay ahead of the calendar.
+        """
+        with self.connect() as conn:
+            with conn.cursor() as cur:
+                for ledger in _PARTITIONED_LEDGERS:
+                    cur.execute(
+                        """
+                        select ensure_monthly_partitions(
+                            %(ledger)s,
+                            (now() at time zone 'UTC')::date,
+                            ((now() + make_interval(months => %(months_ahead)s)) at time zone 'UTC')::date
+                        );
+                        """,
+                        {"ledger": ledger, "months_ahead": months_ahead},
+                    )
+
+    def _fetch_page(
+        self,
+        table: str,
+        columns: str,
+        params: Dict[str, Any],
+        order_by: str,
+        limit: Optional[int],
+        offset: Optional[int],
+    ) -> tuple[list[Dict[str, Any]], int]:
+        """One page of rows plus the unpaginated total, via ``count(*) over ()``.
+
+        Only a page past the end (or ``limit 0``) needs a separate count query,
+        since it has no row to carry the window total.
+        """
+        filters = tuple(params)
+        sql = _select_sql(
+            table,
+            columns,
+            filters,
+            order_by,
+            has_limit=limit is not None,
+            has_offset=offset is not None,
+            window_total=True,
+        )
+        with self.connect() as conn:
+            with conn.cursor() as cur:
+                cur.execute(sql, _paging_params(params, limit, offset))
+                rows = cur.fetchall()
+                if rows:
+                    total = rows[0]["_total"]
+                    for row in rows:
+                        del row["_total"]
+                    return rows, int(total)
+                if not offset and limit != 0:
+                    return rows, 0
+                cur.execute(_count_sql(table, filters), params)
+                return rows, _count(cur)
+
+    def _fetch_keyset(
+        self,
+        table: str,
+        columns: str,
+        params: Dict[str, Any],
+        before: Optional[tuple[datetime, str]],
+        limit: Optional[int],
+    ) -> tuple[list[Dict[str, Any]], bool]:
+        """One keyset page in ``created_at desc, id desc`` order, and whether more rows follow.
+
+        Served by a range scan on the ``(created_at desc, id desc)`` indexes, so
+        cost tracks ``limit`` rather than page depth. Reads one extra row to
+        answer "more?" without counting.
+        """
+        sql = _select_sql(
+            table, columns, tuple(params), _RECENT_FIRST, has_limit=limit is not None, seek=before is not None
+        )
+        if before is not None:
+            params["before_created_at"], params["before_id"] = before
+        if limit is not None:
+            params["limit"] = limit + 1
+        with self.connect() as conn:
+            with conn.cursor() as cur:
+                cur.execute(sql, params)
+                rows = cur.fetchall()
+        if limit is not None and len(rows) > limit:
+            return rows[:limit], True
+        return rows, False
+
+    def _bulk_upsert(
+        self, table: str, columns: tuple[str, ...], updates: tuple[str, ...], rows: list[tuple]
+    ) -> None:
+        if not rows:
+            return
+        batch_size = min(_BULK_UPSERT_ROWS, _MAX_BIND_PARAMS // len(columns))
+        with self.connect() as conn:
+            with conn.transaction(), conn.cursor() as cur:
+                for start in range(0, len(rows), batch_size):
+                    batch = rows[start:start + batch_size]
                     cur.execute(
-                        "insert into schema_migrations (id) values (%s);",
-                        (migration_id,),
+                        _bulk_upsert_sql(table, columns, updates, len(batch)),
+                        [value for row in batch for value in row],
                     )
 
     def upsert_lecture(self, payload: Dict[str, Any]) -> None:
@@ -77,10 +698,23 @@ class Database:
                     payload,
                 )
 
+    def bulk_upsert_lectures(self, payloads: list[Dict[str, Any]]) -> None:
+        """``upsert_lecture`` for many rows, as one multi-row statement per batch.
+
+        Like the other bulk upserts, the statement reports no per-row rowcount.
+        """
+        columns = (
+            "id", "course_id", "preset_id", "title", "status", "audio_path",
+            "transcript_path", "source_type", "created_at", "updated_at",
+        )
+        rows = [tuple(payload[column] for column in columns) for payload in _last_per_id(payloads)]
+        # created_at keeps its first value, as in upsert_lecture.
+        self._bulk_upsert("lectures", columns, columns[1:8] + ("updated_at",), rows)
+
     def fetch_lecture(self, lecture_id: str) -> Optional[Dict[str, Any]]:
         with self.connect() as conn:
             with conn.cursor() as cur:
-                cur.execute("select * from lectures where id = %s;", (lecture_id,))
+                cur.execute(_FETCH_LECTURE_SQL, (lecture_id,))
                 return cur.fetchone()
 
     def fetch_lectures(
@@ -91,56 +725,54 @@ class Database:
         limit: Optional[int] = None,
         offset: Optional[int] = None,
     ) -> list[Dict[str, Any]]:
-        clauses = []
-        params: Dict[str, Any] = {}
-        if course_id:
-            clauses.append("course_id = %(course_id)s")
-            params["course_id"] = course_id
-        if status:
-            clauses.append("status = %(status)s")
-            params["status"] = status
-        if preset_id:
-            clauses.append("preset_id = %(preset_id)s")
-            params["preset_id"] = preset_id
-        where_clause = f" where {' and '.join(clauses)}" if clauses else ""
-        limit_clause = ""
-        if limit is not None:
-            limit_clause += " limit %(limit)s"
-            params["limit"] = limit
-        if offset is not None:
-            limit_clause += " offset %(offset)s"
-            params["offset"] = offset
+        params = _present({"course_id": course_id, "status": status, "preset_id": preset_id})
+        sql = _select_sql(
+            "lectures",
+            LECTURE_COLUMNS,
+            tuple(params),
+            _RECENT_FIRST,
+            has_limit=limit is not None,
+            has_offset=offset is not None,
+        )
         with self.connect() as conn:
             with conn.cursor() as cur:
-                cur.execute(
-                    f"select * from lectures{where_clause} order by created_at desc{limit_clause};",
-                    params,
-                )
+                cur.execute(sql, _paging_params(params, limit, offset))
                 return cur.fetchall()
 
+    def fetch_lectures_page(
+        self,
+        course_id: Optional[str] = None,
+        status: Optional[str] = None,
+        preset_id: Optional[str] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+    ) -> tuple[list[Dict[str, Any]], int]:
+        """``fetch_lectures`` and ``count_lectures`` in a single round-trip."""
+        params = _present({"course_id": course_id, "status": status, "preset_id": preset_id})
+        return self._fetch_page("lectures", LECTURE_COLUMNS, params, _RECENT_FIRST, limit, offset)
+
+    def fetch_lectures_before(
+        self,
+        before: Optional[tuple[datetime, str]],
+        course_id: Optional[str] = None,
+        status: Optional[str] = None,
+        preset_id: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> tuple[list[Dict[str, Any]], bool]:
+        params = _present({"course_id": course_id, "status": status, "preset_id": preset_id})
+        return self._fetch_keyset("lectures", LECTURE_COLUMNS, params, before, limit)
+
     def count_lectures(
         self,
         course_id: Optional[str] = None,
         status: Optional[str] = None,
         preset_id: Optional[str] = None,
     ) -> int:
-        clauses = []
-        params: Dict[str, Any] = {}
-        if course_id:
-            clauses.append("course_id = %(course_id)s")
-            params["course_id"] = course_id
-        if status:
-            clauses.append("status = %(status)s")
-            params["status"] = status
-        if preset_id:
-            clauses.append("preset_id = %(preset_id)s")
-            params["preset_id"] = preset_id
-        where_clause = f" where {' and '.join(clauses)}" if clauses else ""
+        params = _present({"course_id": course_id, "status": status, "preset_id": preset_id})
         with self.connect() as conn:
             with conn.cursor() as cur:
-                cur.execute(f"select count(*) from lectures{where_clause};", params)
-                row = cur.fetchone()
-                return int(list(row.values())[0]) if row else 0
+                cur.execute(_count_sql("lectures", tuple(params)), params)
+                return _count(cur)
 
     def upsert_course(self, payload: Dict[str, Any]) -> None:
         with self.connect() as conn:
@@ -170,28 +802,24 @@ class Database:
         limit: Optional[int] = None,
         offset: Optional[int] = None,
     ) -> list[Dict[str, Any]]:
-        limit_clause = ""
-        params: Dict[str, Any] = {}
-        if limit is not None:
-            limit_clause += " limit %(limit)s"
-            params["limit"] = limit
-        if offset is not None:
-            limit_clause += " offset %(offset)s"
-            params["offset"] = offset
+        sql = _select_sql("courses", "*", (), _RECENT_FIRST, has_limit=limit is not None, has_offset=offset is not None)
         with self.connect() as conn:
             with conn.cursor() as cur:
-                cur.execute(
-                    f"select * from courses order by created_at desc{limit_clause};",
-                    params,
-                )
+                cur.execute(sql, _paging_params({}, limit, offset))
                 return cur.fetchall()
 
+    def fetch_courses_before(
+        self,
+        before: Optional[tuple[datetime, str]],
+        limit: Optional[int] = None,
+    ) -> tuple[list[Dict[str, Any]], bool]:
+        return self._fetch_keyset("courses", "*", {}, before, limit)
+
     def count_courses(self) -> int:
         with self.connect() as conn:
             with conn.cursor() as cur:
-                cur.execute("select count(*) from courses;")
-                row = cur.fetchone()
-                return int(list(row.values())[0]) if row else 0
+                cur.execute("select count(*) as total from courses;")
+                return _count(cur)
 
     def create_job(self, payload: Dict[str, Any]) -> None:
         with self.connect() as conn:
@@ -220,31 +848,25 @@ class Database:
         error: Optional[str] = None,
         updated_at: Optional[str] = None,
     ) -> None:
-        updates = []
-        params: Dict[str, Any] = {"id": job_id}
-        if status is not None:
-            updates.append("status = %(status)s")
-            params["status"] = status
-        if result is not None:
-            updates.append("result = %(result)s")
-            params["result"] = Jsonb(result)
-        if error is not None:
-            updates.append("error = %(error)s")
-            params["error"] = error
-        if updated_at is not None:
-            updates.append("updated_at = %(updated_at)s")
-            params["updated_at"] = updated_at
-        if not updates:
+        if status is None and result is None and error is None and updated_at is None:
             return
-        set_clause = ", ".join(updates)
         with self.connect() as conn:
             with conn.cursor() as cur:
-                cur.execute(f"update jobs set {set_clause} where id = %(id)s;", params)
+                cur.execute(
+                    _UPDATE_JOB_SQL,
+                    {
+                        "id": job_id,
+                        "status": status,
+                        "result": Jsonb(result) if result is not None else None,
+                        "error": error,
+                        "updated_at": updated_at,
+                    },
+                )
 
     def fetch_job(self, job_id: str) -> Optional[Dict[str, Any]]:
         with self.connect() as conn:
             with conn.cursor() as cur:
-                cur.execute("select * from jobs where id = %s;", (job_id,))
+                cur.execute(_FETCH_JOB_SQL, (job_id,))
                 return cur.fetchone()
 
     def fetch_jobs(
@@ -253,39 +875,61 @@ class Database:
         limit: Optional[int] = None,
         offset: Optional[int] = None,
     ) -> list[Dict[str, Any]]:
-        clauses = []
-        params: Dict[str, Any] = {}
-        if lecture_id:
-            clauses.append("lecture_id = %(lecture_id)s")
-            params["lecture_id"] = lecture_id
-        where_clause = f" where {' and '.join(clauses)}" if clauses else ""
-        limit_clause = ""
-        if limit is not None:
-            limit_clause += " limit %(limit)s"
-            params["limit"] = limit
-        if offset is not None:
-            limit_clause += " offset %(offset)s"
-            params["offset"] = offset
+        params = _present({"lecture_id": lecture_id})
+        sql = _select_sql(
+            "jobs",
+            JOB_COLUMNS,
+            tuple(params),
+            _RECENT_FIRST,
+            has_limit=limit is not None,
+            has_offset=offset is not None,
+        )
         with self.connect() as conn:
             with conn.cursor() as cur:
-                cur.execute(
-                    f"select * from jobs{where_clause} order by created_at desc{limit_clause};",
-                    params,
-                )
+                cur.execute(sql, _paging_params(params, limit, offset))
                 return cur.fetchall()
 
+    def iter_jobs(self, lecture_id: Optional[str] = None, itersize: int = 500) -> Iterator[Dict[str, Any]]:
+        """Stream jobs through a server-side cursor, ``itersize`` rows per round-trip.
+
+        For whole-table scans (queue depth, dead-letter sweeps) where fetchall()
+        would materialise every job, results included, in memory at once.
+        """
+        where_clause = " where lecture_id = %(lecture_id)s" if lecture_id else ""
+        with self.connect() as conn:
+            # Named cursors only live inside a transaction.
+            with conn.transaction():
+                with conn.cursor(name="jobs_stream") as cur:
+                    cur.itersize = itersize
+                    cur.execute(
+                        f"select {JOB_COLUMNS} from jobs{where_clause} order by created_at desc;",
+                        {"lecture_id": lecture_id},
+                    )
+                    yield from cur
+
+    def fetch_jobs_page(
+        self,
+        lecture_id: Optional[str] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+    ) -> tuple[list[Dict[str, Any]], int]:
+        """``fetch_jobs`` and ``count_jobs`` in a single round-trip."""
+        return self._fetch_page("jobs", JOB_COLUMNS, _present({"lecture_id": lecture_id}), _RECENT_FIRST, limit, offset)
+
+    def fetch_jobs_before(
+        self,
+        before: Optional[tuple[datetime, str]],
+        lecture_id: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> tuple[list[Dict[str, Any]], bool]:
+        return self._fetch_keyset("jobs", JOB_COLUMNS, _present({"lecture_id": lecture_id}), before, limit)
+
     def count_jobs(self, lecture_id: Optional[str] = None) -> int:
-        clauses = []
-        params: Dict[str, Any] = {}
-        if lecture_id:
-            clauses.append("lecture_id = %(lecture_id)s")
-            params["lecture_id"] = lecture_id
-        where_clause = f" where {' and '.join(clauses)}" if clauses else ""
+        params = _present({"lecture_id": lecture_id})
         with self.connect() as conn:
             with conn.cursor() as cur:
-                cur.execute(f"select count(*) from jobs{where_clause};", params)
-                row = cur.fetchone()
-                return int(list(row.values())[0]) if row else 0
+                cur.execute(_count_sql("jobs", tuple(params)), params)
+                return _count(cur)
 
     def upsert_artifact(self, payload: Dict[str, Any]) -> None:
         with self.connect() as conn:
@@ -308,6 +952,15 @@ class Database:
                     payload,
                 )
 
+    def bulk_upsert_artifacts(self, payloads: list[Dict[str, Any]]) -> None:
+        """``upsert_artifact`` for many rows, as one multi-row statement per batch."""
+        columns = (
+            "id", "lecture_id", "course_id", "preset_id", "artifact_type",
+            "storage_path", "summary_overview", "summary_section_count", "created_at",
+        )
+        rows = [tuple(payload[column] for column in columns) for payload in _last_per_id(payloads)]
+        self._bulk_upsert("artifacts", columns, ("storage_path", "summary_overview", "summary_section_count"), rows)
+
     def fetch_artifacts(
         self,
         lecture_id: str,
@@ -316,50 +969,43 @@ class Database:
         limit: Optional[int] = None,
         offset: Optional[int] = None,
     ) -> list[Dict[str, Any]]:
-        clauses = ["lecture_id = %(lecture_id)s"]
-        params: Dict[str, Any] = {"lecture_id": lecture_id}
-        if artifact_type:
-            clauses.append("artifact_type = %(artifact_type)s")
-            params["artifact_type"] = artifact_type
-        if preset_id:
-            clauses.append("preset_id = %(preset_id)s")
-            params["preset_id"] = preset_id
-        where_clause = " and ".join(clauses)
-        limit_clause = ""
-        if limit is not None:
-            limit_clause += " limit %(limit)s"
-            params["limit"] = limit
-        if offset is not None:
-            limit_clause += " offset %(offset)s"
-            params["offset"] = offset
+        params = {"lecture_id": lecture_id, **_present({"artifact_type": artifact_type, "preset_id": preset_id})}
+        sql = _select_sql(
+            "artifacts",
+            ARTIFACT_COLUMNS,
+            tuple(params),
+            "artifact_type",
+            has_limit=limit is not None,
+            has_offset=offset is not None,
+        )
         with self.connect() as conn:
             with conn.cursor() as cur:
-                cur.execute(
-                    f"select * from artifacts where {where_clause} order by artifact_type{limit_clause};",
-                    params,
-                )
+                cur.execute(sql, _paging_params(params, limit, offset))
                 return cur.fetchall()
 
+    def fetch_artifacts_page(
+        self,
+        lecture_id: str,
+        artifact_type: Optional[str] = None,
+        preset_id: Optional[str] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+    ) -> tuple[list[Dict[str, Any]], int]:
+        """``fetch_artifacts`` and ``count_artifacts`` in a single round-trip."""
+        params = {"lecture_id": lecture_id, **_present({"artifact_type": artifact_type, "preset_id": preset_id})}
+        return self._fetch_page("artifacts", ARTIFACT_COLUMNS, params, "artifact_type", limit, offset)
+
     def count_artifacts(
         self,
         lecture_id: str,
         artifact_type: Optional[str] = None,
         preset_id: Optional[str] = None,
     ) -> int:
-        clauses = ["lecture_id = %(lecture_id)s"]
-        params: Dict[str, Any] = {"lecture_id": lecture_id}
-        if artifact_type:
-            clauses.append("artifact_type = %(artifact_type)s")
-            params["artifact_type"] = artifact_type
-        if preset_id:
-            clauses.append("preset_id = %(preset_id)s")
-            params["preset_id"] = preset_id
-        where_clause = " and ".join(clauses)
+        params = {"lecture_id": lecture_id, **_present({"artifact_type": artifact_type, "preset_id": preset_id})}
         with self.connect() as conn:
             with conn.cursor() as cur:
-                cur.execute(f"select count(*) from artifacts where {where_clause};", params)
-                row = cur.fetchone()
-                return int(list(row.values())[0]) if row else 0
+                cur.execute(_count_sql("artifacts", tuple(params)), params)
+                return _count(cur)
 
     def fetch_action_items(
         self,
@@ -418,17 +1064,34 @@ class Database:
                     },
                 )
 
+    def bulk_upsert_threads(self, payloads: list[Dict[str, Any]]) -> None:
+        """``upsert_thread`` for many rows, as one multi-row statement per batch."""
+        columns = (
+            "id", "course_id", "title", "summary", "status", "complexity_level",
+            "lecture_refs", "face", "evolution_notes", "created_at",
+        )
+        rows = [
+            (
+                payload["id"],
+                payload["course_id"],
+                payload["title"],
+                payload["summary"],
+                payload["status"],
+                payload["complexity_level"],
+                Jsonb(payload.get("lecture_refs")),
+                payload.get("face"),
+                Jsonb(payload.get("evolution_notes")) if payload.get("evolution_notes") else None,
+                payload["created_at"],
+            )
+            for payload in _last_per_id(payloads)
+        ]
+        self._bulk_upsert("threads", columns, columns[2:9], rows)
+
     def fetch_threads(self, lecture_id: str) -> list[Dict[str, Any]]:
+        # Containment on a one-element array is served by threads_lecture_refs_gin.
         with self.connect() as conn:
             with conn.cursor() as cur:
-                cur.execute(
-                    """
-                    select * from threads
-                    where lecture_refs @> %s
-                    order by created_at desc;
-                    """,
-                    (Jsonb([lecture_id]),),
-                )
+                cur.execute(_FETCH_THREADS_FOR_LECTURE_SQL, (Jsonb([lecture_id]),))
                 return cur.fetchall()
 
     def fetch_threads_for_course(
@@ -437,38 +1100,41 @@ class Database:
         limit: Optional[int] = None,
         offset: Optional[int] = None,
     ) -> list[Dict[str, Any]]:
-        limit_clause = ""
-        params: Dict[str, Any] = {"course_id": course_id}
-        if limit is not None:
-            limit_clause += " limit %(limit)s"
-            params["limit"] = limit
-        if offset is not None:
-            limit_clause += " offset %(offset)s"
-            params["offset"] = offset
+        sql = _select_sql(
+            "threads",
+            THREAD_LIST_COLUMNS,
+            ("course_id",),
+            _RECENT_FIRST,
+            has_limit=limit is not None,
+            has_offset=offset is not None,
+        )
         with self.connect() as conn:
             with conn.cursor() as cur:
-                cur.execute(
-                    f"""
-                    select * from threads
-                    where course_id = %(course_id)s
-                    order by created_at desc{limit_clause};
-                    """,
-                    params,
-                )
+                cur.execute(sql, _paging_params({"course_id": course_id}, limit, offset))
                 return cur.fetchall()
 
+    def fetch_threads_for_course_page(
+        self,
+        course_id: str,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+    ) -> tuple[list[Dict[str, Any]], int]:
+        """``fetch_threads_for_course`` and ``count_threads_for_course`` in a single round-trip."""
+        return self._fetch_page("threads", THREAD_LIST_COLUMNS, {"course_id": course_id}, _RECENT_FIRST, limit, offset)
+
+    def fetch_threads_for_course_before(
+        self,
+        course_id: str,
+        before: Optional[tuple[datetime, str]],
+        limit: Optional[int] = None,
+    ) -> tuple[list[Dict[str, Any]], bool]:
+        return self._fetch_keyset("threads", THREAD_LIST_COLUMNS, {"course_id": course_id}, before, limit)
+
     def count_threads_for_course(self, course_id: str) -> int:
         with self.connect() as conn:
             with conn.cursor() as cur:
-                cur.execute(
-                    """
-                    select count(*) from threads
-                    where course_id = %s;
-                    """,
-                    (course_id,),
-                )
-                row = cur.fetchone()
-                return int(list(row.values())[0]) if row else 0
+                cur.execute(_count_sql("threads", ("course_id",)), {"course_id": course_id})
+                return _count(cur)
 
     def upsert_export(self, payload: Dict[str, Any]) -> None:
         with self.connect() as conn:
@@ -518,15 +1184,15 @@ class Database:
         with self.connect() as conn:
             with conn.cursor() as cur:
                 cur.execute(
-                    "delete from threads where lecture_refs @> %s returning id;",
+                    "delete from threads where lecture_refs @> %s;",
                     (Jsonb([lecture_id]),),
                 )
-                return len(cur.fetchall())
+                return cur.rowcount
 
     def fetch_thread_by_id(self, thread_id: str) -> Optional[Dict[str, Any]]:
         with self.connect() as conn:
             with conn.cursor() as cur:
-                cur.execute("select * from threads where id = %s;", (thread_id,))
+                cur.execute(_FETCH_THREAD_SQL, (thread_id,))
                 return cur.fetchone()
 
     def insert_thread_occurrences(self, occurrences: list[Dict[str, Any]]) -> int:
@@ -534,47 +1200,45 @@ class Database:
             return 0
         with self.connect() as conn:
             with conn.cursor() as cur:
-                inserted = 0
-                for occ in occurrences:
-                    cur.execute(
-                        """
-                        insert into thread_occurrences (
-                            id, thread_id, course_id, lecture_id, artifact_id,
-                            evidence, confidence, captured_at
-                        ) values (
-                            %(id)s, %(thread_id)s, %(course_id)s, %(lecture_id)s,
-                            %(artifact_id)s, %(evidence)s, %(confidence)s, %(captured_at)s
-                        ) on conflict (id) do nothing;
-                        """,
-                        occ,
-                    )
-                    inserted += cur.rowcount
-                return inserted
+                # executemany pipelines the inserts; rowcount is the total across rows.
+                cur.executemany(
+                    """
+                    insert into thread_occurrences (
+                        id, thread_id, course_id, lecture_id, artifact_id,
+                        evidence, confidence, captured_at
+                    ) values (
+                        %(id)s, %(thread_id)s, %(course_id)s, %(lecture_id)s,
+                        %(artifact_id)s, %(evidence)s, %(confidence)s, %(captured_at)s
+                    ) on conflict (id) do nothing;
+                    """,
+                    occurrences,
+                )
+                return cur.rowcount
 
     def insert_thread_updates(self, updates: list[Dict[str, Any]]) -> int:
         if not updates:
             return 0
         with self.connect() as conn:
             with conn.cursor() as cur:
-                inserted = 0
-                for upd in updates:
-                    cur.execute(
-                        """
-                        insert into thread_updates (
-                            id, thread_id, course_id, lecture_id, change_type,
-                            summary, details, captured_at
-                        ) values (
-                            %(id)s, %(thread_id)s, %(course_id)s, %(lecture_id)s,
-                            %(change_type)s, %(summary)s, %(details)s, %(captured_at)s
-                        ) on conflict (id) do nothing;
-                        """,
+                cur.executemany(
+                    """
+                    insert into thread_updates (
+                        id, thread_id, course_id, lecture_id, change_type,
+                        summary, details, captured_at
+                    ) values (
+                        %(id)s, %(thread_id)s, %(course_id)s, %(lecture_id)s,
+                        %(change_type)s, %(summary)s, %(details)s, %(captured_at)s
+                    ) on conflict (id) do nothing;
+                    """,
+                    [
                         {
                             **upd,
                             "details": Jsonb(upd.get("details")) if upd.get("details") else None,
-                        },
-                    )
-                    inserted += cur.rowcount
-                return inserted
+                        }
+                        for upd in updates
+                    ],
+                )
+                return cur.rowcount
 
     def fetch_thread_occurrences(self, thread_id: str) -> list[Dict[str, Any]]:
         with self.connect() as conn:
@@ -606,6 +1270,19 @@ class Database:
                 )
                 return cur.fetchall()
 
+    def fetch_thread_activity(self, thread_id: str) -> Dict[str, list[Dict[str, Any]]]:
+        """``fetch_thread_occurrences`` and ``fetch_thread_updates_for_thread`` in one round-trip."""
+        activity: Dict[str, list[Dict[str, Any]]] = {"occurrences": [], "updates": []}
+        with self.connect() as conn:
+            with conn.cursor() as cur:
+                cur.execute(_FETCH_THREAD_ACTIVITY_SQL, {"thread_id": thread_id})
+                for row in cur:
+                    kind = row.pop("kind")
+                    for column in _THREAD_ACTIVITY_ONLY[kind]:
+                        del row[column]
+                    activity[kind].append(row)
+        return activity
+
     def delete_thread_occurrences_for_lecture(self, lecture_id: str) -> int:
         with self.connect() as conn:
             with conn.cursor() as cur:
@@ -648,22 +1325,9 @@ class Database:
     def delete_lecture_records(self, lecture_id: str) -> dict[str, int]:
         with self.connect() as conn:
             with conn.cursor() as cur:
-                cur.execute("delete from thread_occurrences where lecture_id = %s;", (lecture_id,))
-                cur.execute("delete from thread_updates where lecture_id = %s;", (lecture_id,))
-                cur.execute("delete from artifacts where lecture_id = %s;", (lecture_id,))
-                artifacts_deleted = cur.rowcount
-                cur.execute("delete from exports where lecture_id = %s;", (lecture_id,))
-                exports_deleted = cur.rowcount
-                cur.execute("delete from jobs where lecture_id = %s;", (lecture_id,))
-                jobs_deleted = cur.rowcount
-                cur.execute("delete from lectures where id = %s;", (lecture_id,))
-                lectures_deleted = cur.rowcount
-                return {
-                    "artifacts": artifacts_deleted,
-                    "exports": exports_deleted,
-                    "jobs": jobs_deleted,
-                    "lectures": lectures_deleted,
-                }
+                cur.execute(_DELETE_LECTURE_RECORDS_SQL, {"lecture_id": lecture_id})
+                row = cur.fetchone()
+                return {table: int(row[table]) for table in ("artifacts", "exports", "jobs", "lectures")}
 
     def delete_course(self, course_id: str) -> int:
         with self.connect() as conn:
@@ -682,16 +1346,16 @@ class Database:
         password_hash: str,
         display_name: Optional[str] = None,
     ) -> Dict[str, Any]:
-        now = datetime.now(timezone.utc).isoformat()
+        # created_at / updated_at come from the columns' DEFAULT now().
         with self.connect() as conn:
             with conn.cursor() as cur:
                 cur.execute(
                     """
-                    INSERT INTO users (id, email, password_hash, display_name, created_at, updated_at)
-                    VALUES (%s, %s, %s, %s, %s, %s)
+                    INSERT INTO users (id, email, password_hash, display_name)
+                    VALUES (%s, %s, %s, %s)
                     RETURNING id, email, display_name, created_at, updated_at;
                     """,
-                    (user_id, email, password_hash, display_name, now, now),
+                    (user_id, email, password_hash, display_name),
                 )
                 return cur.fetchone()
 
@@ -713,6 +1377,14 @@ class Database:
                 )
                 return cur.fetchone()
 
+    def update_user_password_hash(self, user_id: str, password_hash: str) -> None:
+        with self.connect() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "UPDATE users SET password_hash = %s, updated_at = now() WHERE id = %s;",
+                    (password_hash, user_id),
+                )
+
     def find_or_create_oauth_user(
         self,
         user_id: str,
@@ -721,21 +1393,20 @@ class Database:
         provider_user_id: str,
         display_name: Optional[str] = None,
     ) -> Dict[str, Any]:
-        now = datetime.now(timezone.utc).isoformat()
         with self.connect() as conn:
             with conn.cursor() as cur:
                 cur.execute(
                     """
-                    INSERT INTO users (id, email, password_hash, display_name, auth_provider, provider_user_id, created_at, updated_at)
-                    VALUES (%s, %s, NULL, %s, %s, %s, %s, %s)
+                    INSERT INTO users (id, email, password_hash, display_name, auth_provider, provider_user_id)
+                    VALUES (%s, %s, NULL, %s, %s, %s)
                     ON CONFLICT (email) DO UPDATE SET
                         auth_provider = EXCLUDED.auth_provider,
                         provider_user_id = EXCLUDED.provider_user_id,
                         display_name = COALESCE(NULLIF(EXCLUDED.display_name, ''), users.display_name),
-                        updated_at = EXCLUDED.updated_at
+                        updated_at = now()
                     RETURNING id, email, display_name, auth_provider, created_at, updated_at;
                     """,
-                    (user_id, email, display_name, auth_provider, provider_user_id, now, now),
+                    (user_id, email, display_name, auth_provider, provider_user_id),
                 )
                 return cur.fetchone()
 
@@ -756,78 +1427,78 @@ class Database:
         total_tokens: int,
         estimated_cost_usd: float,
     ) -> None:
-        with self.connect() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """
-                    INSERT INTO credit_ledger (
-                        id, user_id, lecture_id, job_id,
-                        llm_provider, llm_model,
-                        prompt_tokens, completion_tokens, total_tokens,
-                        estimated_cost_usd
-                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s);
-                    """,
-                    (
-                        entry_id, user_id, lecture_id, job_id,
-                        llm_provider, llm_model,
-                        prompt_tokens, completion_tokens, total_tokens,
-                        estimated_cost_usd,
-                    ),
+        self.insert_credit_entries_bulk(
+            [
+                (
+                    entry_id, user_id, lecture_id, job_id,
+                    llm_provider, llm_model,
+                    prompt_tokens, completion_tokens, total_tokens,
+                    estimated_cost_usd,
                 )
+            ]
+        )
 
-    def fetch_user_credits_summary(self, user_id: str) -> Dict[str, Any]:
+    def insert_credit_entries_bulk(self, entries: list[tuple]) -> int:
+        """Append ledger rows with binary COPY; tuples follow ``_CREDIT_LEDGER_COPY_TYPES`` order.
+
+        One statement and one data stream however many rows are buffered, instead
+        of a parse/plan/round-trip per INSERT.
+        """
+        if not entries:
+            return 0
         with self.connect() as conn:
             with conn.cursor() as cur:
-                # Total usage
-                cur.execute(
-                    """
-                    SELECT
-                        COALESCE(SUM(prompt_tokens), 0) AS total_prompt_tokens,
-                        COALESCE(SUM(completion_tokens), 0) AS total_completion_tokens,
-                        COALESCE(SUM(total_tokens), 0) AS total_tokens,
-                        COALESCE(SUM(estimated_cost_usd), 0) AS total_cost_usd,
-                        COUNT(*) AS generation_count
-                    FROM credit_ledger WHERE user_id = %s;
-                    """,
-                    (user_id,),
-                )
-                totals = cur.fetchone()
-
-                # Per-model breakdown
-                cur.execute(
-                    """
-                    SELECT
-                        llm_model,
-                        COALESCE(SUM(prompt_tokens), 0) AS prompt_tokens,
-                        COALESCE(SUM(completion_tokens), 0) AS completion_tokens,
-                        COALESCE(SUM(total_tokens), 0) AS total_tokens,
-                        COALESCE(SUM(estimated_cost_usd), 0) AS cost_usd,
-                        COUNT(*) AS count
-                    FROM credit_ledger WHERE user_id = %s
-                    GROUP BY llm_model ORDER BY cost_usd DESC;
-                    """,
-                    (user_id,),
-                )
+                with cur.copy(_CREDIT_LEDGER_COPY_SQL) as copy:
+                    copy.set_types(_CREDIT_LEDGER_COPY_TYPES)
+                    for entry in entries:
+                        copy.write_row((*entry[:-1], Decimal(str(entry[-1]))))
+        for user_id in {entry[1] for entry in entries}:
+            _CREDITS_SUMMARY_CACHE.invalidate(self.dsn, user_id)
+        return len(entries)
+
+    def fetch_user_credits_summary(self, user_id: str, since_month: Optional[date] = None) -> Dict[str, Any]:
+        """Usage totals and per-model breakdown, all-time or from the UTC month starting ``since_month``.
+
+        Both read trigger-maintained rollups (per model, and per model and
+        month) rather than aggregating the ledger; totals are summed here.
+        ``since_month`` must be the first day of a month, since the monthly
+        rollup cannot answer for a partial month.
+        """
+        if since_month is None:
+            cached = _CREDITS_SUMMARY_CACHE.get(self.dsn, user_id)
+            if cached is not None:
+                return cached
+            sql, params = _CREDITS_SUMMARY_SQL, {"user_id": user_id}
+        else:
+            if since_month.day != 1:
+                raise ValueError("since_month must be the first day of a month.")
+            sql, params = _CREDITS_SUMMARY_SINCE_SQL, {"user_id": user_id, "month": since_month}
+        with self.connect() as conn:
+            with conn.cursor() as cur:
+                cur.execute(sql, params)
                 per_model = cur.fetchall()
 
-        return {
-            "totalPromptTokens": totals["total_prompt_tokens"],
-            "totalCompletionTokens": totals["total_completion_tokens"],
-            "totalTokens": totals["total_tokens"],
-            "totalCostUsd": round(float(totals["total_cost_usd"]), 6),
-            "generationCount": totals["generation_count"],
+        summary = {
+            "totalPromptTokens": sum(row["prompt_tokens"] for row in per_model),
+            "totalCompletionTokens": sum(row["completion_tokens"] for row in per_model),
+            "totalTokens": sum(row["total_tokens"] for row in per_model),
+            "totalCostUsd": round(sum(row["cost_usd"] for row in per_model), 6),
+            "generationCount": sum(row["generation_count"] for row in per_model),
             "perModel": [
                 {
                     "model": row["llm_model"],
                     "promptTokens": row["prompt_tokens"],
                     "completionTokens": row["completion_tokens"],
                     "totalTokens": row["total_tokens"],
-                    "costUsd": round(float(row["cost_usd"]), 6),
-                    "count": row["count"],
+                    "costUsd": row["cost_usd"],
+                    "count": row["generation_count"],
                 }
                 for row in per_model
             ],
         }
+        if since_month is None:
+            _CREDITS_SUMMARY_CACHE.put(self.dsn, user_id, summary)
+        return summary
 
     def fetch_user_credit_history(
         self, user_id: str, limit: int = 20, offset: int = 0
@@ -857,7 +1528,7 @@ class Database:
                 "promptTokens": row["prompt_tokens"],
                 "completionTokens": row["completion_tokens"],
                 "totalTokens": row["total_tokens"],
-                "estimatedCostUsd": round(float(row["estimated_cost_usd"]), 6),
+                "estimatedCostUsd": row["estimated_cost_usd"],
                 "createdAt": row["created_at"].isoformat() if row["created_at"] else None,
             }
             for row in rows
@@ -869,120 +1540,55 @@ class Database:
 
     FREE_MONTHLY_TOKENS = int(os.getenv("PLC_FREE_MONTHLY_TOKENS", "100000"))
 
-    def _connect_transactional(self):
-        return psycopg.connect(self.dsn, row_factory=dict_row, autocommit=False)
-
     def get_user_token_balance(self, user_id: str) -> Dict[str, Any]:
-        with self._connect_transactional() as conn:
+        cached = _TOKEN_BALANCE_CACHE.get(self.dsn, user_id)
+        if cached is not None:
+            return cached
+        with self.connect() as conn:
             with conn.cursor() as cur:
                 cur.execute(
-                    "SELECT free_token_balance, purchased_token_balance, free_tokens_reset_at FROM users WHERE id = %s FOR UPDATE;",
-                    (user_id,),
+                    _TOKEN_BALANCE_SQL,
+                    {"user_id": user_id, "allowance": self.FREE_MONTHLY_TOKENS, "txn_id": str(uuid.uuid4())},
                 )
                 row = cur.fetchone()
-                if not row:
-                    raise ValueError(f"User {user_id} not found")
-
-                # Lazy monthly reset: if 30+ days since last reset, grant fresh free tokens
-                reset_at = row["free_tokens_reset_at"]
-                now = datetime.now(timezone.utc)
-                if reset_at and (now - reset_at).days >= 30:
-                    cur.execute(
-                        """
-                        UPDATE users
-                        SET free_token_balance = %s, free_tokens_reset_at = %s
-                        WHERE id = %s;
-                        """,
-                        (self.FREE_MONTHLY_TOKENS, now, user_id),
-                    )
-                    # Log the reset
-                    txn_id = str(__import__("uuid").uuid4())
-                    cur.execute(
-                        """
-                        INSERT INTO token_transactions (id, user_id, transaction_type, token_amount,
-                            balance_after_free, balance_after_purchased, reference_id, description, created_at)
-                        VALUES (%s, %s, 'free_grant', %s, %s, %s, NULL, 'Monthly free token reset', %s);
-                        """,
-                        (txn_id, user_id, self.FREE_MONTHLY_TOKENS,
-                         self.FREE_MONTHLY_TOKENS, row["purchased_token_balance"], now),
-                    )
-                    conn.commit()
-                    return {
-                        "freeBalance": self.FREE_MONTHLY_TOKENS,
-                        "purchasedBalance": row["purchased_token_balance"],
-                        "totalBalance": self.FREE_MONTHLY_TOKENS + row["purchased_token_balance"],
-                        "freeResetsAt": (now.isoformat()),
-                        "freeMonthlyAllowance": self.FREE_MONTHLY_TOKENS,
-                    }
-
-                conn.commit()
-                free = row["free_token_balance"]
-                purchased = row["purchased_token_balance"]
-                return {
-                    "freeBalance": free,
-                    "purchasedBalance": purchased,
-                    "totalBalance": free + purchased,
-                    "freeResetsAt": reset_at.isoformat() if reset_at else None,
-                    "freeMonthlyAllowance": self.FREE_MONTHLY_TOKENS,
-                }
+        if not row:
+            raise ValueError(f"User {user_id} not found")
+        free = row["free_token_balance"]
+        purchased = row["purchased_token_balance"]
+        reset_at = row["free_tokens_reset_at"]
+        balance = {
+            "freeBalance": free,
+            "purchasedBalance": purchased,
+            "totalBalance": free + purchased,
+            "freeResetsAt": reset_at.isoformat() if reset_at else None,
+            "freeMonthlyAllowance": self.FREE_MONTHLY_TOKENS,
+        }
+        _TOKEN_BALANCE_CACHE.put(self.dsn, user_id, balance)
+        return balance
 
     def check_and_reserve_tokens(self, user_id: str, estimated_tokens: int) -> Dict[str, Any]:
-        with self._connect_transactional() as conn:
+        with self.connect() as conn:
             with conn.cursor() as cur:
                 cur.execute(
-                    "SELECT free_token_balance, purchased_token_balance FROM users WHERE id = %s FOR UPDATE;",
-                    (user_id,),
+                    _RESERVE_TOKENS_SQL,
+                    {"user_id": user_id, "amount": estimated_tokens, "txn_id": str(uuid.uuid4())},
                 )
                 row = cur.fetchone()
-                if not row:
-                    return {"ok": False, "error": "user_not_found"}
-
-                free = row["free_token_balance"]
-                purchased = row["purchased_token_balance"]
-                total = free + purchased
-
-                if total < estimated_tokens:
-                    conn.rollback()
-                    return {
-                        "ok": False,
-                        "available": total,
-                        "required": estimated_tokens,
-                    }
-
-                # Deduct free first, then purchased
-                deduct_free = min(free, estimated_tokens)
-                deduct_purchased = estimated_tokens - deduct_free
-                new_free = free - deduct_free
-                new_purchased = purchased - deduct_purchased
-
-                cur.execute(
-                    """
-                    UPDATE users
-                    SET free_token_balance = %s, purchased_token_balance = %s
-                    WHERE id = %s;
-                    """,
-                    (new_free, new_purchased, user_id),
-                )
-
-                txn_id = str(__import__("uuid").uuid4())
-                now = datetime.now(timezone.utc)
-                cur.execute(
-                    """
-                    INSERT INTO token_transactions (id, user_id, transaction_type, token_amount,
-                        balance_after_free, balance_after_purchased, reference_id, description, created_at)
-                    VALUES (%s, %s, 'generation_reserve', %s, %s, %s, NULL, 'Token reservation for generation', %s);
-                    """,
-                    (txn_id, user_id, -estimated_tokens, new_free, new_purchased, now),
-                )
-                conn.commit()
-                return {
-                    "ok": True,
-                    "reserved": estimated_tokens,
-                    "deductedFree": deduct_free,
-                    "deductedPurchased": deduct_purchased,
-                    "balanceAfterFree": new_free,
-                    "balanceAfterPurchased": new_purchased,
-                }
+        _TOKEN_BALANCE_CACHE.invalidate(self.dsn, user_id)
+        if not row:
+            return {"ok": False, "error": "user_not_found"}
+        if row["balance_after_free"] is None:
+            return {
+                "ok": False,
+                "available": row["available"],
+                "required": estimated_tokens,
+            }
+        return {
+            "ok": True,
+            "reserved": estimated_tokens,
+            "balanceAfterFree": row["balance_after_free"],
+            "balanceAfterPurchased": row["balance_after_purchased"],
+        }
 
     def deduct_tokens(
         self,
@@ -998,80 +1604,54 @@ class Database:
             with self.connect() as conn:
                 with conn.cursor() as cur:
                     cur.execute(
-                        "SELECT free_token_balance, purchased_token_balance FROM users WHERE id = %s;",
-                        (user_id,),
+                        _LOG_TOKEN_DEDUCTION_SQL,
+                        {
+                            "txn_id": str(uuid.uuid4()),
+                            "user_id": user_id,
+                            "amount": -actual_tokens,
+                            "reference_id": reference_id,
+                            "description": description,
+                        },
                     )
-                    row = cur.fetchone()
-                    if row:
-                        txn_id = str(__import__("uuid").uuid4())
-                        cur.execute(
-                            """
-                            INSERT INTO token_transactions (id, user_id, transaction_type, token_amount,
-                                balance_after_free, balance_after_purchased, reference_id, description, created_at)
-                            VALUES (%s, %s, 'generation_deduct', %s, %s, %s, %s, %s, NOW());
-                            """,
-                            (txn_id, user_id, -actual_tokens, row["free_token_balance"],
-                             row["purchased_token_balance"], reference_id, description),
-                        )
             return
 
         # Refund over-reservation back to purchased_token_balance
-        with self._connect_transactional() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """
-                    UPDATE users
-                    SET purchased_token_balance = purchased_token_balance + %s
-                    WHERE id = %s;
-                    """,
-                    (refund, user_id),
-                )
-                cur.execute(
-                    "SELECT free_token_balance, purchased_token_balance FROM users WHERE id = %s;",
-                    (user_id,),
-                )
-                row = cur.fetchone()
-                txn_id = str(__import__("uuid").uuid4())
-                cur.execute(
-                    """
-                    INSERT INTO token_transactions (id, user_id, transaction_type, token_amount,
-                        balance_after_free, balance_after_purchased, reference_id, description, created_at)
-                    VALUES (%s, %s, 'generation_refund', %s, %s, %s, %s, %s, NOW());
-                    """,
-                    (txn_id, user_id, refund, row["free_token_balance"],
-                     row["purchased_token_balance"], reference_id,
-                     f"Refund {refund} tokens (estimated {estimated_tokens}, actual {actual_tokens})"),
-                )
-                conn.commit()
+        self._credit_purchased_tokens(
+            user_id,
+            refund,
+            "generation_refund",
+            reference_id,
+            f"Refund {refund} tokens (estimated {estimated_tokens}, actual {actual_tokens})",
+        )
 
     def refund_reserved_tokens(self, user_id: str, estimated_tokens: int, reference_id: str) -> None:
-        with self._connect_transactional() as conn:
+        # Refund to purchased balance (simplest — user keeps their free tokens priority)
+        self._credit_purchased_tokens(
+            user_id, estimated_tokens, "generation_refund", reference_id, "Full refund — generation failed"
+        )
+
+    def _credit_purchased_tokens(
+        self, user_id: str, amount: int, transaction_type: str, reference_id: str, description: str
+    ) -> Dict[str, Any]:
+        """Add ``amount`` to the purchased balance and log it; returns the balances after."""
+        with self.connect() as conn:
             with conn.cursor() as cur:
-                # Refund to purchased balance (simplest — user keeps their free tokens priority)
                 cur.execute(
-                    """
-                    UPDATE users
-                    SET purchased_token_balance = purchased_token_balance + %s
-                    WHERE id = %s;
-                    """,
-                    (estimated_tokens, user_id),
-                )
-                cur.execute(
-                    "SELECT free_token_balance, purchased_token_balance FROM users WHERE id = %s;",
-                    (user_id,),
+                    _CREDIT_PURCHASED_TOKENS_SQL,
+                    {
+                        "txn_id": str(uuid.uuid4()),
+                        "user_id": user_id,
+                        "amount": amount,
+                        "transaction_type": transaction_type,
+                        "reference_id": reference_id,
+                        "description": description,
+                    },
                 )
                 row = cur.fetchone()
-                txn_id = str(__import__("uuid").uuid4())
-                cur.execute(
-                    """
-                    INSERT INTO token_transactions (id, user_id, transaction_type, token_amount,
-                        balance_after_free, balance_after_purchased, reference_id, description, created_at)
-                    VALUES (%s, %s, 'generation_refund', %s, %s, %s, %s, 'Full refund — generation failed', NOW());
-                    """,
-                    (txn_id, user_id, estimated_tokens, row["free_token_balance"],
-                     row["purchased_token_balance"], reference_id),
-                )
-                conn.commit()
+        _TOKEN_BALANCE_CACHE.invalidate(self.dsn, user_id)
+        if not row:
+            raise ValueError(f"User {user_id} not found")
+        return row
 
     def fetch_user_token_transactions(
         self, user_id: str, limit: int = 20, offset: int = 0,
@@ -1118,7 +1698,8 @@ class Database:
         receipt_data: str,
         tokens_granted: int,
         price_usd: float,
-    ) -> None:
+    ) -> bool:
+        """Store a receipt; False when its store transaction was already recorded."""
         with self.connect() as conn:
             with conn.cursor() as cur:
                 cur.execute(
@@ -1126,53 +1707,30 @@ class Database:
                     INSERT INTO purchase_receipts (id, user_id, platform, product_id,
                         transaction_id, receipt_data, tokens_granted, price_usd)
                     VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                    ON CONFLICT (transaction_id) DO NOTHING;
+                    ON CONFLICT (transaction_id) DO NOTHING
+                    RETURNING id;
                     """,
                     (receipt_id, user_id, platform, product_id,
                      transaction_id, receipt_data, tokens_granted, price_usd),
                 )
+                return cur.fetchone() is not None
 
     def fetch_purchase_receipt_by_txn_id(self, transaction_id: str) -> Optional[Dict[str, Any]]:
         with self.connect() as conn:
             with conn.cursor() as cur:
                 cur.execute(
-                    "SELECT * FROM purchase_receipts WHERE transaction_id = %s;",
+                    f"select {PURCHASE_RECEIPT_COLUMNS} from purchase_receipts where transaction_id = %s;",
                     (transaction_id,),
                 )
                 return cur.fetchone()
 
     def grant_purchased_tokens(self, user_id: str, tokens: int, purchase_id: str) -> Dict[str, Any]:
-        with self._connect_transactional() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """
-                    UPDATE users
-                    SET purchased_token_balance = purchased_token_balance + %s
-                    WHERE id = %s;
-                    """,
-                    (tokens, user_id),
-                )
-                cur.execute(
-                    "SELECT free_token_balance, purchased_token_balance FROM users WHERE id = %s;",
-                    (user_id,),
-                )
-                row = cur.fetchone()
-                txn_id = str(__import__("uuid").uuid4())
-                cur.execute(
-                    """
-                    INSERT INTO token_transactions (id, user_id, transaction_type, token_amount,
-                        balance_after_free, balance_after_purchased, reference_id, description, created_at)
-                    VALUES (%s, %s, 'purchase', %s, %s, %s, %s, 'In-app purchase token grant', NOW());
-                    """,
-                    (txn_id, user_id, tokens, row["free_token_balance"],
-                     row["purchased_token_balance"], purchase_id),
-                )
-                conn.commit()
-                return {
-                    "freeBalance": row["free_token_balance"],
-                    "purchasedBalance": row["purchased_token_balance"],
-                    "totalBalance": row["free_token_balance"] + row["purchased_token_balance"],
-                }
+        row = self._credit_purchased_tokens(user_id, tokens, "purchase", purchase_id, "In-app purchase token grant")
+        return {
+            "freeBalance": row["free_token_balance"],
+            "purchasedBalance": row["purchased_token_balance"],
+            "totalBalance": row["free_token_balance"] + row["purchased_token_balance"],
+        }
 
     def fetch_user_purchases(
         self, user_id: str, limit: int = 20, offset: int = 0,
@@ -1198,7 +1756,7 @@ class Database:
                 "productId": r["product_id"],
                 "transactionId": r["transaction_id"],
                 "tokensGranted": r["tokens_granted"],
-                "priceUsd": round(float(r["price_usd"]), 2),
+                "priceUsd": r["price_usd"],
                 "status": r["status"],
                 "createdAt": r["created_at"].isoformat() if r["created_at"] else None,
             }
@@ -1208,21 +1766,26 @@ class Database:
     def create_deletion_audit_event(self, payload: Dict[str, Any]) -> None:
         with self.connect() as conn:
             with conn.cursor() as cur:
-                cur.execute(
-                    """
-                    insert into deletion_audit_events (
-                        id, entity_type, entity_id, actor, request_id,
-                        purge_storage, result, created_at
-                    ) values (
-                        %(id)s, %(entity_type)s, %(entity_id)s, %(actor)s, %(request_id)s,
-                        %(purge_storage)s, %(result)s, %(created_at)s
-                    );
-                    """,
-                    {
-                        **payload,
-                        "result": Jsonb(payload.get("result") or {}),
-                    },
-                )
+                cur.execute(_INSERT_DELETION_AUDIT_SQL, _deletion_audit_params(payload))
+
+    def create_deletion_audit_events(self, payloads: list[Dict[str, Any]]) -> int:
+        """``create_deletion_audit_event`` for a purge sweep's worth of events.
+
+        Small batches go through ``executemany``; from ``_AUDIT_COPY_ROWS`` on
+        they stream through COPY.
+        """
+        if not payloads:
+            return 0
+        params = [_deletion_audit_params(payload) for payload in payloads]
+        with self.connect() as conn:
+            with conn.cursor() as cur:
+                if len(params) < _AUDIT_COPY_ROWS:
+                    cur.executemany(_INSERT_DELETION_AUDIT_SQL, params)
+                else:
+                    with cur.copy(_DELETION_AUDIT_COPY_SQL) as copy:
+                        for row in params:
+                            copy.write_row([row[column] for column in _DELETION_AUDIT_KEYS])
+        return len(params)
 
     def fetch_deletion_audit_events(
         self,
@@ -1231,65 +1794,504 @@ class Database:
         limit: Optional[int] = None,
         offset: Optional[int] = None,
     ) -> list[Dict[str, Any]]:
-        clauses = []
-        params: Dict[str, Any] = {}
-        if entity_type:
-            clauses.append("entity_type = %(entity_type)s")
-            params["entity_type"] = entity_type
-        if entity_id:
-            clauses.append("entity_id = %(entity_id)s")
-            params["entity_id"] = entity_id
-
-        where_clause = f" where {' and '.join(clauses)}" if clauses else ""
-        limit_clause = ""
-        if limit is not None:
-            limit_clause += " limit %(limit)s"
-            params["limit"] = limit
-        if offset is not None:
-            limit_clause += " offset %(offset)s"
-            params["offset"] = offset
-
+        params = _present({"entity_type": entity_type, "entity_id": entity_id})
+        sql = _select_sql(
+            "deletion_audit_events",
+            DELETION_AUDIT_COLUMNS,
+            tuple(params),
+            "created_at desc",
+            has_limit=limit is not None,
+            has_offset=offset is not None,
+        )
         with self.connect() as conn:
             with conn.cursor() as cur:
-                cur.execute(
-                    f"""
-                    select * from deletion_audit_events
-                    {where_clause}
-                    order by created_at desc{limit_clause};
-                    """,
-                    params,
-                )
+                cur.execute(sql, _paging_params(params, limit, offset))
                 return cur.fetchall()
 
+    def iter_deletion_audit_events(
+        self,
+        entity_type: Optional[str] = None,
+        entity_id: Optional[str] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """Every matching event, newest first, streamed from a server-side cursor.
+
+        Rows arrive ``_AUDIT_EXPORT_BATCH`` at a time, so an unfiltered export
+        never holds the whole table in memory.
+        """
+        params = _present({"entity_type": entity_type, "entity_id": entity_id})
+        sql = _select_sql("deletion_audit_events", DELETION_AUDIT_COLUMNS, tuple(params), "created_at desc")
+        with self.connect() as conn:
+            # Server-side cursors live inside a transaction.
+            with conn.transaction():
+                with conn.cursor(name="deletion_audit_export") as cur:
+                    cur.itersize = _AUDIT_EXPORT_BATCH
+                    cur.execute(sql, params)
+                    yield from cur
+
     def count_deletion_audit_events(
         self,
         entity_type: Optional[str] = None,
         entity_id: Optional[str] = None,
     ) -> int:
-        clauses = []
-        params: Dict[str, Any] = {}
-        if entity_type:
-            clauses.append("entity_type = %(entity_type)s")
-            params["entity_type"] = entity_type
-        if entity_id:
-            clauses.append("entity_id = %(entity_id)s")
-            params["entity_id"] = entity_id
-        where_clause = f" where {' and '.join(clauses)}" if clauses else ""
+        params = _present({"entity_type": entity_type, "entity_id": entity_id})
         with self.connect() as conn:
             with conn.cursor() as cur:
-                cur.execute(f"select count(*) from deletion_audit_events{where_clause};", params)
-                row = cur.fetchone()
-                return int(list(row.values())[0]) if row else 0
+                cur.execute(_count_sql("deletion_audit_events", tuple(params)), params)
+                return _count(cur)
+
+@contextmanager
+def request_session() -> Iterator[None]:
+    """``Database.session()`` for the configured DSN, or a no-op when none is set."""
+    dsn = os.getenv("DATABASE_URL")
+    if not dsn:
+        yield
+        return
+    with Database(dsn=dsn).session():
+        yield
+
+
+@contextmanager
+def suspended_session() -> Iterator[None]:
+    """Run the block outside any active session, releasing its connection first.
+
+    For long non-database work inside a request (e.g. an inline job), so the
+    request does not pin a pooled connection while it runs.
+    """
+    session = _SESSION.get()
+    if session is None:
+        yield
+        return
+    session.release()
+    token = _SESSION.set(None)
+    try:
+        yield
+    finally:
+        _SESSION.reset(token)
+
+
+# DSNs migrated by this process. Migrations only change on deploy, so once a
+# DSN is up to date later get_database() calls skip the round-trip.
+_MIGRATED_DSNS: set[str] = set()
+
 
 def get_database() -> Database:
     dsn = os.getenv("DATABASE_URL")
     if not dsn:
         raise RuntimeError("DATABASE_URL must be set for database access.")
     db = Database(dsn=dsn)
-    db.migrate()
+    if dsn not in _MIGRATED_DSNS:
+        # Racing first callers both migrate; the advisory lock makes that safe.
+        db.migrate()
+        _MIGRATED_DSNS.add(dsn)
     return db
 
 
+# Async pools, also one per DSN, for handlers running on the event loop. They
+# share the sync pools' settings but are opened lazily, since an async pool
+# binds to the running loop.
+_ASYNC_POOLS: dict[str, AsyncConnectionPool] = {}
+_ASYNC_CHECK_CONNECTION = AsyncConnectionPool.check_connection
+
+
+async def _configure_async_connection(conn: psycopg.AsyncConnection) -> None:
+    _configure_connection(conn)
+
+
+async def _async_pool_for(dsn: str) -> AsyncConnectionPool:
+    pool = _ASYNC_POOLS.get(dsn)
+    if pool is not None:
+        return pool
+    # Single-threaded on the loop, and nothing awaits between the lookup and
+    # the store, so no lock is needed; open() is idempotent.
+    pool = AsyncConnectionPool(
+        dsn,
+        min_size=int(os.getenv("PLC_DB_POOL_MIN_SIZE", "4")),
+        max_size=int(os.getenv("PLC_DB_POOL_MAX_SIZE", "20")),
+        kwargs={
+            "row_factory": dict_row,
+            "autocommit": True,
+            "prepare_threshold": _prepare_threshold(),
+        },
+        configure=_configure_async_connection,
+        check=_ASYNC_CHECK_CONNECTION,
+        max_idle=float(os.getenv("PLC_DB_POOL_MAX_IDLE_SEC", "300")),
+        timeout=float(os.getenv("PLC_DB_POOL_TIMEOUT_SEC", "30")),
+        name="pegasus-db-async",
+        open=False,
+    )
+    _ASYNC_POOLS[dsn] = pool
+    await pool.open()
+    return pool
+
+
+async def close_async_pools() -> None:
+    pools = list(_ASYNC_POOLS.values())
+    _ASYNC_POOLS.clear()
+    for pool in pools:
+        await pool.close()
+
+
+@dataclass(frozen=True)
+class AsyncDatabase:
+    """Awaitable versions of the hot ``Database`` reads, for ``async def`` handlers.
+
+    Runs the same statements as the sync methods, so the two share prepared
+    statement shapes and indexes; while one query waits on the server, the
+    event loop serves other requests.
+    """
+
+    dsn: str
+
+    async def _fetchall(self, sql: str, params: Any) -> list[Dict[str, Any]]:
+        pool = await _async_pool_for(self.dsn)
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(sql, params)
+                return await cur.fetchall()
+
+    async def _fetchone(self, sql: str, params: Any) -> Optional[Dict[str, Any]]:
+        pool = await _async_pool_for(self.dsn)
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(sql, params)
+                return await cur.fetchone()
+
+    async def _count(self, table: str, params: Dict[str, Any]) -> int:
+        row = await self._fetchone(_count_sql(table, tuple(params)), params)
+        return int(row["total"]) if row else 0
+
+    async def _fetch_page(
+        self,
+        table: str,
+        columns: str,
+        params: Dict[str, Any],
+        order_by: str,
+        limit: Optional[int],
+        offset: Optional[int],
+    ) -> tuple[list[Dict[str, Any]], int]:
+        """``Database._fetch_page``: one page plus the window total."""
+        filters = tuple(params)
+        sql = _select_sql(
+            table,
+            columns,
+            filters,
+            order_by,
+            has_limit=limit is not None,
+            has_offset=offset is not None,
+            window_total=True,
+        )
+        rows = await self._fetchall(sql, _paging_params(params, limit, offset))
+        if rows:
+            total = rows[0]["_total"]
+            for row in rows:
+                del row["_total"]
+            return rows, int(total)
+        if not offset and limit != 0:
+            return rows, 0
+        row = await self._fetchone(_count_sql(table, filters), params)
+        return rows, int(row["total"]) if row else 0
+
+    async def _fetch_keyset(
+        self,
+        table: str,
+        columns: str,
+        params: Dict[str, Any],
+        before: Optional[tuple[datetime, str]],
+        limit: Optional[int],
+    ) -> tuple[list[Dict[str, Any]], bool]:
+        """``Database._fetch_keyset``: one keyset page and whether more rows follow."""
+        sql = _select_sql(
+            table, columns, tuple(params), _RECENT_FIRST, has_limit=limit is not None, seek=before is not None
+        )
+        if before is not None:
+            params["before_created_at"], params["before_id"] = before
+        if limit is not None:
+            params["limit"] = limit + 1
+        rows = await self._fetchall(sql, params)
+        if limit is not None and len(rows) > limit:
+            return rows[:limit], True
+        return rows, False
+
+    async def fetch_lecture(self, lecture_id: str) -> Optional[Dict[str, Any]]:
+        return await self._fetchone(_FETCH_LECTURE_SQL, (lecture_id,))
+
+    async def fetch_lectures(
+        self,
+        course_id: Optional[str] = None,
+        status: Optional[str] = None,
+        preset_id: Optional[str] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+    ) -> list[Dict[str, Any]]:
+        params = _present({"course_id": course_id, "status": status, "preset_id": preset_id})
+        sql = _select_sql(
+            "lectures",
+            LECTURE_COLUMNS,
+            tuple(params),
+            _RECENT_FIRST,
+            has_limit=limit is not None,
+            has_offset=offset is not None,
+        )
+        return await self._fetchall(sql, _paging_params(params, limit, offset))
+
+    async def fetch_lectures_page(
+        self,
+        course_id: Optional[str] = None,
+        status: Optional[str] = None,
+        preset_id: Optional[str] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+    ) -> tuple[list[Dict[str, Any]], int]:
+        params = _present({"course_id": course_id, "status": status, "preset_id": preset_id})
+        return await self._fetch_page("lectures", LECTURE_COLUMNS, params, _RECENT_FIRST, limit, offset)
+
+    async def fetch_lectures_before(
+        self,
+        before: Optional[tuple[datetime, str]],
+        course_id: Optional[str] = None,
+        status: Optional[str] = None,
+        preset_id: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> tuple[list[Dict[str, Any]], bool]:
+        params = _present({"course_id": course_id, "status": status, "preset_id": preset_id})
+        return await self._fetch_keyset("lectures", LECTURE_COLUMNS, params, before, limit)
+
+    async def count_lectures(
+        self,
+        course_id: Optional[str] = None,
+        status: Optional[str] = None,
+        preset_id: Optional[str] = None,
+    ) -> int:
+        return await self._count(
+            "lectures", _present({"course_id": course_id, "status": status, "preset_id": preset_id})
+        )
+
+    async def count_jobs(self, lecture_id: Optional[str] = None) -> int:
+        return await self._count("jobs", _present({"lecture_id": lecture_id}))
+
+    async def fetch_artifacts(
+        self,
+        lecture_id: str,
+        artifact_type: Optional[str] = None,
+        preset_id: Optional[str] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+    ) -> list[Dict[str, Any]]:
+        params = {"lecture_id": lecture_id, **_present({"artifact_type": artifact_type, "preset_id": preset_id})}
+        sql = _select_sql(
+            "artifacts",
+            ARTIFACT_COLUMNS,
+            tuple(params),
+            "artifact_type",
+            has_limit=limit is not None,
+            has_offset=offset is not None,
+        )
+        return await self._fetchall(sql, _paging_params(params, limit, offset))
+
+    async def count_artifacts(
+        self,
+        lecture_id: str,
+        artifact_type: Optional[str] = None,
+        preset_id: Optional[str] = None,
+    ) -> int:
+        params = {"lecture_id": lecture_id, **_present({"artifact_type": artifact_type, "preset_id": preset_id})}
+        return await self._count("artifacts", params)
+
+    async def fetch_threads(self, lecture_id: str) -> list[Dict[str, Any]]:
+        return await self._fetchall(_FETCH_THREADS_FOR_LECTURE_SQL, (Jsonb([lecture_id]),))
+
+    async def fetch_threads_for_course(
+        self,
+        course_id: str,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+    ) -> list[Dict[str, Any]]:
+        sql = _select_sql(
+            "threads",
+            THREAD_LIST_COLUMNS,
+            ("course_id",),
+            _RECENT_FIRST,
+            has_limit=limit is not None,
+            has_offset=offset is not None,
+        )
+        return await self._fetchall(sql, _paging_params({"course_id": course_id}, limit, offset))
+
+    async def count_threads_for_course(self, course_id: str) -> int:
+        return await self._count("threads", {"course_id": course_id})
+
+
+def get_async_database() -> AsyncDatabase:
+    """``get_database`` for async handlers; migrations are left to the sync startup path."""
+    dsn = os.getenv("DATABASE_URL")
+    if not dsn:
+        raise RuntimeError("DATABASE_URL must be set for database access.")
+    return AsyncDatabase(dsn=dsn)
+
+
+def _iso_utc(column: str) -> str:
+    return f"to_char({column} at time zone 'UTC', 'YYYY-MM-DD\"T\"HH24:MI:SS.US\"+00:00\"') AS {column}"
+
+
+# Timestamps in the thread-metrics, context-file and rotation-state reads leave
+# the server as ISO-8601 text in UTC, so rows need no isoformat() per column.
+# The aliases shadow the columns, so ORDER BY names them table-qualified to sort
+# on the timestamp (and its index) rather than the text.
+_ISO_TIMESTAMPS = f"{_iso_utc('created_at')}, {_iso_utc('updated_at')}"
+
+
+@cache
+def _camel(column: str) -> str:
+    head, *rest = column.split("_")
+    return head + "".join(part.title() for part in rest)
+
+
+def camel_dict_row(cursor) -> Any:
+    """Row factory keying each row by camelCase column name (``course_id`` -> ``courseId``).
+
+    For reads whose API shape is the row itself: the keys are worked out once
+    per result, and each row is a single ``dict(zip(...))``.
+    """
+    if cursor.description is None:
+        return no_result
+    keys = [_camel(column.name) for column in cursor.description]
+
+    def make_row(values) -> Dict[str, Any]:
+        return dict(zip(keys, values))
+
+    return make_row
+
+
+# Thread metrics, context files and dice rotation states are module-level
+# functions over a caller's connection; their statements are module constants
+# (or _select_sql shapes) so every call reuses one string and prepared plan.
+THREAD_METRICS_COLUMNS = (
+    "id, lecture_id, course_id, detected_at, "
+    "new_threads_detected, existing_threads_updated, total_threads_after, "
+    "avg_complexity_level, complexity_distribution, change_type_distribution, "
+    "avg_evidence_length, threads_with_evidence, "
+    "detection_method, api_response_time_ms, token_usage, retry_count, "
+    "model_name, llm_provider, success, error_message, quality_score"
+)
+_INSERT_THREAD_METRICS_SQL = f"""
+    INSERT INTO thread_metrics ({THREAD_METRICS_COLUMNS})
+    VALUES (
+        %(id)s, %(lecture_id)s, %(course_id)s, %(detected_at)s,
+        %(new_threads_detected)s, %(existing_threads_updated)s, %(total_threads_after)s,
+        %(avg_complexity_level)s, %(complexity_distribution)s, %(change_type_distribution)s,
+        %(avg_evidence_length)s, %(threads_with_evidence)s,
+        %(detection_method)s, %(api_response_time_ms)s, %(token_usage)s, %(retry_count)s,
+        %(model_name)s, %(llm_provider)s, %(success)s, %(error_message)s, %(quality_score)s
+    )
+"""
+# Numerics are cast so any connection returns floats, and empty JSON
+# distributions come back as {} (token usage as null) without a Python pass.
+# These reads use binary cursors, which are cheaper to parse than text for
+# float8, int, bool and jsonb (timestamps go out as text). The casts matter
+# there: the pool's numeric-as-float loader only covers the text format.
+_THREAD_METRICS_READ_COLUMNS = f"""
+    id, lecture_id, course_id, {_iso_utc("detected_at")},
+    new_threads_detected, existing_threads_updated, total_threads_after,
+    avg_complexity_level::float8 AS avg_complexity_level,
+    coalesce(complexity_distribution, '{{}}') AS complexity_distribution,
+    coalesce(change_type_distribution, '{{}}') AS change_type_distribution,
+    avg_evidence_length::float8 AS avg_evidence_length, threads_with_evidence,
+    detection_method, api_response_time_ms::float8 AS api_response_time_ms,
+    nullif(token_usage, '{{}}') AS token_usage, retry_count,
+    model_name, llm_provider, success, error_message,
+    quality_score::float8 AS quality_score, {_iso_utc("created_at")}
+"""
+_FETCH_THREAD_METRICS_BY_LECTURE_SQL = f"""
+    SELECT {_THREAD_METRICS_READ_COLUMNS}
+    FROM thread_metrics
+    WHERE lecture_id = %(lecture_id)s
+    ORDER BY thread_metrics.detected_at DESC
+"""
+# Course listings render one card per detection; the JSON distributions,
+# token usage and model details are loaded per row by fetch_thread_metric_detail.
+_THREAD_METRICS_LIST_COLUMNS = f"""
+    id, lecture_id, course_id, {_iso_utc("detected_at")},
+    new_threads_detected, existing_threads_updated, total_threads_after,
+    detection_method, success, quality_score::float8 AS quality_score
+"""
+_FETCH_THREAD_METRICS_LIST_SQL = f"""
+    SELECT {_THREAD_METRICS_LIST_COLUMNS}
+    FROM thread_metrics
+    WHERE course_id = %(course_id)s
+    ORDER BY thread_metrics.detected_at DESC
+    LIMIT %(limit)s
+"""
+_FETCH_THREAD_METRIC_SQL = f"""
+    SELECT {_THREAD_METRICS_READ_COLUMNS}
+    FROM thread_metrics
+    WHERE id = %(id)s
+"""
+# Averages are cast in SQL, so a genuine 0.0 stays 0.0; the overall ones read
+# 0 rather than null for a course with no detections. A null course_id means
+# every course, so both callers share one statement text (and one prepared plan).
+_THREAD_METRICS_SUMMARY_SQL = """
+    SELECT
+        COUNT(*) as total_detections,
+        coalesce(AVG(new_threads_detected), 0)::float8 as avg_new_threads,
+        coalesce(AVG(existing_threads_updated), 0)::float8 as avg_updates,
+        coalesce(AVG(quality_score), 0)::float8 as avg_quality_score,
+        coalesce(AVG(api_response_time_ms), 0)::float8 as avg_response_time_ms,
+        COUNT(*) FILTER (WHERE success) as successful_detections,
+        COUNT(DISTINCT detection_method) as methods_used,
+        (AVG(quality_score) FILTER (WHERE detection_method = 'openai'))::float8 as openai_avg_quality,
+        (AVG(quality_score) FILTER (WHERE detection_method = 'fallback'))::float8 as fallback_avg_quality
+    FROM thread_metrics
+    WHERE (%(course_id)s::text IS NULL OR course_id = %(course_id)s)
+"""
+
+
+def _thread_metrics_params(
+    metrics_id: str,
+    lecture_id: str,
+    course_id: str,
+    detected_at: str,
+    new_threads_detected: int,
+    existing_threads_updated: int,
+    total_threads_after: int,
+    avg_complexity_level: float,
+    complexity_distribution: dict,
+    change_type_distribution: dict,
+    avg_evidence_length: float,
+    threads_with_evidence: int,
+    detection_method: str,
+    api_response_time_ms: float | None,
+    token_usage: dict | None,
+    retry_count: int,
+    model_name: str | None,
+    llm_provider: str | None,
+    success: bool,
+    error_message: str | None,
+    quality_score: float,
+) -> Dict[str, Any]:
+    return {
+        "id": metrics_id,
+        "lecture_id": lecture_id,
+        "course_id": course_id,
+        "detected_at": detected_at,
+        "new_threads_detected": new_threads_detected,
+        "existing_threads_updated": existing_threads_updated,
+        "total_threads_after": total_threads_after,
+        "avg_complexity_level": avg_complexity_level,
+        "complexity_distribution": Jsonb(complexity_distribution),
+        "change_type_distribution": Jsonb(change_type_distribution),
+        "avg_evidence_length": avg_evidence_length,
+        "threads_with_evidence": threads_with_evidence,
+        "detection_method": detection_method,
+        "api_response_time_ms": api_response_time_ms,
+        "token_usage": Jsonb(token_usage) if token_usage else None,
+        "retry_count": retry_count,
+        "model_name": model_name,
+        "llm_provider": llm_provider,
+        "success": success,
+        "error_message": error_message,
+        "quality_score": quality_score,
+    }
+
+
 def insert_thread_metrics(
     conn,
     metrics_id: str,
@@ -1315,200 +2317,111 @@ def insert_thread_metrics(
     quality_score: float,
 ):
     """Insert thread detection metrics into the database."""
-    import json
-
+    params = _thread_metrics_params(
+        metrics_id, lecture_id, course_id, detected_at,
+        new_threads_detected, existing_threads_updated, total_threads_after,
+        avg_complexity_level, complexity_distribution, change_type_distribution,
+        avg_evidence_length, threads_with_evidence,
+        detection_method, api_response_time_ms, token_usage, retry_count,
+        model_name, llm_provider, success, error_message, quality_score,
+    )
     with conn.cursor() as cur:
-        cur.execute(
-            """
-            INSERT INTO thread_metrics (
-                id, lecture_id, course_id, detected_at,
-                new_threads_detected, existing_threads_updated, total_threads_after,
-                avg_complexity_level, complexity_distribution, change_type_distribution,
-                avg_evidence_length, threads_with_evidence,
-                detection_method, api_response_time_ms, token_usage, retry_count,
-                model_name, llm_provider, success, error_message, quality_score
-            ) VALUES (
-                %(id)s, %(lecture_id)s, %(course_id)s, %(detected_at)s,
-                %(new_threads_detected)s, %(existing_threads_updated)s, %(total_threads_after)s,
-                %(avg_complexity_level)s, %(complexity_distribution)s, %(change_type_distribution)s,
-                %(avg_evidence_length)s, %(threads_with_evidence)s,
-                %(detection_method)s, %(api_response_time_ms)s, %(token_usage)s, %(retry_count)s,
-                %(model_name)s, %(llm_provider)s, %(success)s, %(error_message)s, %(quality_score)s
-            )
-            """,
-            {
-                "id": metrics_id,
-                "lecture_id": lecture_id,
-                "course_id": course_id,
-                "detected_at": detected_at,
-                "new_threads_detected": new_threads_detected,
-                "existing_threads_updated": existing_threads_updated,
-                "total_threads_after": total_threads_after,
-                "avg_complexity_level": avg_complexity_level,
-                "complexity_distribution": json.dumps(complexity_distribution),
-                "change_type_distribution": json.dumps(change_type_distribution),
-                "avg_evidence_length": avg_evidence_length,
-                "threads_with_evidence": threads_with_evidence,
-                "detection_method": detection_method,
-                "api_response_time_ms": api_response_time_ms,
-                "token_usage": json.dumps(token_usage) if token_usage else None,
-                "retry_count": retry_count,
-                "model_name": model_name,
-                "llm_provider": llm_provider,
-                "success": success,
-                "error_message": error_message,
-                "quality_score": quality_score,
-            },
-        )
+        cur.execute(_INSERT_THREAD_METRICS_SQL, params)
     # conn.commit()
 
 
 def fetch_thread_metrics_by_lecture(conn, lecture_id: str):
     """Fetch thread metrics for a specific lecture."""
-    import json
+    with conn.cursor(row_factory=camel_dict_row, binary=True) as cur:
+        cur.execute(_FETCH_THREAD_METRICS_BY_LECTURE_SQL, {"lecture_id": lecture_id})
+        return cur.fetchall()
 
-    with conn.cursor(row_factory=dict_row) as cur:
-        cur.execute(
-            """
-            SELECT
-                id, lecture_id, course_id, detected_at,
-                new_threads_detected, existing_threads_updated, total_threads_after,
-                avg_complexity_level, complexity_distribution, change_type_distribution,
-                avg_evidence_length, threads_with_evidence,
-                detection_method, api_response_time_ms, token_usage, retry_count,
-                model_name, llm_provider, success, error_message, quality_score,
-                created_at
-            FROM thread_metrics
-            WHERE lecture_id = %(lecture_id)s
-            ORDER BY detected_at DESC
-            """,
-            {"lecture_id": lecture_id},
-        )
-        rows = cur.fetchall()
-
-    return [
-        {
-            "id": row["id"],
-            "lectureId": row["lecture_id"],
-            "courseId": row["course_id"],
-            "detectedAt": row["detected_at"].isoformat() if row["detected_at"] else None,
-            "newThreadsDetected": row["new_threads_detected"],
-            "existingThreadsUpdated": row["existing_threads_updated"],
-            "totalThreadsAfter": row["total_threads_after"],
-            "avgComplexityLevel": float(row["avg_complexity_level"]) if row["avg_complexity_level"] else None,
-            "complexityDistribution": json.loads(row["complexity_distribution"]) if row["complexity_distribution"] else {},
-            "changeTypeDistribution": json.loads(row["change_type_distribution"]) if row["change_type_distribution"] else {},
-            "avgEvidenceLength": float(row["avg_evidence_length"]) if row["avg_evidence_length"] else None,
-            "threadsWithEvidence": row["threads_with_evidence"],
-            "detectionMethod": row["detection_method"],
-            "apiResponseTimeMs": float(row["api_response_time_ms"]) if row["api_response_time_ms"] else None,
-            "tokenUsage": json.loads(row["token_usage"]) if row["token_usage"] else None,
-            "retryCount": row["retry_count"],
-            "modelName": row["model_name"],
-            "llmProvider": row["llm_provider"],
-            "success": row["success"],
-            "errorMessage": row["error_message"],
-            "qualityScore": float(row["quality_score"]) if row["quality_score"] else None,
-            "createdAt": row["created_at"].isoformat() if row["created_at"] else None,
-        }
-        for row in rows
-    ]
 
+def fetch_thread_metrics_list(conn, course_id: str, limit: int = 50):
+    """Fetch the newest detections for a course, without the heavy JSON columns."""
+    with conn.cursor(row_factory=camel_dict_row, binary=True) as cur:
+        cur.execute(_FETCH_THREAD_METRICS_LIST_SQL, {"course_id": course_id, "limit": limit})
+        return cur.fetchall()
 
-def fetch_thread_metrics_by_course(conn, course_id: str, limit: int = 50):
-    """Fetch thread metrics for all lectures in a course."""
-    import json
 
-    with conn.cursor(row_factory=dict_row) as cur:
-        cur.execute(
-            """
-            SELECT
-                id, lecture_id, course_id, detected_at,
-                new_threads_detected, existing_threads_updated, total_threads_after,
-                avg_complexity_level, complexity_distribution, change_type_distribution,
-                avg_evidence_length, threads_with_evidence,
-                detection_method, api_response_time_ms, token_usage, retry_count,
-                model_name, llm_provider, success, error_message, quality_score,
-                created_at
-            FROM thread_metrics
-            WHERE course_id = %(course_id)s
-            ORDER BY detected_at DESC
-            LIMIT %(limit)s
-            """,
-            {"course_id": course_id, "limit": limit},
-        )
-        rows = cur.fetchall()
-
-    return [
-        {
-            "id": row["id"],
-            "lectureId": row["lecture_id"],
-            "courseId": row["course_id"],
-            "detectedAt": row["detected_at"].isoformat() if row["detected_at"] else None,
-            "newThreadsDetected": row["new_threads_detected"],
-            "existingThreadsUpdated": row["existing_threads_updated"],
-            "totalThreadsAfter": row["total_threads_after"],
-            "avgComplexityLevel": float(row["avg_complexity_level"]) if row["avg_complexity_level"] else None,
-            "complexityDistribution": json.loads(row["complexity_distribution"]) if row["complexity_distribution"] else {},
-            "changeTypeDistribution": json.loads(row["change_type_distribution"]) if row["change_type_distribution"] else {},
-            "avgEvidenceLength": float(row["avg_evidence_length"]) if row["avg_evidence_length"] else None,
-            "threadsWithEvidence": row["threads_with_evidence"],
-            "detectionMethod": row["detection_method"],
-            "apiResponseTimeMs": float(row["api_response_time_ms"]) if row["api_response_time_ms"] else None,
-            "tokenUsage": json.loads(row["token_usage"]) if row["token_usage"] else None,
-            "retryCount": row["retry_count"],
-            "modelName": row["model_name"],
-            "llmProvider": row["llm_provider"],
-            "success": row["success"],
-            "errorMessage": row["error_message"],
-            "qualityScore": float(row["quality_score"]) if row["quality_score"] else None,
-            "createdAt": row["created_at"].isoformat() if row["created_at"] else None,
-        }
-        for row in rows
-    ]
+def fetch_thread_metric_detail(conn, metrics_id: str):
+    """Fetch every column of one detection's metrics, or None."""
+    with conn.cursor(row_factory=camel_dict_row, binary=True) as cur:
+        cur.execute(_FETCH_THREAD_METRIC_SQL, {"id": metrics_id})
+        return cur.fetchone()
 
 
 def fetch_thread_metrics_summary(conn, course_id: str | None = None):
     """Fetch aggregated thread metrics summary."""
-    with conn.cursor(row_factory=dict_row) as cur:
-        where_clause = "WHERE course_id = %(course_id)s" if course_id else ""
-        cur.execute(
-            f"""
-            SELECT
-                COUNT(*) as total_detections,
-                AVG(new_threads_detected) as avg_new_threads,
-                AVG(existing_threads_updated) as avg_updates,
-                AVG(quality_score) as avg_quality_score,
-                AVG(api_response_time_ms) as avg_response_time,
-                SUM(CASE WHEN success = true THEN 1 ELSE 0 END) as successful_detections,
-                COUNT(DISTINCT detection_method) as methods_used,
-                AVG(CASE WHEN detection_method = 'openai' THEN quality_score ELSE NULL END) as openai_avg_quality,
-                AVG(CASE WHEN detection_method = 'fallback' THEN quality_score ELSE NULL END) as fallback_avg_quality
-            FROM thread_metrics
-            {where_clause}
-            """,
-            {"course_id": course_id} if course_id else {},
-        )
-        row = cur.fetchone()
+    with conn.cursor(row_factory=camel_dict_row, binary=True) as cur:
+        cur.execute(_THREAD_METRICS_SUMMARY_SQL, {"course_id": course_id or None})
+        summary = cur.fetchone()
 
-    if not row:
+    if not summary:
         return None
 
+    total = summary["totalDetections"]
+    summary["successRate"] = round(summary["successfulDetections"] / total * 100, 1) if total else 0
+    return summary
+
+
+# Context Files CRUD
+CONTEXT_FILE_LIST_COLUMNS = f"id, course_id, filename, file_path, file_size, file_type, tag, {_ISO_TIMESTAMPS}"
+_INSERT_CONTEXT_FILE_SQL = """
+    INSERT INTO context_files (
+        id, course_id, filename, file_path, file_size, file_type,
+        tag, extracted_text, created_at, updated_at
+    ) VALUES (
+        %(id)s, %(course_id)s, %(filename)s, %(file_path)s, %(file_size)s, %(file_type)s,
+        %(tag)s, %(extracted_text)s, %(created_at)s, %(updated_at)s
+    )
+"""
+_CONTEXT_FILE_COLUMNS = (
+    "id", "course_id", "filename", "file_path", "file_size", "file_type",
+    "tag", "extracted_text", "created_at", "updated_at",
+)
+_CONTEXT_FILE_COPY_SQL = f"COPY context_files ({', '.join(_CONTEXT_FILE_COLUMNS)}) FROM STDIN"
+_CONTEXT_FILE_COPY_ROWS = 1000
+_STREAM_BATCH = 2000
+
+
+@contextmanager
+def pipelined(conn) -> Iterator[None]:
+    """Send the statements executed inside the block without waiting on each result.
+
+    Callers running N statements back to back should wrap them in this, so
+    they cost about one round-trip instead of N. Results and errors are
+    collected when the block exits.
+    """
+    with conn.pipeline():
+        yield
+
+
+def _context_file_params(
+    file_id: str,
+    course_id: str,
+    filename: str,
+    file_path: str,
+    file_size: int,
+    file_type: str,
+    tag: str,
+    extracted_text: str | None,
+    created_at: str,
+) -> Dict[str, Any]:
     return {
-        "totalDetections": row["total_detections"],
-        "avgNewThreads": float(row["avg_new_threads"]) if row["avg_new_threads"] else 0,
-        "avgUpdates": float(row["avg_updates"]) if row["avg_updates"] else 0,
-        "avgQualityScore": float(row["avg_quality_score"]) if row["avg_quality_score"] else 0,
-        "avgResponseTimeMs": float(row["avg_response_time"]) if row["avg_response_time"] else 0,
-        "successfulDetections": row["successful_detections"],
-        "methodsUsed": row["methods_used"],
-        "openaiAvgQuality": float(row["openai_avg_quality"]) if row["openai_avg_quality"] else None,
-        "fallbackAvgQuality": float(row["fallback_avg_quality"]) if row["fallback_avg_quality"] else None,
-        "successRate": round((row["successful_detections"] / row["total_detections"] * 100) if row["total_detections"] > 0 else 0, 1),
+        "id": file_id,
+        "course_id": course_id,
+        "filename": filename,
+        "file_path": file_path,
+        "file_size": file_size,
+        "file_type": file_type,
+        "tag": tag,
+        "extracted_text": extracted_text,
+        "created_at": created_at,
+        "updated_at": created_at,
     }
 
 
-# Context Files CRUD
 def insert_context_file(
     conn,
     file_id: str,
@@ -1520,108 +2433,91 @@ def insert_context_file(
     tag: str,
     extracted_text: str | None,
     created_at: str,
+    pipeline: bool = False,
 ):
     """Insert a context file record."""
-    with conn.cursor() as cur:
-        cur.execute(
-            """
-            INSERT INTO context_files (
-                id, course_id, filename, file_path, file_size, file_type,
-                tag, extracted_text, created_at, updated_at
-            ) VALUES (
-                %(id)s, %(course_id)s, %(filename)s, %(file_path)s, %(file_size)s, %(file_type)s,
-                %(tag)s, %(extracted_text)s, %(created_at)s, %(updated_at)s
-            )
-            """,
-            {
-                "id": file_id,
-                "course_id": course_id,
-                "filename": filename,
-                "file_path": file_path,
-                "file_size": file_size,
-                "file_type": file_type,
-                "tag": tag,
-                "extracted_text": extracted_text,
-                "created_at": created_at,
-                "updated_at": created_at,
-            },
-        )
+    params = _context_file_params(
+        file_id, course_id, filename, file_path, file_size, file_type, tag, extracted_text, created_at
+    )
+    with pipelined(conn) if pipeline else nullcontext(), conn.cursor() as cur:
+        cur.execute(_INSERT_CONTEXT_FILE_SQL, params)
     # conn.commit()
 
 
+def bulk_insert_context_files(conn, rows: list[Dict[str, Any]]) -> int:
+    """Insert many context file records; each row takes ``insert_context_file``'s keyword arguments.
+
+    Batches up to ``_CONTEXT_FILE_COPY_ROWS`` go through ``executemany``, which
+    psycopg pipelines into about one round-trip. Larger loads stream through
+    COPY instead, skipping the per-row statement entirely.
+    """
+    if not rows:
+        return 0
+    params = [_context_file_params(**row) for row in rows]
+    with conn.cursor() as cur:
+        if len(params) < _CONTEXT_FILE_COPY_ROWS:
+            cur.executemany(_INSERT_CONTEXT_FILE_SQL, params)
+        else:
+            with cur.copy(_CONTEXT_FILE_COPY_SQL) as copy:
+                for row in params:
+                    copy.write_row([row[column] for column in _CONTEXT_FILE_COLUMNS])
+    return len(params)
+
+
+def _context_files_query(course_id: str | None, tag: str | None) -> tuple[str, Dict[str, Any]]:
+    # One cached statement per filter shape, like the Database list queries.
+    params = _present({"course_id": course_id, "tag": tag})
+    return _select_sql("context_files", CONTEXT_FILE_LIST_COLUMNS, tuple(params), "context_files.created_at desc"), params
+
+
 def fetch_context_files(conn, course_id: str | None = None, tag: str | None = None):
     """Fetch context files, optionally filtered."""
-    with conn.cursor(row_factory=dict_row) as cur:
-        where_clauses = []
-        params = {}
-
-        if course_id:
-            where_clauses.append("course_id = %(course_id)s")
-            params["course_id"] = course_id
-
-        if tag:
-            where_clauses.append("tag = %(tag)s")
-            params["tag"] = tag
-
-        where_sql = f"WHERE {' AND '.join(where_clauses)}" if where_clauses else ""
-
-        cur.execute(
-            f"""
-            SELECT id, course_id, filename, file_path, file_size, file_type,
-                   tag, created_at, updated_at
-            FROM context_files
-            {where_sql}
-            ORDER BY created_at DESC
-            """,
-            params,
-        )
-        rows = cur.fetchall()
-
-    return [
-        {
-            "id": row["id"],
-            "courseId": row["course_id"],
-            "filename": row["filename"],
-            "filePath": row["file_path"],
-            "fileSize": row["file_size"],
-            "fileType": row["file_type"],
-            "tag": row["tag"],
-            "createdAt": row["created_at"].isoformat() if row["created_at"] else None,
-            "updatedAt": row["updated_at"].isoformat() if row["updated_at"] else None,
-        }
-        for row in rows
-    ]
+    sql, params = _context_files_query(course_id, tag)
+    with conn.cursor(row_factory=camel_dict_row) as cur:
+        cur.execute(sql, params)
+        return cur.fetchall()
+
+
+def iter_context_files(
+    conn, course_id: str | None = None, tag: str | None = None, itersize: int = _STREAM_BATCH
+) -> Iterator[Dict[str, Any]]:
+    """Stream ``fetch_context_files`` rows through a server-side cursor, ``itersize`` per round-trip."""
+    sql, params = _context_files_query(course_id, tag)
+    # Named cursors only live inside a transaction.
+    with conn.transaction():
+        with conn.cursor(name="ctx_files_stream", row_factory=camel_dict_row) as cur:
+            cur.itersize = itersize
+            cur.execute(sql, params)
+            yield from cur
+
+
+_FETCH_CONTEXT_FILE_SQL = f"""
+    SELECT id, course_id, filename, file_path, file_size, file_type,
+           tag, extracted_text, {_ISO_TIMESTAMPS}
+    FROM context_files
+    WHERE id = %(file_id)s
+"""
 
 
 def fetch_context_file_by_id(conn, file_id: str):
     """Fetch a single context file by ID."""
-    with conn.cursor(row_factory=dict_row) as cur:
-        cur.execute(
-            """
-            SELECT id, course_id, filename, file_path, file_size, file_type,
-                   tag, extracted_text, created_at, updated_at
-            FROM context_files
-            WHERE id = %(file_id)s
-            """,
-            {"file_id": file_id},
-        )
-        row = cur.fetchone()
+    with conn.cursor(row_factory=camel_dict_row) as cur:
+        cur.execute(_FETCH_CONTEXT_FILE_SQL, {"file_id": file_id})
+        return cur.fetchone()
 
-    if not row:
-        return None
 
-    return {
-        "id": row["id"],
-        "courseId": row["course_id"],
-        "filename": row["filename"],
-        "filePath": row["file_path"],
-        "fileSize": row["file_size"],
-        "fileType": row["file_type"],
-        "tag": row["tag"],
-        "extractedText": row["extracted_text"],
-        "createdAt": row["created_at"].isoformat() if row["created_at"] else None,
-        "updatedAt": row["updated_at"].isoformat() if row["updated_at"] else None,
-    }
+# Both buckets in one row: no per-file rows cross the wire or need joining.
+_CONTEXT_TEXT_FOR_COURSE_SQL = """
+    SELECT
+        string_agg(chunk, E'\\n\\n' ORDER BY created_at) FILTER (WHERE tag = 'SYLLABUS') AS syllabus,
+        string_agg(chunk, E'\\n\\n' ORDER BY created_at) FILTER (WHERE tag <> 'SYLLABUS') AS notes
+    FROM (
+        SELECT tag, '=== ' || filename || E' ===\\n' || extracted_text AS chunk, created_at
+        FROM context_files
+        WHERE course_id = %(course_id)s
+          AND extracted_text IS NOT NULL
+    ) AS labelled
+"""
 
 
 def fetch_context_text_for_course(conn, course_id: str):
@@ -1629,44 +2525,20 @@ def fetch_context_text_for_course(conn, course_id: str):
     Fetch all extracted text for a course, organized by tag.
     Used by Thread Engine for contextual awareness.
     """
-    with conn.cursor() as cur:
-        cur.execute(
-            """
-            SELECT tag, filename, extracted_text
-            FROM context_files
-            WHERE course_id = %(course_id)s
-              AND extracted_text IS NOT NULL
-            ORDER BY
-                CASE WHEN tag = 'SYLLABUS' THEN 0 ELSE 1 END,
-                created_at ASC
-            """,
-            {"course_id": course_id},
-        )
-        rows = cur.fetchall()
+    with conn.cursor(row_factory=dict_row) as cur:
+        cur.execute(_CONTEXT_TEXT_FOR_COURSE_SQL, {"course_id": course_id})
+        row = cur.fetchone()
 
-    syllabus_texts = []
-    notes_texts = []
+    return {"syllabus": row["syllabus"], "notes": row["notes"]}
 
-    for row in rows:
-        tag, filename, text = row # tuple unpacking works on default cursor too
-        if tag == "SYLLABUS":
-            syllabus_texts.append(f"=== {filename} ===\n{text}")
-        else:
-            notes_texts.append(f"=== {filename} ===\n{text}")
 
-    return {
-        "syllabus": "\n\n".join(syllabus_texts) if syllabus_texts else None,
-        "notes": "\n\n".join(notes_texts) if notes_texts else None,
-    }
+_DELETE_CONTEXT_FILE_SQL = "DELETE FROM context_files WHERE id = %(file_id)s"
 
 
-def delete_context_file(conn, file_id: str):
+def delete_context_file(conn, file_id: str, pipeline: bool = False):
     """Delete a context file record."""
-    with conn.cursor() as cur:
-        cur.execute(
-            "DELETE FROM context_files WHERE id = %(file_id)s",
-            {"file_id": file_id},
-        )
+    with pipelined(conn) if pipeline else nullcontext(), conn.cursor() as cur:
+        cur.execute(_DELETE_CONTEXT_FILE_SQL, {"file_id": file_id})
     # conn.commit()
 
 
@@ -1675,115 +2547,181 @@ def delete_context_file(conn, file_id: str):
 # =========================================================================
 
 
-def upsert_dice_rotation_state(conn, rotation_state: Dict[str, Any]):
+_UPSERT_DICE_ROTATION_SQL = """
+    INSERT INTO dice_rotation_states (
+        id, lecture_id, course_id,
+        iterations_completed, max_iterations, status,
+        score_how, score_what, score_when, score_where, score_who, score_why,
+        entropy, equilibrium_gap, collapsed,
+        full_state,
+        created_at, updated_at
+    )
+    VALUES (
+        %(id)s, %(lecture_id)s, %(course_id)s,
+        %(iterations_completed)s, %(max_iterations)s, %(status)s,
+        %(score_how)s, %(score_what)s, %(score_when)s,
+        %(score_where)s, %(score_who)s, %(score_why)s,
+        %(entropy)s, %(equilibrium_gap)s, %(collapsed)s,
+        %(full_state)s,
+        NOW(), NOW()
+    )
+    ON CONFLICT (id) DO UPDATE SET
+        iterations_completed = EXCLUDED.iterations_completed,
+        status = EXCLUDED.status,
+        score_how = EXCLUDED.score_how,
+        score_what = EXCLUDED.score_what,
+        score_when = EXCLUDED.score_when,
+        score_where = EXCLUDED.score_where,
+        score_who = EXCLUDED.score_who,
+        score_why = EXCLUDED.score_why,
+        entropy = EXCLUDED.entropy,
+        equilibrium_gap = EXCLUDED.equilibrium_gap,
+        collapsed = EXCLUDED.collapsed,
+        full_state = EXCLUDED.full_state,
+        updated_at = NOW()
+"""
+
+
+_DICE_ROTATION_COLUMNS = (
+    "id", "lecture_id", "course_id", "iterations_completed", "max_iterations", "status",
+    "score_how", "score_what", "score_when", "score_where", "score_who", "score_why",
+    "entropy", "equilibrium_gap", "collapsed", "full_state",
+)
+# created_at/updated_at are left to their now() defaults, which excluded.updated_at
+# also carries on conflict.
+_DICE_ROTATION_UPDATES = (
+    "iterations_completed", "status",
+    "score_how", "score_what", "score_when", "score_where", "score_who", "score_why",
+    "entropy", "equilibrium_gap", "collapsed", "full_state", "updated_at",
+)
+
+
+def _dice_rotation_params(rotation_state: Dict[str, Any]) -> Dict[str, Any]:
+    # Extract facet scores
+    scores = rotation_state.get("scores", {})
+
+    return {
+        "id": rotation_state.get("id"),
+        "lecture_id": rotation_state.get("lectureId"),
+        "course_id": rotation_state.get("courseId"),
+        "iterations_completed": rotation_state.get("iterationsCompleted", 0),
+        "max_iterations": rotation_state.get("maxIterations", 6),
+        "status": rotation_state.get("status", "in_progress"),
+        "score_how": scores.get("RED", 0.0),
+        "score_what": scores.get("ORANGE", 0.0),
+        "score_when": scores.get("YELLOW", 0.0),
+        "score_where": scores.get("GREEN", 0.0),
+        "score_who": scores.get("BLUE", 0.0),
+        "score_why": scores.get("PURPLE", 0.0),
+        "entropy": rotation_state.get("entropy", 0.0),
+        "equilibrium_gap": rotation_state.get("equilibriumGap", 1.0),
+        "collapsed": rotation_state.get("collapsed", False),
+        "full_state": Jsonb(rotation_state.get("fullState", rotation_state)),
+    }
+
+
+def upsert_dice_rotation_state(conn, rotation_state: Dict[str, Any], pipeline: bool = False):
     """
     Insert or update dice rotation state for a lecture.
     """
-    with conn.cursor() as cur:
-        # Extract facet scores
-        scores = rotation_state.get("scores", {})
-
-        # Determine dominant facet
-        dominant_facet = None
-        dominant_score = 0.0
-        if scores:
-            # Find facet with highest score
-            facet_map = {
-                "RED": ("how", scores.get("RED", 0.0)),
-                "ORANGE": ("what", scores.get("ORANGE", 0.0)),
-                "YELLOW": ("when", scores.get("YELLOW", 0.0)),
-                "GREEN": ("where", scores.get("WHERE", 0.0)),
-                "BLUE": ("who", scores.get("BLUE", 0.0)),
-                "PURPLE": ("why", scores.get("PURPLE", 0.0)),
-            }
-            dominant_facet, dominant_score = max(facet_map.values(), key=lambda x: x[1])
-
-        cur.execute(
-            """
-            INSERT INTO dice_rotation_states (
-                id, lecture_id, course_id,
-                iterations_completed, max_iterations, status,
-                score_how, score_what, score_when, score_where, score_who, score_why,
-                entropy, equilibrium_gap, collapsed,
-                dominant_facet, dominant_score,
-                full_state,
-                created_at, updated_at
-            )
-            VALUES (
-                %(id)s, %(lecture_id)s, %(course_id)s,
-                %(iterations_completed)s, %(max_iterations)s, %(status)s,
-                %(score_how)s, %(score_what)s, %(score_when)s,
-                %(score_where)s, %(score_who)s, %(score_why)s,
-                %(entropy)s, %(equilibrium_gap)s, %(collapsed)s,
-                %(dominant_facet)s, %(dominant_score)s,
-                %(full_state)s,
-                NOW(), NOW()
-            )
-            ON CONFLICT (id) DO UPDATE SET
-                iterations_completed = EXCLUDED.iterations_completed,
-                status = EXCLUDED.status,
-                score_how = EXCLUDED.score_how,
-                score_what = EXCLUDED.score_what,
-                score_when = EXCLUDED.score_when,
-                score_where = EXCLUDED.score_where,
-                score_who = EXCLUDED.score_who,
-                score_why = EXCLUDED.score_why,
-                entropy = EXCLUDED.entropy,
-                equilibrium_gap = EXCLUDED.equilibrium_gap,
-                collapsed = EXCLUDED.collapsed,
-                dominant_facet = EXCLUDED.dominant_facet,
-                dominant_score = EXCLUDED.dominant_score,
-                full_state = EXCLUDED.full_state,
-                updated_at = NOW()
-            """,
-            {
-                "id": rotation_state.get("id"),
-                "lecture_id": rotation_state.get("lectureId"),
-                "course_id": rotation_state.get("courseId"),
-                "iterations_completed": rotation_state.get("iterationsCompleted", 0),
-                "max_iterations": rotation_state.get("maxIterations", 6),
-                "status": rotation_state.get("status", "in_progress"),
-                "score_how": scores.get("RED", 0.0),
-                "score_what": scores.get("ORANGE", 0.0),
-                "score_when": scores.get("YELLOW", 0.0),
-                "score_where": scores.get("GREEN", 0.0),
-                "score_who": scores.get("BLUE", 0.0),
-                "score_why": scores.get("PURPLE", 0.0),
-                "entropy": rotation_state.get("entropy", 0.0),
-                "equilibrium_gap": rotation_state.get("equilibriumGap", 1.0),
-                "collapsed": rotation_state.get("collapsed", False),
-                "dominant_facet": dominant_facet,
-                "dominant_score": dominant_score,
-                "full_state": Jsonb(rotation_state.get("fullState", rotation_state)),
-            },
-        )
+    params = _dice_rotation_params(rotation_state)
+    with pipelined(conn) if pipeline else nullcontext(), conn.cursor() as cur:
+        cur.execute(_UPSERT_DICE_ROTATION_SQL, params)
     # conn.commit()
 
 
+def upsert_dice_rotation_states_many(conn, rotation_states: list[Dict[str, Any]]) -> int:
+    """Upsert rotation states for many lectures in one multi-row statement per batch.
+
+    Rows repeating an id keep the last one, as sequential upserts would.
+    """
+    if not rotation_states:
+        return 0
+    rows = [
+        tuple(params[column] for column in _DICE_ROTATION_COLUMNS)
+        for params in _last_per_id([_dice_rotation_params(state) for state in rotation_states])
+    ]
+    batch_size = min(_BULK_UPSERT_ROWS, _MAX_BIND_PARAMS // len(_DICE_ROTATION_COLUMNS))
+    with conn.transaction(), conn.cursor() as cur:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            cur.execute(
+                _bulk_upsert_sql("dice_rotation_states", _DICE_ROTATION_COLUMNS, _DICE_ROTATION_UPDATES, len(batch)),
+                [value for row in batch for value in row],
+            )
+    return len(rows)
+
+
+_FETCH_DICE_ROTATION_STATE_SQL = f"""
+    SELECT id, lecture_id, course_id,
+           iterations_completed, max_iterations, status,
+           score_how, score_what, score_when, score_where, score_who, score_why,
+           entropy, equilibrium_gap, collapsed,
+           dominant_facet, dominant_score,
+           full_state,
+           {_ISO_TIMESTAMPS}
+    FROM dice_rotation_states
+    WHERE lecture_id = %(lecture_id)s
+"""
+
+
 def fetch_dice_rotation_state_by_lecture(conn, lecture_id: str) -> Optional[Dict[str, Any]]:
     """
     Fetch dice rotation state for a lecture.
     """
-    with conn.cursor(row_factory=dict_row) as cur:
-        cur.execute(
-            """
-            SELECT id, lecture_id, course_id,
-                   iterations_completed, max_iterations, status,
-                   score_how, score_what, score_when, score_where, score_who, score_why,
-                   entropy, equilibrium_gap, collapsed,
-                   dominant_facet, dominant_score,
-                   full_state,
-                   created_at, updated_at
-            FROM dice_rotation_states
-            WHERE lecture_id = %(lecture_id)s
-            """,
-            {"lecture_id": lecture_id},
-        )
+    with conn.cursor(row_factory=tuple_row) as cur:
+        cur.execute(_FETCH_DICE_ROTATION_STATE_SQL, {"lecture_id": lecture_id})
         row = cur.fetchone()
 
     if not row:
         return None
 
+    (
+        id_, lecture_id, course_id, iterations_completed, max_iterations, status,
+        score_how, score_what, score_when, score_where, score_who, score_why,
+        entropy, equilibrium_gap, collapsed, dominant_facet, dominant_score,
+        full_state, created_at, updated_at,
+    ) = row
+    return {
+        "id": id_,
+        "lectureId": lecture_id,
+        "courseId": course_id,
+        "iterationsCompleted": iterations_completed,
+        "maxIterations": max_iterations,
+        "status": status,
+        "scores": {
+            "RED": score_how,
+            "ORANGE": score_what,
+            "YELLOW": score_when,
+            "GREEN": score_where,
+            "BLUE": score_who,
+            "PURPLE": score_why,
+        },
+        "entropy": entropy,
+        "equilibriumGap": equilibrium_gap,
+        "collapsed": collapsed,
+        "dominantFacet": dominant_facet,
+        "dominantScore": dominant_score,
+        "fullState": full_state,
+        "createdAt": created_at,
+        "updatedAt": updated_at,
+    }
+
+
+_DICE_ROTATION_STATES_BY_COURSE_SQL = f"""
+    SELECT id, lecture_id, course_id,
+           iterations_completed, max_iterations, status,
+           score_how, score_what, score_when, score_where, score_who, score_why,
+           entropy, equilibrium_gap, collapsed,
+           dominant_facet, dominant_score,
+           {_ISO_TIMESTAMPS}
+    FROM dice_rotation_states
+    WHERE course_id = %(course_id)s
+    ORDER BY dice_rotation_states.created_at DESC
+"""
+
+
+def _dice_rotation_summary_row(row: Dict[str, Any]) -> Dict[str, Any]:
     return {
         "id": row["id"],
         "lectureId": row["lecture_id"],
@@ -1804,9 +2742,8 @@ def fetch_dice_rotation_state_by_lecture(conn, lecture_id: str) -> Optional[Dict
         "collapsed": row["collapsed"],
         "dominantFacet": row["dominant_facet"],
         "dominantScore": row["dominant_score"],
-        "fullState": row["full_state"],
-        "createdAt": row["created_at"].isoformat() if row["created_at"] else None,
-        "updatedAt": row["updated_at"].isoformat() if row["updated_at"] else None,
+        "createdAt": row["created_at"],
+        "updatedAt": row["updated_at"],
     }
 
 
@@ -1814,46 +2751,21 @@ def fetch_dice_rotation_states_by_course(conn, course_id: str) -> list[Dict[str,
     """
     Fetch all dice rotation states for a course.
     """
+    # Text format: the scores are real, which a binary cursor widens to float8
+    # digits (0.9 -> 0.8999999761581421); text keeps what the lecture lookup serves.
     with conn.cursor(row_factory=dict_row) as cur:
-        cur.execute(
-            """
-            SELECT id, lecture_id, course_id,
-                   iterations_completed, max_iterations, status,
-                   score_how, score_what, score_when, score_where, score_who, score_why,
-                   entropy, equilibrium_gap, collapsed,
-                   dominant_facet, dominant_score,
-                   created_at, updated_at
-            FROM dice_rotation_states
-            WHERE course_id = %(course_id)s
-            ORDER BY created_at DESC
-            """,
-            {"course_id": course_id},
-        )
-        rows = cur.fetchall()
-
-    return [
-        {
-            "id": row["id"],
-            "lectureId": row["lecture_id"],
-            "courseId": row["course_id"],
-            "iterationsCompleted": row["iterations_completed"],
-            "maxIterations": row["max_iterations"],
-            "status": row["status"],
-            "scores": {
-                "RED": row["score_how"],
-                "ORANGE": row["score_what"],
-                "YELLOW": row["score_when"],
-                "GREEN": row["score_where"],
-                "BLUE": row["score_who"],
-                "PURPLE": row["score_why"],
-            },
-            "entropy": row["entropy"],
-            "equilibriumGap": row["equilibrium_gap"],
-            "collapsed": row["collapsed"],
-            "dominantFacet": row["dominant_facet"],
-            "dominantScore": row["dominant_score"],
-            "createdAt": row["created_at"].isoformat() if row["created_at"] else None,
-            "updatedAt": row["updated_at"].isoformat() if row["updated_at"] else None,
-        }
-        for row in rows
-    ]
+        cur.execute(_DICE_ROTATION_STATES_BY_COURSE_SQL, {"course_id": course_id})
+        return [_dice_rotation_summary_row(row) for row in cur]
+
+
+def iter_dice_rotation_states_by_course(
+    conn, course_id: str, itersize: int = _STREAM_BATCH
+) -> Iterator[Dict[str, Any]]:
+    """Stream a course's rotation states through a server-side cursor, ``itersize`` per round-trip."""
+    # Named cursors only live inside a transaction.
+    with conn.transaction():
+        with conn.cursor(name="dice_states_stream", row_factory=dict_row) as cur:
+            cur.itersize = itersize
+            cur.execute(_DICE_ROTATION_STATES_BY_COURSE_SQL, {"course_id": course_id})
+            for row in cur:
+                yield _dice_rotation_summary_row(row)
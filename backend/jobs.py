@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import json
 import logging
+import operator
 import os
 import uuid
 from datetime import datetime, timezone
@@ -12,7 +13,7 @@ from typing import Any, Dict, Optional
 from redis import Redis
 from rq import Queue, Retry
 
-from backend.db import get_database
+from backend.db import get_database, suspended_session
 from backend.observability import METRICS
 from backend.storage import save_artifact_file, save_export, save_export_file, save_transcript
 from pipeline.export_artifacts import export_artifacts
@@ -37,13 +38,19 @@ def _storage_dir() -> Path:
     return Path(os.getenv("PLC_STORAGE_DIR", "storage")).resolve()
 
 
+_STORAGE_SUBDIRS = ("audio", "documents", "metadata", "transcripts", "exports")
+_DIRS_READY_FOR: Optional[Path] = None
+
+
 def _ensure_dirs() -> None:
+    """Create the storage subdirectories once per storage dir, not per job."""
+    global _DIRS_READY_FOR
     storage_dir = _storage_dir()
-    (storage_dir / "audio").mkdir(parents=True, exist_ok=True)
-    (storage_dir / "documents").mkdir(parents=True, exist_ok=True)
-    (storage_dir / "metadata").mkdir(parents=True, exist_ok=True)
-    (storage_dir / "transcripts").mkdir(parents=True, exist_ok=True)
-    (storage_dir / "exports").mkdir(parents=True, exist_ok=True)
+    if _DIRS_READY_FOR == storage_dir:
+        return
+    for name in _STORAGE_SUBDIRS:
+        (storage_dir / name).mkdir(parents=True, exist_ok=True)
+    _DIRS_READY_FOR = storage_dir
 
 
 def _load_lecture_metadata(lecture_id: str) -> Dict[str, Any]:
@@ -68,6 +75,7 @@ def _resolve_lecture_upsert_payload(
 ) -> Dict[str, Any]:
     metadata = _load_lecture_metadata(lecture_id)
     current = existing_lecture or {}
+    now = _iso_now()
     return {
         "id": lecture_id,
         "course_id": current.get("course_id") or metadata.get("courseId") or "unknown",
@@ -78,8 +86,8 @@ def _resolve_lecture_upsert_payload(
         or metadata.get("audioSource", {}).get("storagePath")
         or str(source_path),
         "transcript_path": transcript_path,
-        "created_at": current.get("created_at") or metadata.get("createdAt") or _iso_now(),
-        "updated_at": _iso_now(),
+        "created_at": current.get("created_at") or metadata.get("createdAt") or now,
+        "updated_at": now,
         "lecture_mode": current.get("lecture_mode") or metadata.get("lectureMode"),
         "source_type": current.get("source_type")
         or metadata.get("audioSource", {}).get("fileType")
@@ -130,6 +138,19 @@ def _resolve_thread_refs(db, course_id: str) -> list[Dict[str, Any]]:
 
 
 
+def _upsert_many(db, bulk_method: str, single_method: str, payloads: list[Dict[str, Any]]) -> None:
+    """One batched upsert when the database supports it, else one upsert per payload."""
+    if not payloads:
+        return
+    bulk_upsert = getattr(db, bulk_method, None)
+    if callable(bulk_upsert):
+        bulk_upsert(payloads)
+        return
+    upsert = getattr(db, single_method)
+    for payload in payloads:
+        upsert(payload)
+
+
 def _parse_quality_threshold(name: str, default: int) -> int:
     raw = os.getenv(name, str(default)).strip()
     try:
@@ -184,10 +205,12 @@ def _should_run_jobs_inline() -> bool:
 
 
 def _run_job_inline(job_id: str, task, *args, **kwargs) -> None:
-    try:
-        task(job_id, *args, **kwargs)
-    except Exception as exc:  # pragma: no cover - task updates job status before raising
-        _update_job(job_id, "failed", error=str(exc), job_type="transcription")
+    # The job checks out its own connections rather than pinning the request's.
+    with suspended_session():
+        try:
+            task(job_id, *args, **kwargs)
+        except Exception as exc:  # pragma: no cover - task updates job status before raising
+            _update_job(job_id, "failed", error=str(exc), job_type="transcription")
 
 def _handle_job_failure(job, exc_type, exc_value, traceback) -> None:
     _update_job(job.id, "failed", error=str(exc_value))
@@ -281,6 +304,25 @@ def enqueue_job(job_type: str, lecture_id: Optional[str], task, *args, **kwargs)
     return job_id
 
 
+_segment_items = operator.itemgetter("start", "end", "text")
+_segment_attrs = operator.attrgetter("start", "end", "text")
+
+
+def _normalize_segments(raw_segments: Any) -> list[Dict[str, Any]]:
+    """Map provider segments (dicts or SDK objects) to transcript segments.
+
+    Field extraction goes through a C-level ``itemgetter``/``attrgetter``
+    chosen once per transcript rather than per-segment ``isinstance``/``get``.
+    """
+    if not raw_segments:
+        return []
+    getter = _segment_items if isinstance(raw_segments[0], dict) else _segment_attrs
+    return [
+        {"startSec": float(start), "endSec": float(end), "text": text.strip()}
+        for start, end, text in map(getter, raw_segments)
+    ]
+
+
 def _transcribe_with_whisper(audio_path: Path, model: str) -> Dict[str, Any]:
     whisper = _load_whisper()
     model_instance = whisper.load_model(model)
@@ -289,14 +331,7 @@ def _transcribe_with_whisper(audio_path: Path, model: str) -> Dict[str, Any]:
     return {
         "language": result.get("language"),
         "text": result.get("text", "").strip(),
-        "segments": [
-            {
-                "startSec": float(segment["start"]),
-                "endSec": float(segment["end"]),
-                "text": segment["text"].strip(),
-            }
-            for segment in result.get("segments", [])
-        ],
+        "segments": _normalize_segments(result.get("segments")),
         "engine": {"provider": "whisper", "model": model},
     }
 
@@ -459,18 +494,10 @@ def _transcribe_with_openai_api(audio_path: Path, model: str = "whisper-1") -> D
                 response_format="verbose_json",
             )
 
-        segments = []
-        for seg in getattr(response, "segments", []) or []:
-            segments.append({
-                "startSec": float(seg.get("start", seg.start) if isinstance(seg, dict) else seg.start),
-                "endSec": float(seg.get("end", seg.end) if isinstance(seg, dict) else seg.end),
-                "text": (seg.get("text", "") if isinstance(seg, dict) else seg.text).strip(),
-            })
-
         return {
             "language": getattr(response, "language", "en"),
             "text": response.text.strip(),
-            "segments": segments,
+            "segments": _normalize_segments(getattr(response, "segments", None)),
             "engine": {"provider": "openai", "model": model},
         }
     finally:
@@ -686,7 +713,9 @@ def run_transcription_job(
             "segments": transcription.get("segments", []),
             "engine": transcription.get("engine", {"provider": provider or "openai", "model": model}),
         }
-        transcript_payload = json.dumps(transcript, indent=2)
+        # Compact separators: transcripts are machine-read and pretty-printing
+        # roughly doubled their size for long lectures.
+        transcript_payload = json.dumps(transcript, separators=(",", ":"), ensure_ascii=False)
         transcript_path = save_transcript(transcript_payload, f"{lecture_id}.json")
         db = get_database()
         existing_lecture = db.fetch_lecture(lecture_id)
@@ -812,6 +841,7 @@ def run_generation_job(
             "exam-questions.json",
         ]
         artifact_paths: dict[str, str] = {}
+        artifact_records: list[Dict[str, Any]] = []
         for filename in artifact_files:
             path = artifacts_dir / filename
             if not path.exists():
@@ -823,7 +853,7 @@ def run_generation_job(
             section_count = (
                 len(payload.get("sections", [])) if artifact_type == "summary" else None
             )
-            db.upsert_artifact(
+            artifact_records.append(
                 {
                     "id": payload.get("id", f"{lecture_id}-{artifact_type}"),
                     "lecture_id": lecture_id,
@@ -837,6 +867,7 @@ def run_generation_job(
                 }
             )
             artifact_paths[artifact_type] = stored_path
+        _upsert_many(db, "bulk_upsert_artifacts", "upsert_artifact", artifact_records)
 
         threads_path = artifacts_dir / "threads.json"
         if threads_path.exists():
@@ -846,21 +877,22 @@ def run_generation_job(
                 LOGGER.info("Deleted %d old threads for lecture %s before re-generation", deleted_count, lecture_id)
 
             threads_payload = json.loads(threads_path.read_text(encoding="utf-8"))
-            for thread in threads_payload.get("threads", []):
-                db.upsert_thread(
-                    {
-                        "id": thread["id"],
-                        "course_id": thread["courseId"],
-                        "title": thread["title"],
-                        "summary": thread["summary"],
-                        "status": thread["status"],
-                        "complexity_level": thread["complexityLevel"],
-                        "lecture_refs": thread.get("lectureRefs", []),
-                        "face": thread.get("face"),
-                        "evolution_notes": thread.get("evolutionNotes"),
-                        "created_at": now,
-                    }
-                )
+            thread_records = [
+                {
+                    "id": thread["id"],
+                    "course_id": thread["courseId"],
+                    "title": thread["title"],
+                    "summary": thread["summary"],
+                    "status": thread["status"],
+                    "complexity_level": thread["complexityLevel"],
+                    "lecture_refs": thread.get("lectureRefs", []),
+                    "face": thread.get("face"),
+                    "evolution_notes": thread.get("evolutionNotes"),
+                    "created_at": now,
+                }
+                for thread in threads_payload.get("threads", [])
+            ]
+            _upsert_many(db, "bulk_upsert_threads", "upsert_thread", thread_records)
 
         # Persist thread occurrences
         try:
@@ -912,36 +944,38 @@ def run_generation_job(
 
         # Save thread detection metrics
         try:
+            import backend.db as db_module
             from pipeline.thread_engine import get_last_metrics
             from pipeline.thread_metrics import calculate_quality_score
             import uuid
 
             metrics, quality_score = get_last_metrics()
             if metrics:
-                db_module.insert_thread_metrics(
-                    db.conn,
-                    metrics_id=str(uuid.uuid4()),
-                    lecture_id=metrics.lecture_id,
-                    course_id=metrics.course_id,
-                    detected_at=metrics.timestamp,
-                    new_threads_detected=metrics.new_threads_detected,
-                    existing_threads_updated=metrics.existing_threads_updated,
-                    total_threads_after=metrics.total_threads_after,
-                    avg_complexity_level=metrics.avg_complexity_level,
-                    complexity_distribution=metrics.complexity_distribution,
-                    change_type_distribution=metrics.change_type_distribution,
-                    avg_evidence_length=metrics.avg_evidence_length,
-                    threads_with_evidence=metrics.threads_with_evidence,
-                    detection_method=metrics.detection_method,
-                    api_response_time_ms=metrics.api_response_time_ms,
-                    token_usage=metrics.token_usage,
-                    retry_count=metrics.retry_count,
-                    model_name=metrics.model_name,
-                    llm_provider=metrics.llm_provider,
-                    success=metrics.success,
-                    error_message=metrics.error_message,
-                    quality_score=quality_score or 0.0,
-                )
+                with db.connect() as conn:
+                    db_module.insert_thread_metrics(
+                        conn,
+                        metrics_id=str(uuid.uuid4()),
+                        lecture_id=metrics.lecture_id,
+                        course_id=metrics.course_id,
+                        detected_at=metrics.timestamp,
+                        new_threads_detected=metrics.new_threads_detected,
+                        existing_threads_updated=metrics.existing_threads_updated,
+                        total_threads_after=metrics.total_threads_after,
+                        avg_complexity_level=metrics.avg_complexity_level,
+                        complexity_distribution=metrics.complexity_distribution,
+                        change_type_distribution=metrics.change_type_distribution,
+                        avg_evidence_length=metrics.avg_evidence_length,
+                        threads_with_evidence=metrics.threads_with_evidence,
+                        detection_method=metrics.detection_method,
+                        api_response_time_ms=metrics.api_response_time_ms,
+                        token_usage=metrics.token_usage,
+                        retry_count=metrics.retry_count,
+                        model_name=metrics.model_name,
+                        llm_provider=metrics.llm_provider,
+                        success=metrics.success,
+                        error_message=metrics.error_message,
+                        quality_score=quality_score or 0.0,
+                    )
                 print(f"[Job] Saved thread metrics: quality={quality_score}/100")
         except Exception as e:
             print(f"[Job] WARNING: Failed to save thread metrics: {e}")
@@ -1009,7 +1043,8 @@ def run_generation_job(
                     rotation_state.get("iterationHistory", [])
                 )
                 rotation_state["status"] = rs_status
-                db_module.upsert_dice_rotation_state(db.conn, rotation_state)
+                with db.connect() as conn:
+                    db_module.upsert_dice_rotation_state(conn, rotation_state)
                 LOGGER.info(
                     "Saved dice rotation state for lecture %s: status=%s",
                     lecture_id, rs_status,
@@ -0,0 +1,8 @@
+-- Composite indexes backing keyset (cursor) pagination on created_at.
+-- List queries seek with (created_at, id) < (cursor) and order by
+-- created_at desc, id desc, which these indexes serve as a range scan.
+create index if not exists courses_created_at_id_idx on courses (created_at desc, id desc);
+create index if not exists lectures_created_at_id_idx on lectures (created_at desc, id desc);
+create index if not exists lectures_course_created_at_id_idx on lectures (course_id, created_at desc, id desc);
+create index if not exists jobs_lecture_created_at_id_idx on jobs (lecture_id, created_at desc, id desc);
+create index if not exists threads_course_created_at_id_idx on threads (course_id, created_at desc, id desc);
@@ -0,0 +1,7 @@
+-- GIN index for the `lecture_refs @> '["<lecture_id>"]'` containment lookups in
+-- fetch_threads and delete_threads_for_lecture. jsonb_path_ops only supports
+-- containment, which is all we query, and is smaller and faster than jsonb_ops.
+-- Built concurrently so existing thread writes are not blocked; this must stay
+-- the only statement in the file, since CONCURRENTLY cannot run inside the
+-- implicit transaction a multi-statement migration gets.
+create index concurrently if not exists threads_lecture_refs_gin on threads using gin (lecture_refs jsonb_path_ops);
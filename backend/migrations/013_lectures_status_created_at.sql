@@ -0,0 +1,4 @@
+-- fetch_lectures filtered by status, newest first, without a sort step.
+-- (course_id, created_at desc, id desc) already exists from 011. Built
+-- concurrently, so this must stay the only statement in the file.
+create index concurrently if not exists lectures_status_created_at_id_idx on lectures (status, created_at desc, id desc);
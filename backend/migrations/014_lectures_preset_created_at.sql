@@ -0,0 +1,3 @@
+-- fetch_lectures filtered by preset_id, newest first, without a sort step.
+-- Built concurrently, so this must stay the only statement in the file.
+create index concurrently if not exists lectures_preset_created_at_id_idx on lectures (preset_id, created_at desc, id desc);
@@ -0,0 +1,49 @@
+-- Per-user, per-model usage totals for fetch_user_credits_summary, kept
+-- current by a statement-level trigger so the summary reads a handful of
+-- rows instead of aggregating the whole ledger on every call.
+create table if not exists credit_ledger_summary (
+    user_id text not null,
+    llm_model text not null,
+    prompt_tokens bigint not null default 0,
+    completion_tokens bigint not null default 0,
+    total_tokens bigint not null default 0,
+    cost_usd double precision not null default 0,
+    generation_count bigint not null default 0,
+    primary key (user_id, llm_model)
+);
+
+create or replace function credit_ledger_summary_add() returns trigger
+language plpgsql as $$
+begin
+    insert into credit_ledger_summary as s
+        (user_id, llm_model, prompt_tokens, completion_tokens, total_tokens, cost_usd, generation_count)
+    select user_id, llm_model, sum(prompt_tokens), sum(completion_tokens), sum(total_tokens),
+        sum(estimated_cost_usd::double precision), count(*)
+    from new_rows
+    group by user_id, llm_model
+    on conflict (user_id, llm_model) do update set
+        prompt_tokens = s.prompt_tokens + excluded.prompt_tokens,
+        completion_tokens = s.completion_tokens + excluded.completion_tokens,
+        total_tokens = s.total_tokens + excluded.total_tokens,
+        cost_usd = s.cost_usd + excluded.cost_usd,
+        generation_count = s.generation_count + excluded.generation_count;
+    return null;
+end;
+$$;
+
+-- Hold off ledger writes until the backfill and trigger commit together.
+lock table credit_ledger in share row exclusive mode;
+
+insert into credit_ledger_summary
+    (user_id, llm_model, prompt_tokens, completion_tokens, total_tokens, cost_usd, generation_count)
+select user_id, llm_model, sum(prompt_tokens), sum(completion_tokens), sum(total_tokens),
+    sum(estimated_cost_usd::double precision), count(*)
+from credit_ledger
+group by user_id, llm_model
+on conflict (user_id, llm_model) do nothing;
+
+drop trigger if exists credit_ledger_summary_add on credit_ledger;
+create trigger credit_ledger_summary_add
+    after insert on credit_ledger
+    referencing new table as new_rows
+    for each statement execute function credit_ledger_summary_add();
@@ -0,0 +1,12 @@
+-- Per-user history pages (credits, token transactions, purchases) filter on
+-- user_id and order by created_at desc; these indexes let LIMIT stop after
+-- limit + offset index entries instead of sorting every row the user owns.
+-- deletion_audit_events is already covered by deletion_audit_events_entity_idx.
+create index if not exists credit_ledger_user_created_at_idx on credit_ledger (user_id, created_at desc);
+create index if not exists token_transactions_user_created_at_idx on token_transactions (user_id, created_at desc);
+create index if not exists purchase_receipts_user_created_at_idx on purchase_receipts (user_id, created_at desc);
+
+-- The user_id-only indexes are now redundant prefixes of the ones above.
+drop index if exists idx_credit_ledger_user;
+drop index if exists idx_token_txn_user;
+drop index if exists idx_purchase_user;
@@ -0,0 +1,52 @@
+-- Per-user, per-model usage by calendar month (UTC), so a summary over a
+-- recent window reads a few rollup rows instead of the ledger. Maintained by
+-- its own statement-level trigger alongside credit_ledger_summary.
+create table if not exists credit_ledger_monthly_rollup (
+    user_id text not null,
+    month date not null,
+    llm_model text not null,
+    prompt_tokens bigint not null default 0,
+    completion_tokens bigint not null default 0,
+    total_tokens bigint not null default 0,
+    cost_usd double precision not null default 0,
+    generation_count bigint not null default 0,
+    primary key (user_id, month, llm_model)
+);
+
+create or replace function credit_ledger_monthly_rollup_add() returns trigger
+language plpgsql as $$
+begin
+    insert into credit_ledger_monthly_rollup as r
+        (user_id, month, llm_model, prompt_tokens, completion_tokens, total_tokens, cost_usd, generation_count)
+    select user_id, date_trunc('month', created_at at time zone 'UTC')::date, llm_model,
+        sum(prompt_tokens), sum(completion_tokens), sum(total_tokens),
+        sum(estimated_cost_usd::double precision), count(*)
+    from new_rows
+    group by 1, 2, 3
+    on conflict (user_id, month, llm_model) do update set
+        prompt_tokens = r.prompt_tokens + excluded.prompt_tokens,
+        completion_tokens = r.completion_tokens + excluded.completion_tokens,
+        total_tokens = r.total_tokens + excluded.total_tokens,
+        cost_usd = r.cost_usd + excluded.cost_usd,
+        generation_count = r.generation_count + excluded.generation_count;
+    return null;
+end;
+$$;
+
+-- Hold off ledger writes until the backfill and trigger commit together.
+lock table credit_ledger in share row exclusive mode;
+
+insert into credit_ledger_monthly_rollup
+    (user_id, month, llm_model, prompt_tokens, completion_tokens, total_tokens, cost_usd, generation_count)
+select user_id, date_trunc('month', created_at at time zone 'UTC')::date, llm_model,
+    sum(prompt_tokens), sum(completion_tokens), sum(total_tokens),
+    sum(estimated_cost_usd::double precision), count(*)
+from credit_ledger
+group by 1, 2, 3
+on conflict (user_id, month, llm_model) do nothing;
+
+drop trigger if exists credit_ledger_monthly_rollup_add on credit_ledger;
+create trigger credit_ledger_monthly_rollup_add
+    after insert on credit_ledger
+    referencing new table as new_rows
+    for each statement execute function credit_ledger_monthly_rollup_add();
@@ -0,0 +1,47 @@
+-- Store money at fixed scale so reads need no per-row rounding: ledger costs
+-- to the micro-dollar, purchase prices to the cent.
+alter table credit_ledger alter column estimated_cost_usd type numeric(12, 6);
+alter table credit_ledger alter column estimated_cost_usd set default 0;
+alter table purchase_receipts alter column price_usd type numeric(12, 2);
+alter table credit_ledger_summary alter column cost_usd type numeric(14, 6);
+alter table credit_ledger_monthly_rollup alter column cost_usd type numeric(14, 6);
+
+-- Roll costs up exactly now that the ledger column is numeric.
+create or replace function credit_ledger_summary_add() returns trigger
+language plpgsql as $$
+begin
+    insert into credit_ledger_summary as s
+        (user_id, llm_model, prompt_tokens, completion_tokens, total_tokens, cost_usd, generation_count)
+    select user_id, llm_model, sum(prompt_tokens), sum(completion_tokens), sum(total_tokens),
+        sum(estimated_cost_usd), count(*)
+    from new_rows
+    group by user_id, llm_model
+    on conflict (user_id, llm_model) do update set
+        prompt_tokens = s.prompt_tokens + excluded.prompt_tokens,
+        completion_tokens = s.completion_tokens + excluded.completion_tokens,
+        total_tokens = s.total_tokens + excluded.total_tokens,
+        cost_usd = s.cost_usd + excluded.cost_usd,
+        generation_count = s.generation_count + excluded.generation_count;
+    return null;
+end;
+$$;
+
+create or replace function credit_ledger_monthly_rollup_add() returns trigger
+language plpgsql as $$
+begin
+    insert into credit_ledger_monthly_rollup as r
+        (user_id, month, llm_model, prompt_tokens, completion_tokens, total_tokens, cost_usd, generation_count)
+    select user_id, date_trunc('month', created_at at time zone 'UTC')::date, llm_model,
+        sum(prompt_tokens), sum(completion_tokens), sum(total_tokens),
+        sum(estimated_cost_usd), count(*)
+    from new_rows
+    group by 1, 2, 3
+    on conflict (user_id, month, llm_model) do update set
+        prompt_tokens = r.prompt_tokens + excluded.prompt_tokens,
+        completion_tokens = r.completion_tokens + excluded.completion_tokens,
+        total_tokens = r.total_tokens + excluded.total_tokens,
+        cost_usd = r.cost_usd + excluded.cost_usd,
+        generation_count = r.generation_count + excluded.generation_count;
+    return null;
+end;
+$$;
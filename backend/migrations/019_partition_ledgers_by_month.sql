@@ -0,0 +1,92 @@
+-- Range-partition the append-only ledgers (credit_ledger, token_transactions)
+-- by calendar month (UTC) of created_at, so recent-history reads and vacuum
+-- work stay within the newest partitions. A default partition catches rows
+-- for months that have no partition yet; `python -m backend.retention` keeps
+-- partitions created ahead of time.
+
+-- Creates the monthly partitions of `parent` covering first_month..last_month
+-- that do not exist yet. A month already holding rows in the default
+-- partition is skipped: attaching it would fail, and those rows stay correct
+-- where they are.
+create or replace function ensure_monthly_partitions(parent text, first_month date, last_month date)
+returns void
+language plpgsql as $$
+declare
+    part_month date := date_trunc('month', first_month)::date;
+    lower_bound timestamptz;
+    upper_bound timestamptz;
+    default_has_rows boolean;
+begin
+    while part_month <= last_month loop
+        lower_bound := part_month::timestamp at time zone 'UTC';
+        upper_bound := (part_month + interval '1 month')::timestamp at time zone 'UTC';
+        if to_regclass(format('%I', parent || '_' || to_char(part_month, 'YYYYMM'))) is null then
+            default_has_rows := false;
+            if to_regclass(format('%I', parent || '_default')) is not null then
+                execute format(
+                    'select exists (select 1 from %I where created_at >= %L and created_at < %L)',
+                    parent || '_default', lower_bound, upper_bound
+                ) into default_has_rows;
+            end if;
+            if not default_has_rows then
+                execute format(
+                    'create table %I partition of %I for values from (%L) to (%L)',
+                    parent || '_' || to_char(part_month, 'YYYYMM'), parent, lower_bound, upper_bound
+                );
+            end if;
+        end if;
+        part_month := (part_month + interval '1 month')::date;
+    end loop;
+end;
+$$;
+
+-- Rebuilds a plain ledger table as a partitioned one, keeping its rows.
+-- A no-op once the table is partitioned, so re-running this file is safe.
+create or replace function partition_ledger_by_month(ledger text)
+returns void
+language plpgsql as $$
+declare
+    oldest timestamptz;
+begin
+    if (select relkind from pg_class where oid = to_regclass(format('%I', ledger))) = 'p' then
+        return;
+    end if;
+    execute format('alter table %I rename to %I', ledger, ledger || '_unpartitioned');
+    execute format('alter index %I rename to %I', ledger || '_pkey', ledger || '_unpartitioned_pkey');
+    execute format(
+        'create table %I (like %I including defaults including constraints) partition by range (created_at)',
+        ledger, ledger || '_unpartitioned'
+    );
+    -- The partition key has to be part of every unique constraint.
+    execute format('alter table %I add primary key (id, created_at)', ledger);
+    execute format('alter table %I add foreign key (user_id) references users (id)', ledger);
+    execute format('select min(created_at) from %I', ledger || '_unpartitioned') into oldest;
+    perform ensure_monthly_partitions(
+        ledger,
+        (coalesce(oldest, now()) at time zone 'UTC')::date,
+        ((now() + interval '12 months') at time zone 'UTC')::date
+    );
+    execute format('create table %I partition of %I default', ledger || '_default', ledger);
+    execute format('insert into %I select * from %I', ledger, ledger || '_unpartitioned');
+    execute format('drop table %I', ledger || '_unpartitioned');
+end;
+$$;
+
+select partition_ledger_by_month('credit_ledger');
+select partition_ledger_by_month('token_transactions');
+
+-- Recreated on the partitioned parents; each partition gets a local copy.
+create index if not exists credit_ledger_user_created_at_idx on credit_ledger (user_id, created_at desc);
+create index if not exists token_transactions_user_created_at_idx on token_transactions (user_id, created_at desc);
+
+drop trigger if exists credit_ledger_summary_add on credit_ledger;
+create trigger credit_ledger_summary_add
+    after insert on credit_ledger
+    referencing new table as new_rows
+    for each statement execute function credit_ledger_summary_add();
+
+drop trigger if exists credit_ledger_monthly_rollup_add on credit_ledger;
+create trigger credit_ledger_monthly_rollup_add
+    after insert on credit_ledger
+    referencing new table as new_rows
+    for each statement execute function credit_ledger_monthly_rollup_add();
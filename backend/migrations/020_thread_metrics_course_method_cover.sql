@@ -0,0 +1,6 @@
+-- fetch_thread_metrics_summary aggregates one course's detections, with
+-- per-method FILTER averages. Keyed on (course_id, detection_method) and
+-- carrying every other column the summary reads, so the whole aggregate can
+-- be answered by an index-only scan. Built concurrently, so this must stay
+-- the only statement in the file.
+create index concurrently if not exists thread_metrics_course_method_idx on thread_metrics (course_id, detection_method) include (quality_score, success, new_threads_detected, existing_threads_updated, api_response_time_ms);
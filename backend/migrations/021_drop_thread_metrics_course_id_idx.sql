@@ -0,0 +1,5 @@
+-- thread_metrics_course_method_idx (020) leads with course_id, so the
+-- course_id-only index is a redundant prefix that every metrics insert still
+-- pays to maintain. Dropped concurrently, so this must stay the only
+-- statement in the file.
+drop index concurrently if exists thread_metrics_course_id_idx;
@@ -0,0 +1,48 @@
+-- Derive dice_rotation_states.dominant_facet / dominant_score from the six
+-- facet scores in the database, as stored generated columns, instead of
+-- computing them in Python on every upsert. As before, ties (including a
+-- fresh rotation's all-zero scores) go to the first facet in how..why order.
+
+create or replace function dice_dominant_facet(
+    score_how real, score_what real, score_when real, score_where real, score_who real, score_why real
+)
+returns text
+language sql immutable parallel safe as $$
+    select case greatest(score_how, score_what, score_when, score_where, score_who, score_why)
+        when score_how then 'how'
+        when score_what then 'what'
+        when score_when then 'when'
+        when score_where then 'where'
+        when score_who then 'who'
+        else 'why'
+    end
+$$;
+
+-- Existing plain columns cannot be turned into generated ones in place, so
+-- they are replaced once; re-running this file leaves them alone.
+do $$
+begin
+    if not exists (
+        select 1 from pg_attribute
+        where attrelid = 'dice_rotation_states'::regclass
+          and attname = 'dominant_facet'
+          and attgenerated = 's'
+    ) then
+        alter table dice_rotation_states
+            drop column if exists dominant_facet,
+            drop column if exists dominant_score;
+        alter table dice_rotation_states
+            add column dominant_facet text generated always as (
+                dice_dominant_facet(score_how, score_what, score_when, score_where, score_who, score_why)
+            ) stored,
+            add column dominant_score real generated always as (
+                greatest(score_how, score_what, score_when, score_where, score_who, score_why)
+            ) stored;
+    end if;
+end;
+$$;
+
+-- Facet-distribution queries are per course; dropping the column above also
+-- dropped the single-column dominant_facet index.
+create index if not exists dice_rotation_states_course_dominant_facet_idx
+    on dice_rotation_states (course_id, dominant_facet);
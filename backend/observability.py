@@ -24,6 +24,7 @@ class InMemoryMetricsStore:
             lambda: {"count": 0.0, "sum_seconds": 0.0, "max_seconds": 0.0}
         )
         self._thinking_errors: dict[str, dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self._chat_cache_events: dict[str, int] = defaultdict(int)
 
     def reset(self) -> None:
         with self._lock:
@@ -34,6 +35,7 @@ class InMemoryMetricsStore:
             self._retry_events.clear()
             self._thinking_latency.clear()
             self._thinking_errors.clear()
+            self._chat_cache_events.clear()
 
     def increment_job_status(self, job_type: str, status: str) -> None:
         normalized_type = (job_type or "unknown").strip() or "unknown"
@@ -80,6 +82,11 @@ class InMemoryMetricsStore:
         with self._lock:
             self._thinking_errors[model][error_code] += 1
 
+    def increment_chat_cache(self, outcome: str) -> None:
+        """Count chat semantic cache outcomes (hit / miss / skipped)."""
+        with self._lock:
+            self._chat_cache_events[outcome] += 1
+
     def snapshot(self, queue_depth: dict[str, int] | None = None) -> dict[str, Any]:
         with self._lock:
             latency: dict[str, dict[str, float]] = {}
@@ -121,6 +128,7 @@ class InMemoryMetricsStore:
                 "jobRetries": dict(self._retry_events),
                 "thinkingLatency": thinking_latency,
                 "thinkingErrors": {key: dict(value) for key, value in self._thinking_errors.items()},
+                "chatCacheEvents": dict(self._chat_cache_events),
             }
 
 
@@ -165,6 +173,11 @@ def render_prometheus_metrics(snapshot: dict[str, Any]) -> str:
         lines.append(f'pegasus_job_latency_ms_avg{{job_type="{_escape_label(str(job_type))}"}} {avg_ms}')
         lines.append(f'pegasus_job_latency_ms_max{{job_type="{_escape_label(str(job_type))}"}} {max_ms}')
 
+    lines.append("# HELP pegasus_chat_cache_events_total Chat semantic cache lookups by outcome.")
+    lines.append("# TYPE pegasus_chat_cache_events_total counter")
+    for outcome, count in sorted((snapshot.get("chatCacheEvents") or {}).items()):
+        lines.append(f'pegasus_chat_cache_events_total{{outcome="{_escape_label(str(outcome))}"}} {int(count)}')
+
     # Histogram export
     lines.append("# HELP pegasus_job_latency_ms Job latency histogram in milliseconds.")
     lines.append("# TYPE pegasus_job_latency_ms histogram")
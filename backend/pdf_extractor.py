@@ -54,7 +54,7 @@ def extract_text_from_pdf(pdf_path: Path) -> Dict[str, Any]:
 
             if not page_text.strip():
                 # Empty page, skip but record it
-                logger.debug(f"Page {page_num + 1} is empty")
+                logger.debug("Page %d is empty", page_num + 1)
                 continue
 
             # Calculate estimated reading time for this page
@@ -123,5 +123,5 @@ def validate_pdf(pdf_path: Path) -> bool:
         doc.close()
         return True
     except Exception as e:
-        logger.warning(f"PDF validation failed for {pdf_path}: {e}")
+        logger.warning("PDF validation failed for %s: %s", pdf_path, e)
         return False
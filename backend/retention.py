@@ -163,6 +163,8 @@ def _cli() -> int:
 
     db = get_database()
     summary = run_retention_cleanup(db, config)
+    if not config.dry_run:
+        db.ensure_ledger_partitions()
     print(summary)
     return 0
 
@@ -5,6 +5,7 @@ Can be executed as a Cloud Run job or locally
 """
 
 import os
+import re
 import sys
 from pathlib import Path
 
@@ -32,6 +33,16 @@ def get_database_url() -> str:
     return db_url
 
 
+# Same rule as backend.db: `create/drop index concurrently` cannot run inside a
+# transaction block, so such a file runs on its own in autocommit mode.
+CONCURRENT_DDL = re.compile(r"\bconcurrently\b", re.IGNORECASE)
+
+
+def is_concurrent(migration_file: Path) -> bool:
+    """Whether a migration must run outside a transaction"""
+    return bool(CONCURRENT_DDL.search(migration_file.read_text()))
+
+
 def run_migration(cursor, migration_file: Path):
     """Run a single migration file"""
     print(f"📝 Running: {migration_file.name}")
@@ -81,6 +92,9 @@ def main():
     # Run migrations
     success_count = 0
     for migration_file in migration_files:
+        # Switched between migrations, when no transaction is open; a failed
+        # concurrent build has nothing to roll back.
+        conn.autocommit = is_concurrent(migration_file)
         if run_migration(cursor, migration_file):
             success_count += 1
             conn.commit()
@@ -89,6 +103,7 @@ def main():
             print("❌ Migration failed, rolling back...")
             sys.exit(1)
         print("")
+    conn.autocommit = False
 
     # Verify tables
     print("🔍 Verifying tables...")
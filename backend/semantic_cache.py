@@ -0,0 +1,233 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from time import time
+from typing import Optional
+
+import numpy as np
+
+
+def _float_env(name: str, default: float) -> float:
+    raw_value = os.getenv(name, str(default)).strip()
+    try:
+        return float(raw_value)
+    except ValueError as exc:
+        raise RuntimeError(f"{name} must be a number.") from exc
+
+
+def _int_env(name: str, default: int) -> int:
+    raw_value = os.getenv(name, str(default)).strip()
+    try:
+        return int(raw_value)
+    except ValueError as exc:
+        raise RuntimeError(f"{name} must be an integer.") from exc
+
+
+def semantic_cache_enabled() -> bool:
+    return os.getenv("PLC_CHAT_SEMANTIC_CACHE", "").strip().lower() in {"1", "true", "yes", "on"}
+
+
+def exact_cache_enabled() -> bool:
+    return os.getenv("PLC_CHAT_EXACT_CACHE", "").strip().lower() in {"1", "true", "yes", "on"}
+
+
+def max_history_turns() -> int:
+    return _int_env("PLC_CACHE_MAX_HISTORY", 6)
+
+
+def cache_namespace(model: str, context: str, history: list, turns: int = 2) -> str:
+    """Scope cached answers to one model, course context and the tail of the conversation.
+
+    Paraphrases only match within the same namespace, so an answer grounded in one
+    lecture's context is never served to a student asking about another, and a
+    reply from one model is never served for a request that named another.
+    """
+    digest = hashlib.sha256(model.encode("utf-8"))
+    digest.update(b"\x00")
+    digest.update(context.encode("utf-8"))
+    for msg in history[-turns:] if turns else ():
+        digest.update(b"\x00u" if msg.get("isUser") else b"\x00a")
+        digest.update(str(msg.get("text", "")).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def normalize(embedding) -> np.ndarray:
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else vector
+
+
+class _Namespace:
+    __slots__ = ("vectors", "responses", "created_at")
+
+    def __init__(self, vector: np.ndarray, response: str, now: float) -> None:
+        self.vectors = vector[np.newaxis, :]
+        self.responses = [response]
+        self.created_at = [now]
+
+
+class SemanticCache:
+    """In-memory nearest-neighbour cache of chat replies keyed on message embeddings.
+
+    Vectors are stored L2-normalised, so cosine similarity is a single
+    matrix-vector product per lookup. ``max_entries`` caps each namespace and
+    ``max_total_entries`` the whole cache: namespaces are evicted least recently
+    used first, and a periodic sweep drops the expired ones nobody revisits.
+    """
+
+    def __init__(
+        self,
+        threshold: float,
+        ttl_seconds: float,
+        max_entries: int,
+        max_total_entries: Optional[int] = None,
+    ) -> None:
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_total_entries = max_total_entries if max_total_entries is not None else max_entries * 64
+        # Sweeping walks every namespace, so it runs at most once a minute.
+        self.sweep_interval = min(ttl_seconds, 60.0)
+        self._namespaces: OrderedDict[str, _Namespace] = OrderedDict()
+        self._size = 0
+        self._next_sweep = 0.0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def lookup(self, namespace: str, vector: np.ndarray, now: Optional[float] = None) -> Optional[str]:
+        timestamp = now if now is not None else time()
+        with self._lock:
+            entries = self._namespaces.get(namespace)
+            if entries is None:
+                return None
+            self._prune_expired(namespace, entries, timestamp)
+            if not entries.responses:
+                return None
+            self._namespaces.move_to_end(namespace)
+            scores = entries.vectors @ vector
+            best = int(np.argmax(scores))
+            if float(scores[best]) < self.threshold:
+                return None
+            return entries.responses[best]
+
+    def insert(self, namespace: str, vector: np.ndarray, response: str, now: Optional[float] = None) -> None:
+        timestamp = now if now is not None else time()
+        with self._lock:
+            if timestamp >= self._next_sweep:
+                self._sweep_expired(timestamp)
+            entries = self._namespaces.get(namespace)
+            if entries is None:
+                self._namespaces[namespace] = _Namespace(vector, response, timestamp)
+                self._size += 1
+            else:
+                before = len(entries.responses)
+                entries.vectors = np.vstack((entries.vectors, vector))[-self.max_entries:]
+                entries.responses = (entries.responses + [response])[-self.max_entries:]
+                entries.created_at = (entries.created_at + [timestamp])[-self.max_entries:]
+                self._size += len(entries.responses) - before
+                self._namespaces.move_to_end(namespace)
+            # Evict whole namespaces, oldest first, but never the one just written.
+            while self._size > self.max_total_entries and len(self._namespaces) > 1:
+                _namespace, evicted = self._namespaces.popitem(last=False)
+                self._size -= len(evicted.responses)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._namespaces.clear()
+            self._size = 0
+
+    def _sweep_expired(self, now: float) -> None:
+        self._next_sweep = now + self.sweep_interval
+        for namespace, entries in list(self._namespaces.items()):
+            self._prune_expired(namespace, entries, now)
+
+    def _prune_expired(self, namespace: str, entries: _Namespace, now: float) -> None:
+        # Entries are appended in time order, so expired ones form a prefix.
+        cutoff = now - self.ttl_seconds
+        expired = 0
+        while expired < len(entries.created_at) and entries.created_at[expired] <= cutoff:
+            expired += 1
+        if not expired:
+            return
+        self._size -= expired
+        if expired == len(entries.created_at):
+            del self._namespaces[namespace]
+            entries.responses = []
+            return
+        entries.vectors = entries.vectors[expired:]
+        entries.responses = entries.responses[expired:]
+        entries.created_at = entries.created_at[expired:]
+
+
+class ExactCache:
+    """Bounded TTL map from a request digest to its reply (least recently used evicted first)."""
+
+    def __init__(self, ttl_seconds: float, max_entries: int) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup(self, key: str, now: Optional[float] = None) -> Optional[str]:
+        timestamp = now if now is not None else time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if timestamp - entry[0] >= self.ttl_seconds:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def insert(self, key: str, response: str, now: Optional[float] = None) -> None:
+        timestamp = now if now is not None else time()
+        with self._lock:
+            self._entries[key] = (timestamp, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+_CACHE = SemanticCache(
+    threshold=_float_env("PLC_CACHE_THRESHOLD", 0.92),
+    ttl_seconds=_float_env("PLC_CACHE_TTL_SEC", 3600.0),
+    max_entries=_int_env("PLC_CACHE_MAX_ENTRIES", 512),
+    max_total_entries=_int_env("PLC_CACHE_MAX_TOTAL_ENTRIES", 10_000),
+)
+
+
+_EXACT_CACHE = ExactCache(
+    ttl_seconds=_float_env("PLC_CACHE_TTL_SEC", 3600.0),
+    max_entries=_int_env("PLC_EXACT_CACHE_MAX_ENTRIES", 10_000),
+)
+
+
+def lookup(namespace: str, vector: np.ndarray, now: Optional[float] = None) -> Optional[str]:
+    return _CACHE.lookup(namespace, vector, now)
+
+
+def insert(namespace: str, vector: np.ndarray, response: str, now: Optional[float] = None) -> None:
+    _CACHE.insert(namespace, vector, response, now)
+
+
+def lookup_exact(key: str, now: Optional[float] = None) -> Optional[str]:
+    return _EXACT_CACHE.lookup(key, now)
+
+
+def insert_exact(key: str, response: str, now: Optional[float] = None) -> None:
+    _EXACT_CACHE.insert(key, response, now)
+
+
+def clear() -> None:
+    _CACHE.clear()
+    _EXACT_CACHE.clear()
@@ -47,3 +47,21 @@ def test_app_startup_lifespan_validates_runtime_environment(monkeypatch, tmp_pat
     assert response.status_code == 200
     assert response.json()["status"] == "ok"
     assert observed == ["api"]
+
+
+def test_app_startup_creates_storage_dirs_once(monkeypatch, tmp_path):
+    storage_dir = tmp_path / "storage"
+    monkeypatch.setenv("DATABASE_URL", "postgres://example")
+    monkeypatch.setenv("PLC_INLINE_JOBS", "true")
+    monkeypatch.setattr(app_module, "validate_runtime_environment", lambda _service: None)
+    monkeypatch.setattr(app_module, "STORAGE_DIR", storage_dir)
+    monkeypatch.setattr(app_module, "_DIRS_READY_FOR", None)
+
+    with TestClient(app_module.app):
+        assert sorted(p.name for p in storage_dir.iterdir()) == sorted(app_module._STORAGE_SUBDIRS)
+
+    calls: list[Path] = []
+    monkeypatch.setattr(Path, "mkdir", lambda self, *a, **k: calls.append(self))
+    app_module._ensure_dirs()
+
+    assert calls == []
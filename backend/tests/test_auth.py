@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+import sys
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.append(str(ROOT))
+
+import backend.auth as auth_module
+
+
+def _rsa_key_pair(kid: str) -> tuple[object, dict]:
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(private_key.public_key()))
+    jwk.update({"kid": kid, "alg": "RS256", "use": "sig"})
+    return private_key, jwk
+
+
+class _FakeResponse:
+    def __init__(self, payload: dict, status_code: int = 200, headers: dict | None = None) -> None:
+        self._payload = payload
+        self.status_code = status_code
+        self.text = json.dumps(payload)
+        self.headers = headers or {}
+
+    def json(self) -> dict:
+        return self._payload
+
+    def raise_for_status(self) -> None:
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+
+class _FakeClient:
+    def __init__(self, responses: dict[str, list[dict]]) -> None:
+        self._responses = responses
+        self.calls: list[str] = []
+
+    def get(self, url: str, **_kwargs) -> _FakeResponse:
+        self.calls.append(url)
+        queue = self._responses[url]
+        payload = queue.pop(0) if len(queue) > 1 else queue[0]
+        return _FakeResponse(payload)
+
+
+@pytest.fixture(autouse=True)
+def _reset_jwks_cache(monkeypatch):
+    auth_module._APPLE_JWKS.clear()
+    auth_module._GOOGLE_JWKS.clear()
+    monkeypatch.delenv("APPLE_BUNDLE_ID", raising=False)
+    monkeypatch.delenv("GOOGLE_OAUTH_CLIENT_ID", raising=False)
+    yield
+    auth_module._APPLE_JWKS.clear()
+    auth_module._GOOGLE_JWKS.clear()
+
+
+def _apple_token(private_key, kid: str) -> str:
+    return jwt.encode(
+        {"iss": "https://appleid.apple.com", "sub": "apple-user", "email": "a@example.com"},
+        private_key,
+        algorithm="RS256",
+        headers={"kid": kid},
+    )
+
+
+def test_apple_jwks_is_fetched_once_and_keys_are_reused(monkeypatch):
+    private_key, jwk = _rsa_key_pair("kid-1")
+    client = _FakeClient({auth_module.APPLE_JWKS_URL: [{"keys": [jwk]}]})
+    monkeypatch.setattr(auth_module, "_HTTPX_CLIENT", client)
+
+    token = _apple_token(private_key, "kid-1")
+    assert auth_module.verify_apple_token(token) == {"email": "a@example.com", "sub": "apple-user"}
+    assert auth_module.verify_apple_token(token)["sub"] == "apple-user"
+
+    assert client.calls == [auth_module.APPLE_JWKS_URL]
+
+
+def test_apple_jwks_refreshes_on_unknown_kid(monkeypatch):
+    _old_key, old_jwk = _rsa_key_pair("kid-old")
+    new_key, new_jwk = _rsa_key_pair("kid-new")
+    client = _FakeClient({auth_module.APPLE_JWKS_URL: [{"keys": [old_jwk]}, {"keys": [new_jwk]}]})
+    monkeypatch.setattr(auth_module, "_HTTPX_CLIENT", client)
+
+    result = auth_module.verify_apple_token(_apple_token(new_key, "kid-new"))
+
+    assert result["sub"] == "apple-user"
+    assert len(client.calls) == 2
+
+
+def test_apple_jwks_refreshes_after_ttl(monkeypatch):
+    _key, jwk = _rsa_key_pair("kid-1")
+    client = _FakeClient({auth_module.APPLE_JWKS_URL: [{"keys": [jwk]}]})
+    monkeypatch.setattr(auth_module, "_HTTPX_CLIENT", client)
+
+    auth_module._APPLE_JWKS.fetch()
+    auth_module._APPLE_JWKS._expires_at = 0.0
+    auth_module._APPLE_JWKS.fetch()
+
+    assert len(client.calls) == 2
+
+
+def test_apple_token_with_unknown_kid_is_rejected(monkeypatch):
+    _key, jwk = _rsa_key_pair("kid-1")
+    other_key, _other_jwk = _rsa_key_pair("kid-2")
+    client = _FakeClient({auth_module.APPLE_JWKS_URL: [{"keys": [jwk]}]})
+    monkeypatch.setattr(auth_module, "_HTTPX_CLIENT", client)
+
+    with pytest.raises(ValueError, match="No matching Apple public key"):
+        auth_module.verify_apple_token(_apple_token(other_key, "kid-2"))
+
+
+def _google_token(private_key, kid: str, *, aud: str = "client-1", iss: str = "https://accounts.google.com") -> str:
+    return jwt.encode(
+        {"iss": iss, "aud": aud, "sub": "google-user", "email": "g@example.com", "name": "G"},
+        private_key,
+        algorithm="RS256",
+        headers={"kid": kid},
+    )
+
+
+def test_google_token_is_verified_locally_against_jwks(monkeypatch):
+    monkeypatch.setenv("GOOGLE_OAUTH_CLIENT_ID", "client-1")
+    private_key, jwk = _rsa_key_pair("g-kid")
+    client = _FakeClient({auth_module.GOOGLE_JWKS_URL: [{"keys": [jwk]}]})
+    monkeypatch.setattr(auth_module, "_HTTPX_CLIENT", client)
+
+    token = _google_token(private_key, "g-kid", iss="accounts.google.com")
+    first = auth_module.verify_google_token(token)
+    second = auth_module.verify_google_token(token)
+
+    assert first == second == {"email": "g@example.com", "sub": "google-user", "name": "G"}
+    assert client.calls == [auth_module.GOOGLE_JWKS_URL]
+
+
+def test_google_token_audience_mismatch_is_rejected(monkeypatch):
+    monkeypatch.setenv("GOOGLE_OAUTH_CLIENT_ID", "client-1")
+    private_key, jwk = _rsa_key_pair("g-kid")
+    client = _FakeClient({auth_module.GOOGLE_JWKS_URL: [{"keys": [jwk]}]})
+    monkeypatch.setattr(auth_module, "_HTTPX_CLIENT", client)
+
+    with pytest.raises(ValueError, match="Google token verification failed"):
+        auth_module.verify_google_token(_google_token(private_key, "g-kid", aud="someone-else"))
+
+
+def test_google_token_falls_back_to_tokeninfo_on_jwks_miss(monkeypatch):
+    private_key, _jwk = _rsa_key_pair("unknown-kid")
+    client = _FakeClient(
+        {
+            auth_module.GOOGLE_JWKS_URL: [{"keys": []}],
+            auth_module.GOOGLE_TOKENINFO_URL: [{"email": "g@example.com", "sub": "google-user"}],
+        }
+    )
+    monkeypatch.setattr(auth_module, "_HTTPX_CLIENT", client)
+
+    result = auth_module.verify_google_token(_google_token(private_key, "unknown-kid"))
+
+    assert result == {"email": "g@example.com", "sub": "google-user", "name": None}
+    assert client.calls[-1] == auth_module.GOOGLE_TOKENINFO_URL
+
+
+def test_jwks_cache_honors_cache_control_max_age(monkeypatch):
+    class _Client(_FakeClient):
+        def get(self, url: str, **_kwargs) -> _FakeResponse:
+            self.calls.append(url)
+            return _FakeResponse({"keys": []}, headers={"cache-control": "public, max-age=0, must-revalidate"})
+
+    client = _Client({})
+    monkeypatch.setattr(auth_module, "_HTTPX_CLIENT", client)
+
+    auth_module._GOOGLE_JWKS.fetch()
+    auth_module._GOOGLE_JWKS.fetch()
+
+    assert len(client.calls) == 2
+
+
+def test_hash_password_uses_argon2id_and_round_trips():
+    password_hash = auth_module.hash_password("correct horse")
+
+    assert password_hash.startswith("$argon2id$")
+    assert auth_module.verify_password("correct horse", password_hash)
+    assert not auth_module.verify_password("wrong", password_hash)
+    assert not auth_module.password_needs_rehash(password_hash)
+
+
+def test_legacy_bcrypt_hash_still_verifies_and_needs_rehash():
+    import bcrypt
+
+    legacy_hash = bcrypt.hashpw(b"correct horse", bcrypt.gensalt(rounds=4)).decode("utf-8")
+
+    assert auth_module.verify_password("correct horse", legacy_hash)
+    assert not auth_module.verify_password("wrong", legacy_hash)
+    assert auth_module.password_needs_rehash(legacy_hash)
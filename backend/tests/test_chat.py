@@ -0,0 +1,415 @@
+from __future__ import annotations
+
+from pathlib import Path
+import json
+import logging
+import sys
+import types
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.append(str(ROOT))
+
+import backend.chat as chat_module
+
+
+class FakeCompletions:
+    def __init__(self, content: str = "ok") -> None:
+        self.content = content
+        self.calls: list[dict] = []
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        message = types.SimpleNamespace(content=self.content)
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)])
+
+
+def _fake_openai_client(completions: FakeCompletions):
+    return types.SimpleNamespace(chat=types.SimpleNamespace(completions=completions))
+
+
+def test_openai_client_is_cached(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    chat_module._openai_client.cache_clear()
+    try:
+        assert chat_module._openai_client() is chat_module._openai_client()
+        assert chat_module._openai_client().max_retries == chat_module._MAX_RETRIES
+    finally:
+        chat_module._openai_client.cache_clear()
+
+
+def test_chat_openai_reuses_cached_system_message(monkeypatch):
+    completions = FakeCompletions("hello")
+    monkeypatch.setattr(chat_module, "_openai_client", lambda: _fake_openai_client(completions))
+    monkeypatch.setattr(chat_module, "_PROVIDER", "openai")
+
+    response = chat_module.get_chat_response(
+        "hi", [{"isUser": True, "text": "earlier"}, {"isUser": False, "text": "reply"}]
+    )
+    chat_module.get_chat_response("again", [])
+    chat_module.get_chat_response("hi", [], context="Course ID: c-1")
+    chat_module.get_chat_response("again", [], context="Course ID: c-1")
+
+    assert response == "hello"
+    messages = completions.calls[0]["messages"]
+    assert messages[0] == {"role": "system", "content": chat_module.SYSTEM_INSTRUCTION}
+    assert [m["role"] for m in messages] == ["system", "user", "assistant", "user"]
+    first, second, course_first, course_second = (call["messages"][0] for call in completions.calls)
+    assert first is second
+    assert course_first is course_second
+    assert course_first is not first
+
+
+def test_chat_openai_appends_context_to_system_message(monkeypatch):
+    completions = FakeCompletions()
+    monkeypatch.setattr(chat_module, "_openai_client", lambda: _fake_openai_client(completions))
+    monkeypatch.setattr(chat_module, "_PROVIDER", "openai")
+
+    chat_module.get_chat_response("hi", [], context="Course ID: c-1")
+
+    system_message = completions.calls[0]["messages"][0]
+    assert system_message["content"].endswith("Context:\nCourse ID: c-1")
+
+
+class FakeStreamingCompletions(FakeCompletions):
+    def __init__(self, deltas: list[str | None]) -> None:
+        super().__init__()
+        self.deltas = deltas
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        return iter(
+            types.SimpleNamespace(choices=[types.SimpleNamespace(delta=types.SimpleNamespace(content=d))])
+            for d in self.deltas
+        )
+
+
+def test_stream_chat_response_yields_openai_deltas(monkeypatch):
+    completions = FakeStreamingCompletions(["Hel", None, "lo"])
+    monkeypatch.setattr(chat_module, "_openai_client", lambda: _fake_openai_client(completions))
+    monkeypatch.setattr(chat_module, "_PROVIDER", "openai")
+
+    assert list(chat_module.stream_chat_response("hi", [])) == ["Hel", "lo"]
+    assert completions.calls[0]["stream"] is True
+
+
+def test_stream_chat_response_yields_fallback_on_error(monkeypatch):
+    def _boom():
+        raise RuntimeError("no key")
+
+    monkeypatch.setattr(chat_module, "_openai_client", _boom)
+    monkeypatch.setattr(chat_module, "_PROVIDER", "openai")
+
+    assert list(chat_module.stream_chat_response("hi", [])) == [chat_module._FALLBACK_REPLY]
+
+
+def test_chat_stream_endpoint_emits_sse_events(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    import backend.app as app_module
+
+    monkeypatch.setattr(app_module, "stream_chat_response", lambda **_kwargs: iter(["a", "b"]))
+    client = TestClient(app_module.app)
+
+    response = client.post("/chat/stream", json={"message": "hi"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [json.loads(line[len("data: "):]) for line in response.text.splitlines() if line]
+    assert events == [{"delta": "a"}, {"delta": "b"}, {"done": True}]
+
+
+class FakeEmbeddings:
+    def __init__(self, vectors: dict[str, list[float]]) -> None:
+        self.vectors = vectors
+        self.calls: list[str] = []
+
+    def create(self, *, model: str, input: str):
+        self.calls.append(input)
+        return types.SimpleNamespace(data=[types.SimpleNamespace(embedding=self.vectors[input])])
+
+
+def test_semantic_cache_serves_paraphrase_without_completion(monkeypatch):
+    completions = FakeCompletions("Recursion is a function calling itself.")
+    embeddings = FakeEmbeddings(
+        {
+            "explain recursion": [1.0, 0.0, 0.1],
+            "what is recursion": [0.98, 0.0, 0.12],
+            "what is a linked list": [0.0, 1.0, 0.0],
+        }
+    )
+    client = types.SimpleNamespace(chat=types.SimpleNamespace(completions=completions), embeddings=embeddings)
+    monkeypatch.setattr(chat_module, "_openai_client", lambda: client)
+    monkeypatch.setattr(chat_module, "_PROVIDER", "openai")
+    monkeypatch.setenv("PLC_CHAT_SEMANTIC_CACHE", "1")
+    chat_module.semantic_cache.clear()
+
+    first = chat_module.get_chat_response("explain recursion", [], context="Course ID: c-1")
+    second = chat_module.get_chat_response("what is recursion", [], context="Course ID: c-1")
+    chat_module.get_chat_response("what is recursion", [], context="Course ID: c-2")
+    chat_module.get_chat_response("what is a linked list", [], context="Course ID: c-1")
+    chat_module.semantic_cache.clear()
+
+    assert first == second == "Recursion is a function calling itself."
+    assert len(completions.calls) == 3
+
+
+def test_semantic_cache_is_bypassed_for_long_histories(monkeypatch):
+    completions = FakeCompletions("fresh")
+    embeddings = FakeEmbeddings({"again": [1.0, 0.0]})
+    client = types.SimpleNamespace(chat=types.SimpleNamespace(completions=completions), embeddings=embeddings)
+    monkeypatch.setattr(chat_module, "_openai_client", lambda: client)
+    monkeypatch.setattr(chat_module, "_PROVIDER", "openai")
+    monkeypatch.setenv("PLC_CHAT_SEMANTIC_CACHE", "1")
+    monkeypatch.setenv("PLC_CACHE_MAX_HISTORY", "2")
+    chat_module.METRICS.reset()
+    history = [{"isUser": i % 2 == 0, "text": f"turn {i}"} for i in range(3)]
+
+    chat_module.get_chat_response("again", history)
+    chat_module.get_chat_response("again", history)
+
+    assert len(completions.calls) == 2
+    assert embeddings.calls == []
+    assert chat_module.METRICS.snapshot()["chatCacheEvents"] == {"skipped": 2}
+    chat_module.METRICS.reset()
+
+
+def test_verbose_system_prompt_flag(monkeypatch):
+    completions = FakeCompletions()
+    monkeypatch.setattr(chat_module, "_openai_client", lambda: _fake_openai_client(completions))
+    monkeypatch.setattr(chat_module, "_PROVIDER", "openai")
+
+    chat_module.get_chat_response("hi", [])
+    monkeypatch.setattr(chat_module, "_INSTRUCTION", chat_module.SYSTEM_INSTRUCTION_VERBOSE)
+    chat_module.get_chat_response("hi", [])
+
+    compact, verbose = (call["messages"][0]["content"] for call in completions.calls)
+    assert compact == chat_module.SYSTEM_INSTRUCTION
+    assert verbose == chat_module.SYSTEM_INSTRUCTION_VERBOSE
+    assert len(compact) < 0.7 * len(verbose)
+
+
+def test_stream_chat_response_shares_semantic_cache(monkeypatch):
+    completions = FakeStreamingCompletions(["Recur", "sion"])
+    embeddings = FakeEmbeddings({"explain recursion": [1.0, 0.0], "what is recursion": [0.99, 0.05]})
+    client = types.SimpleNamespace(chat=types.SimpleNamespace(completions=completions), embeddings=embeddings)
+    monkeypatch.setattr(chat_module, "_openai_client", lambda: client)
+    monkeypatch.setattr(chat_module, "_PROVIDER", "openai")
+    monkeypatch.setenv("PLC_CHAT_SEMANTIC_CACHE", "1")
+    chat_module.semantic_cache.clear()
+
+    first = list(chat_module.stream_chat_response("explain recursion", []))
+    second = list(chat_module.stream_chat_response("what is recursion", []))
+    chat_module.semantic_cache.clear()
+
+    assert first == ["Recur", "sion"]
+    assert second == ["Recursion"]
+    assert len(completions.calls) == 1
+
+
+def test_semantic_cache_is_scoped_to_the_requested_model(monkeypatch):
+    completions = FakeStreamingCompletions(["Recursion"])
+    embeddings = FakeEmbeddings({"explain recursion": [1.0, 0.0]})
+    client = types.SimpleNamespace(chat=types.SimpleNamespace(completions=completions), embeddings=embeddings)
+    monkeypatch.setattr(chat_module, "_openai_client", lambda: client)
+    monkeypatch.setattr(chat_module, "_PROVIDER", "openai")
+    monkeypatch.setenv("PLC_CHAT_SEMANTIC_CACHE", "1")
+    chat_module.semantic_cache.clear()
+
+    list(chat_module.stream_chat_response("explain recursion", []))
+    list(chat_module.stream_chat_response("explain recursion", [], model="gpt-4o"))
+    chat_module.semantic_cache.clear()
+
+    assert len(completions.calls) == 2
+
+
+class FakeAsyncCompletions:
+    def __init__(self) -> None:
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def create(self, **kwargs):
+        import asyncio
+
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        content = kwargs["messages"][-1]["content"]
+        if content == "boom":
+            raise RuntimeError("upstream failed")
+        message = types.SimpleNamespace(content=content.upper())
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)])
+
+
+def test_chat_responses_batch_runs_concurrently_in_order(monkeypatch):
+    import asyncio
+
+    completions = FakeAsyncCompletions()
+    monkeypatch.setattr(chat_module, "_async_openai_client", lambda: _fake_openai_client(completions))
+    monkeypatch.setattr(chat_module, "_PROVIDER", "openai")
+
+    replies = asyncio.run(
+        chat_module.get_chat_responses_batch([("a", [], ""), ("boom", [], ""), ("c", [], "Course ID: c-1")])
+    )
+
+    assert replies == ["A", chat_module._FALLBACK_REPLY, "C"]
+    assert completions.max_in_flight == 3
+
+
+def test_chat_batch_endpoint_limits_batch_size(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    import backend.app as app_module
+
+    async def fake_batch(items):
+        return [message for message, _history, _context in items]
+
+    monkeypatch.setattr(app_module, "get_chat_responses_batch", fake_batch)
+    client = TestClient(app_module.app)
+
+    response = client.post("/chat/batch", json={"items": [{"message": "x"}, {"message": "y"}]})
+    too_many = client.post("/chat/batch", json={"items": [{"message": "x"}] * (app_module.MAX_CHAT_BATCH_ITEMS + 1)})
+
+    assert response.json() == {"responses": ["x", "y"]}
+    assert too_many.status_code == 400
+
+
+def test_history_is_trimmed_to_token_budget_oldest_first(monkeypatch):
+    completions = FakeCompletions()
+    monkeypatch.setattr(chat_module, "_openai_client", lambda: _fake_openai_client(completions))
+    monkeypatch.setattr(chat_module, "_PROVIDER", "openai")
+    monkeypatch.setattr(chat_module, "_HISTORY_TOKEN_BUDGET", 60)
+    history = [{"isUser": i % 2 == 0, "text": f"{i}" * 80} for i in range(5)]
+
+    chat_module.get_chat_response("latest", history)
+
+    contents = [m["content"] for m in completions.calls[0]["messages"][1:]]
+    assert contents == ["3" * 80, "4" * 80, "latest"]
+
+
+def test_exact_cache_skips_repeat_prompts_without_embedding(monkeypatch):
+    completions = FakeCompletions("Lecture 3 covers sorting.")
+    embeddings = FakeEmbeddings({})
+    client = types.SimpleNamespace(chat=types.SimpleNamespace(completions=completions), embeddings=embeddings)
+    monkeypatch.setattr(chat_module, "_openai_client", lambda: client)
+    monkeypatch.setattr(chat_module, "_PROVIDER", "openai")
+    monkeypatch.setenv("PLC_CHAT_EXACT_CACHE", "1")
+    chat_module.semantic_cache.clear()
+
+    first = chat_module.get_chat_response("summarize lecture 3", [], context="Course ID: c-1")
+    second = chat_module.get_chat_response("summarize lecture 3", [], context="Course ID: c-1")
+    chat_module.get_chat_response("summarize lecture 3", [], context="Course ID: c-2")
+    chat_module.semantic_cache.clear()
+
+    assert first == second == "Lecture 3 covers sorting."
+    assert len(completions.calls) == 2
+    assert embeddings.calls == []
+
+
+def test_stream_chat_response_uses_exact_cache(monkeypatch):
+    completions = FakeStreamingCompletions(["Sort", "ing"])
+    embeddings = FakeEmbeddings({})
+    client = types.SimpleNamespace(chat=types.SimpleNamespace(completions=completions), embeddings=embeddings)
+    monkeypatch.setattr(chat_module, "_openai_client", lambda: client)
+    monkeypatch.setattr(chat_module, "_PROVIDER", "openai")
+    monkeypatch.setenv("PLC_CHAT_EXACT_CACHE", "1")
+    chat_module.semantic_cache.clear()
+
+    first = list(chat_module.stream_chat_response("summarize lecture 3", []))
+    second = list(chat_module.stream_chat_response("summarize lecture 3", []))
+    chat_module.semantic_cache.clear()
+
+    assert first == ["Sort", "ing"]
+    assert second == ["Sorting"]
+    assert len(completions.calls) == 1
+    assert embeddings.calls == []
+
+
+def test_model_argument_overrides_configured_model(monkeypatch):
+    completions = FakeCompletions()
+    monkeypatch.setattr(chat_module, "_openai_client", lambda: _fake_openai_client(completions))
+    monkeypatch.setattr(chat_module, "_PROVIDER", "openai")
+    monkeypatch.setattr(chat_module, "_MODEL_NAME", "gpt-4o-mini")
+
+    chat_module.get_chat_response("hi", [])
+    chat_module.get_chat_response("hi", [], model="gpt-4o")
+
+    assert [call["model"] for call in completions.calls] == ["gpt-4o-mini", "gpt-4o"]
+
+
+class FakeBatchClient:
+    def __init__(self, output_lines: list[dict]) -> None:
+        self.uploads: list[tuple[str, bytes, str]] = []
+        self.output = "\n".join(json.dumps(line) for line in output_lines)
+        self.files = types.SimpleNamespace(create=self._create_file, content=self._content)
+        self.batches = types.SimpleNamespace(create=self._create_batch, retrieve=self._retrieve)
+        self.batch_kwargs: dict = {}
+
+    def _create_file(self, *, file, purpose):
+        self.uploads.append((file[0], file[1], purpose))
+        return types.SimpleNamespace(id="file-in")
+
+    def _create_batch(self, **kwargs):
+        self.batch_kwargs = kwargs
+        return types.SimpleNamespace(id="batch-1")
+
+    def _retrieve(self, batch_id):
+        counts = types.SimpleNamespace(completed=1, failed=1, total=2)
+        return types.SimpleNamespace(id=batch_id, status="completed", request_counts=counts, output_file_id="file-out")
+
+    def _content(self, file_id):
+        assert file_id == "file-out"
+        return types.SimpleNamespace(text=self.output)
+
+
+def test_submit_chat_batch_uploads_jsonl_requests(monkeypatch):
+    client = FakeBatchClient([])
+    monkeypatch.setattr(chat_module, "_openai_client", lambda: client)
+    monkeypatch.setattr(chat_module, "_MODEL_NAME", "gpt-4o-mini")
+
+    batch_id = chat_module.submit_chat_batch(
+        [{"custom_id": "q1", "message": "hi"}, {"custom_id": "q2", "message": "yo", "context": "Course ID: c-1"}]
+    )
+
+    assert batch_id == "batch-1"
+    name, payload, purpose = client.uploads[0]
+    assert purpose == "batch"
+    requests = [json.loads(line) for line in payload.decode("utf-8").splitlines()]
+    assert [r["custom_id"] for r in requests] == ["q1", "q2"]
+    assert requests[0]["url"] == "/v1/chat/completions"
+    assert requests[1]["body"]["messages"][0]["content"].endswith("Course ID: c-1")
+    assert client.batch_kwargs == {
+        "input_file_id": "file-in",
+        "endpoint": "/v1/chat/completions",
+        "completion_window": "24h",
+    }
+
+
+def test_poll_and_fetch_batch_results(monkeypatch):
+    client = FakeBatchClient(
+        [
+            {"custom_id": "q1", "response": {"status_code": 200, "body": {"choices": [{"message": {"content": "A"}}]}}},
+            {"custom_id": "q2", "response": None, "error": {"message": "bad"}},
+        ]
+    )
+    monkeypatch.setattr(chat_module, "_openai_client", lambda: client)
+
+    assert chat_module.poll_batch("batch-1")["status"] == "completed"
+    assert chat_module.fetch_batch_results("batch-1") == {"q1": "A", "q2": None}
+
+
+def test_request_debug_log_is_skipped_unless_enabled(monkeypatch, caplog):
+    class ReprCounter(dict):
+        calls = 0
+
+        def __repr__(self):
+            ReprCounter.calls += 1
+            return "msg"
+
+    caplog.set_level(logging.INFO, logger="pegasus.chat")
+    chat_module._log_request("gpt-4o-mini", [ReprCounter()])
+    assert ReprCounter.calls == 0
+
+    caplog.set_level(logging.DEBUG, logger="pegasus.chat")
+    chat_module._log_request("gpt-4o-mini", [ReprCounter()])
+    assert ReprCounter.calls >= 1
@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+from pathlib import Path
+import sys
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.append(str(ROOT))
+
+pytest.importorskip("fastapi")
+try:
+    from fastapi.testclient import TestClient
+except RuntimeError as exc:  # pragma: no cover
+    if "httpx" in str(exc):
+        TestClient = None
+    else:
+        raise
+
+if TestClient is None:
+    pytestmark = pytest.mark.skip(reason="fastapi.testclient requires httpx")
+
+import backend.app as app_module
+import backend.db as db_module
+
+
+class FakeCursor:
+    def __init__(self, conn: "FakeConnection") -> None:
+        self.conn = conn
+        self.rowcount = 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        return None
+
+    def execute(self, sql: str, params=None) -> None:
+        self.conn.statements.append((" ".join(sql.split()), params))
+
+    def fetchall(self):
+        return list(self.conn.rows)
+
+    def fetchone(self):
+        return self.conn.rows[0] if self.conn.rows else None
+
+
+class FakeConnection:
+    def __init__(self) -> None:
+        self.rows: list[dict] = []
+        self.statements: list = []
+
+    def cursor(self, row_factory=None, binary=False):
+        return FakeCursor(self)
+
+
+class FakePool:
+    def __init__(self, dsn: str, **_kwargs) -> None:
+        self.conn = FakeConnection()
+
+    @contextmanager
+    def connection(self):
+        yield self.conn
+
+
+@pytest.fixture
+def context_conn(monkeypatch):
+    monkeypatch.delenv("DATABASE_URL", raising=False)
+    monkeypatch.delenv("PLC_WRITE_API_TOKEN", raising=False)
+    monkeypatch.setattr(db_module, "ConnectionPool", FakePool)
+    monkeypatch.setattr(db_module, "_POOLS", {})
+    db = db_module.Database(dsn="postgres://context")
+    monkeypatch.setattr(app_module, "get_database", lambda: db)
+    return db_module._pool_for(db.dsn).conn
+
+
+def test_list_context_files_runs_on_a_pooled_connection(context_conn):
+    context_conn.rows = [{"id": "f1", "courseId": "c1", "tag": "NOTES", "filePath": "/ctx/f1.md"}]
+    client = TestClient(app_module.app)
+
+    response = client.get("/context/files", params={"course_id": "c1", "tag": "NOTES"})
+
+    assert response.status_code == 200
+    assert response.json() == {"files": context_conn.rows}
+    assert context_conn.statements[0][1] == {"course_id": "c1", "tag": "NOTES"}
+
+
+def test_delete_context_file_removes_the_file_and_row(context_conn, tmp_path):
+    stored = tmp_path / "f1.md"
+    stored.write_text("notes")
+    context_conn.rows = [{"id": "f1", "filePath": str(stored)}]
+    client = TestClient(app_module.app)
+
+    response = client.delete("/context/files/f1")
+
+    assert response.status_code == 200
+    assert not stored.exists()
+    assert [params for _sql, params in context_conn.statements] == [{"file_id": "f1"}, {"file_id": "f1"}]
+    assert context_conn.statements[1][0].lower().startswith("delete from context_files")
+
+    context_conn.rows = []
+    assert client.delete("/context/files/missing").status_code == 404
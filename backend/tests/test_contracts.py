@@ -172,6 +172,25 @@ class FakeDB:
 
 
 
+class AsyncFakeDB:
+    """The ``AsyncDatabase`` reads the async lecture endpoints use, over a ``FakeDB``."""
+
+    def __init__(self, db: FakeDB) -> None:
+        self.db = db
+
+    async def fetch_lecture(self, lecture_id: str):
+        return self.db.fetch_lecture(lecture_id)
+
+    async def fetch_lectures_page(self, limit=None, offset=None, **filters):
+        rows = self.db.fetch_lectures(limit=limit, offset=offset, **filters)
+        return rows, self.db.count_lectures(**filters)
+
+
+def _use_fake_db(monkeypatch, fake_db: FakeDB) -> None:
+    monkeypatch.setattr(app_module, "get_database", lambda: fake_db)
+    monkeypatch.setattr(app_module, "get_async_database", lambda: AsyncFakeDB(fake_db))
+
+
 def test_artifacts_contract(monkeypatch, tmp_path):
     fake_db = FakeDB()
     lecture_id = "lecture-001"
@@ -365,7 +384,7 @@ def test_course_and_lecture_listings(monkeypatch):
         "created_at": "2024-01-03T00:00:00Z",
     }
 
-    monkeypatch.setattr(app_module, "get_database", lambda: fake_db)
+    _use_fake_db(monkeypatch, fake_db)
     client = TestClient(app_module.app)
 
     response = client.get("/courses")
@@ -497,6 +516,7 @@ def test_course_and_lecture_listings(monkeypatch):
         "hasMore": True,
         "nextOffset": 1,
         "prevOffset": None,
+        "nextCursor": app_module._encode_cursor({"created_at": "2024-01-03T00:00:00Z", "id": "lecture-2"}),
     }
 
 
@@ -670,6 +690,7 @@ def test_course_threads_listing_supports_pagination(monkeypatch):
         "hasMore": True,
         "nextOffset": 2,
         "prevOffset": 0,
+        "nextCursor": app_module._encode_cursor({"created_at": "2024-01-03T00:00:00Z", "id": "thread-2"}),
     }
 
 
@@ -718,6 +739,7 @@ def test_lecture_jobs_listing_includes_pagination(monkeypatch):
         "hasMore": True,
         "nextOffset": 1,
         "prevOffset": None,
+        "nextCursor": app_module._encode_cursor({"created_at": "2024-01-02T00:00:00Z", "id": "job-2"}),
     }
 
 
@@ -1005,7 +1027,7 @@ def test_get_lecture_details(monkeypatch):
         "created_at": "2024-01-01T00:00:00Z",
     }
 
-    monkeypatch.setattr(app_module, "get_database", lambda: fake_db)
+    _use_fake_db(monkeypatch, fake_db)
     client = TestClient(app_module.app)
 
     response = client.get("/lectures/lecture-42")
@@ -1328,3 +1350,26 @@ def test_export_deduplicates_when_active_job_exists(monkeypatch):
     assert payload["status"] == "running"
     assert payload["jobType"] == "export"
     assert payload["deduplicated"] is True
+
+
+def test_credits_summary_takes_a_calendar_month(monkeypatch):
+    from datetime import date
+
+    calls: list = []
+
+    class CreditsDB:
+        def fetch_user_credits_summary(self, user_id, since_month=None):
+            calls.append((user_id, since_month))
+            return {"totalTokens": 0}
+
+    monkeypatch.setattr(app_module, "get_database", lambda: CreditsDB())
+    monkeypatch.setattr(app_module, "get_current_user", lambda request: {"id": "user-1"})
+    client = TestClient(app_module.app)
+
+    assert client.get("/credits/summary").status_code == 200
+    assert client.get("/credits/summary", params={"month": "2026-02"}).status_code == 200
+    for bad in ("2026-02-15", "2026-13", "feb"):
+        response = client.get("/credits/summary", params={"month": bad})
+        assert response.status_code == 400
+        assert response.json()["detail"] == "month must be YYYY-MM."
+    assert calls == [("user-1", None), ("user-1", date(2026, 2, 1))]
@@ -0,0 +1,1467 @@
+from __future__ import annotations
+
+from contextlib import contextmanager, nullcontext
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from pathlib import Path
+import sys
+
+import psycopg
+import psycopg_pool
+import pytest
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.append(str(ROOT))
+
+import backend.db as db_module
+
+
+class FakeConnection:
+    def __init__(self) -> None:
+        self.autocommit = True
+        self.events: list[str] = []
+
+    def commit(self) -> None:
+        self.events.append(f"commit(autocommit={self.autocommit})")
+
+    def rollback(self) -> None:
+        self.events.append(f"rollback(autocommit={self.autocommit})")
+
+
+class FakePool:
+    created: list["FakePool"] = []
+
+    def __init__(self, dsn: str, **kwargs) -> None:
+        self.dsn = dsn
+        self.kwargs = kwargs
+        self.conn = FakeConnection()
+        self.closed = False
+        FakePool.created.append(self)
+
+    @contextmanager
+    def connection(self):
+        yield self.conn
+
+    def close(self) -> None:
+        self.closed = True
+
+
+@pytest.fixture
+def fake_pool(monkeypatch):
+    FakePool.created = []
+    monkeypatch.setattr(db_module, "ConnectionPool", FakePool)
+    monkeypatch.setattr(db_module, "_POOLS", {})
+    db_module._CREDITS_SUMMARY_CACHE.clear()
+    db_module._TOKEN_BALANCE_CACHE.clear()
+    yield FakePool
+
+
+def test_databases_share_one_pool_per_dsn(fake_pool):
+    first = db_module.Database(dsn="postgres://a")
+    second = db_module.Database(dsn="postgres://a")
+    other = db_module.Database(dsn="postgres://b")
+
+    with first.connect() as conn_a, second.connect() as conn_b, other.connect() as conn_c:
+        assert conn_a is conn_b
+        assert conn_c is not conn_a
+
+    assert [pool.dsn for pool in fake_pool.created] == ["postgres://a", "postgres://b"]
+    assert fake_pool.created[0].kwargs["kwargs"]["autocommit"] is True
+    assert fake_pool.created[0].kwargs["kwargs"]["prepare_threshold"] == 0
+    assert fake_pool.created[0].kwargs["check"] == psycopg_pool.ConnectionPool.check_connection
+    assert fake_pool.created[0].kwargs["max_idle"] == 300.0
+
+    db_module.close_pools()
+    assert all(pool.closed for pool in fake_pool.created)
+
+
+def test_prepare_threshold_can_be_disabled(monkeypatch):
+    monkeypatch.setenv("PLC_DB_PREPARE_THRESHOLD", "none")
+    assert db_module._prepare_threshold() is None
+    monkeypatch.setenv("PLC_DB_PREPARE_THRESHOLD", "5")
+    assert db_module._prepare_threshold() == 5
+
+
+class CteCursor:
+    def __init__(self, statements: list) -> None:
+        self.statements = statements
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        return None
+
+    def execute(self, sql: str, params=None) -> None:
+        self.statements.append((" ".join(sql.split()), params))
+
+    def fetchone(self) -> dict:
+        return {
+            "thread_occurrences": 5,
+            "thread_updates": 0,
+            "artifacts": 3,
+            "exports": 1,
+            "jobs": 2,
+            "lectures": 1,
+        }
+
+
+def test_delete_lecture_records_runs_one_cte_statement(fake_pool):
+    db = db_module.Database(dsn="postgres://a")
+    statements: list = []
+    db_module._pool_for(db.dsn).conn.cursor = lambda: CteCursor(statements)
+
+    result = db.delete_lecture_records("lecture-1")
+
+    assert result == {"artifacts": 3, "exports": 1, "jobs": 2, "lectures": 1}
+    assert len(statements) == 1
+    sql, params = statements[0]
+    assert params == {"lecture_id": "lecture-1"}
+    for table in ("thread_occurrences", "thread_updates", "artifacts", "exports", "jobs", "lectures"):
+        assert f"delete from {table} where" in sql
+
+
+class ExecuteManyCursor:
+    def __init__(self, calls: list) -> None:
+        self.calls = calls
+        self.rowcount = -1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        return None
+
+    def execute(self, *_args, **_kwargs) -> None:
+        raise AssertionError("expected a single executemany call")
+
+    def executemany(self, sql: str, rows: list) -> None:
+        self.calls.append((sql, rows))
+        self.rowcount = len(rows) - 1
+
+
+def test_thread_inserts_are_batched_with_executemany(fake_pool):
+    db = db_module.Database(dsn="postgres://a")
+    conn = db_module._pool_for(db.dsn).conn
+    calls: list = []
+    conn.cursor = lambda: ExecuteManyCursor(calls)
+
+    occurrences = [{"id": f"o{i}"} for i in range(3)]
+    updates = [{"id": "u1", "details": {"k": 1}}, {"id": "u2", "details": None}]
+
+    assert db.insert_thread_occurrences(occurrences) == 2
+    assert db.insert_thread_updates(updates) == 1
+    assert db.insert_thread_occurrences([]) == 0
+
+    assert len(calls) == 2
+    assert calls[0][1] == occurrences
+    assert calls[1][1][0]["details"].obj == {"k": 1}
+    assert calls[1][1][1]["details"] is None
+
+
+class SqlRecordingCursor:
+    def __init__(self, statements: list[str]) -> None:
+        self.statements = statements
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        return None
+
+    def execute(self, sql: str, params=None) -> None:
+        self.statements.append(" ".join(sql.split()))
+
+    def fetchall(self) -> list:
+        return []
+
+    def fetchone(self):
+        return None
+
+
+def test_thread_list_queries_skip_evolution_notes(fake_pool):
+    db = db_module.Database(dsn="postgres://a")
+    statements: list[str] = []
+    db_module._pool_for(db.dsn).conn.cursor = lambda: SqlRecordingCursor(statements)
+
+    db.fetch_threads_for_course("course-1")
+    db.fetch_threads("lecture-1")
+    db.fetch_thread_by_id("thread-1")
+
+    assert all("select *" not in sql for sql in statements)
+    assert "evolution_notes" not in statements[0]
+    assert "evolution_notes" not in statements[1]
+    assert "evolution_notes" in statements[2]
+
+
+class NamedCursor:
+    def __init__(self, name: str, rows: list[dict], log: list) -> None:
+        self.name = name
+        self.rows = rows
+        self.log = log
+        self.itersize = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.log.append("close")
+
+    def execute(self, sql: str, params=None) -> None:
+        self.log.append(("execute", self.name, self.itersize))
+
+    def __iter__(self):
+        return iter(self.rows)
+
+
+def test_iter_jobs_streams_through_named_cursor(fake_pool):
+    db = db_module.Database(dsn="postgres://a")
+    conn = db_module._pool_for(db.dsn).conn
+    log: list = []
+    rows = [{"id": "j1"}, {"id": "j2"}]
+
+    @contextmanager
+    def transaction():
+        log.append("begin")
+        yield
+        log.append("commit")
+
+    conn.transaction = transaction
+    conn.cursor = lambda name=None: NamedCursor(name, rows, log)
+
+    jobs = db.iter_jobs(itersize=100)
+    assert log == []
+    assert list(jobs) == rows
+    assert log == ["begin", ("execute", "jobs_stream", 100), "close", "commit"]
+
+
+class PageCursor:
+    def __init__(self, results: list, statements: list) -> None:
+        self.results = results
+        self.statements = statements
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        return None
+
+    def execute(self, sql: str, params=None) -> None:
+        self.statements.append((" ".join(sql.split()), params))
+
+    def fetchall(self) -> list:
+        return self.results.pop(0)
+
+    def fetchone(self):
+        return self.results.pop(0)
+
+
+def test_fetch_lectures_page_reads_total_from_window(fake_pool):
+    db = db_module.Database(dsn="postgres://a")
+    statements: list = []
+    results = [[{"id": "l1", "_total": 7}, {"id": "l2", "_total": 7}]]
+    db_module._pool_for(db.dsn).conn.cursor = lambda: PageCursor(results, statements)
+
+    rows, total = db.fetch_lectures_page(course_id="c1", limit=2, offset=0)
+
+    assert rows == [{"id": "l1"}, {"id": "l2"}]
+    assert total == 7
+    assert len(statements) == 1
+    sql, params = statements[0]
+    assert "count(*) over () as _total from lectures where course_id = %(course_id)s" in sql
+    assert params == {"course_id": "c1", "limit": 2, "offset": 0}
+
+
+def test_fetch_jobs_page_counts_separately_past_the_end(fake_pool):
+    db = db_module.Database(dsn="postgres://a")
+    statements: list = []
+    results = [[], {"total": 3}]
+    db_module._pool_for(db.dsn).conn.cursor = lambda: PageCursor(results, statements)
+
+    rows, total = db.fetch_jobs_page(lecture_id="lecture-1", limit=10, offset=10)
+
+    assert rows == []
+    assert total == 3
+    assert statements[1][0] == "select count(*) as total from jobs where lecture_id = %(lecture_id)s;"
+
+
+def test_fetch_jobs_before_seeks_on_created_at_and_id(fake_pool):
+    db = db_module.Database(dsn="postgres://a")
+    statements: list = []
+    results = [[{"id": "j3"}, {"id": "j4"}, {"id": "j5"}]]
+    db_module._pool_for(db.dsn).conn.cursor = lambda: PageCursor(results, statements)
+
+    rows, has_more = db.fetch_jobs_before(("2024-01-02T00:00:00Z", "j2"), lecture_id="lecture-1", limit=2)
+
+    assert rows == [{"id": "j3"}, {"id": "j4"}]
+    assert has_more is True
+    sql, params = statements[0]
+    assert "where lecture_id = %(lecture_id)s and (created_at, id) < (%(before_created_at)s, %(before_id)s)" in sql
+    assert "offset" not in sql
+    assert sql.endswith("order by created_at desc, id desc limit %(limit)s;")
+    assert params["limit"] == 3
+
+
+class RowcountCursor(SqlRecordingCursor):
+    rowcount = 4
+
+    def fetchall(self) -> list:
+        raise AssertionError("deleted rows should not be fetched")
+
+
+def test_delete_threads_for_lecture_counts_with_rowcount(fake_pool):
+    db = db_module.Database(dsn="postgres://a")
+    statements: list[str] = []
+    db_module._pool_for(db.dsn).conn.cursor = lambda: RowcountCursor(statements)
+
+    assert db.delete_threads_for_lecture("lecture-1") == 4
+    assert "returning" not in statements[0]
+
+
+def test_dynamic_list_sql_is_built_once_per_filter_shape(fake_pool):
+    db = db_module.Database(dsn="postgres://a")
+    statements: list = []
+    db_module._pool_for(db.dsn).conn.cursor = lambda: PageCursor([[], [], []], statements)
+    db_module._select_sql.cache_clear()
+
+    db.fetch_lectures(course_id="c1", limit=5)
+    db.fetch_lectures(course_id="c2", limit=10)
+    db.fetch_lectures(status="ready")
+
+    info = db_module._select_sql.cache_info()
+    assert (info.hits, info.misses) == (1, 2)
+    assert statements[0][1] == {"course_id": "c1", "limit": 5}
+
+
+class CountingPool(FakePool):
+    def __init__(self, dsn: str, **kwargs) -> None:
+        super().__init__(dsn, **kwargs)
+        self.checkouts = 0
+        self.in_use = 0
+
+    @contextmanager
+    def connection(self):
+        self.checkouts += 1
+        self.in_use += 1
+        try:
+            yield self.conn
+        finally:
+            self.in_use -= 1
+
+
+def test_session_shares_one_checkout_across_queries(monkeypatch):
+    monkeypatch.setattr(db_module, "ConnectionPool", CountingPool)
+    monkeypatch.setattr(db_module, "_POOLS", {})
+    db = db_module.Database(dsn="postgres://a")
+    pool = db_module._pool_for(db.dsn)
+
+    with db.session():
+        assert pool.checkouts == 0
+        with db.connect() as first, db.connect() as second:
+            assert first is second is pool.conn
+        with db.session():
+            with db.connect():
+                pass
+    assert pool.checkouts == 1
+
+    with db.connect():
+        pass
+    assert pool.checkouts == 2
+
+
+def test_suspended_session_returns_the_connection_while_it_runs(monkeypatch):
+    monkeypatch.setattr(db_module, "ConnectionPool", CountingPool)
+    monkeypatch.setattr(db_module, "_POOLS", {})
+    db = db_module.Database(dsn="postgres://a")
+    pool = db_module._pool_for(db.dsn)
+
+    with db.session():
+        with db.connect():
+            pass
+        assert pool.in_use == 1
+        with db_module.suspended_session():
+            assert pool.in_use == 0
+            with db.connect():
+                assert pool.in_use == 1
+            assert pool.in_use == 0
+        with db.connect():
+            assert pool.in_use == 1
+        assert pool.in_use == 1
+    assert pool.in_use == 0
+    assert pool.checkouts == 3
+
+
+def test_request_session_is_a_noop_without_dsn(monkeypatch):
+    monkeypatch.delenv("DATABASE_URL", raising=False)
+
+    with db_module.request_session():
+        assert db_module._SESSION.get() is None
+
+
+class BulkCursor(ExecuteManyCursor):
+    def execute(self, sql: str, params=None) -> None:
+        self.calls.append((" ".join(sql.split()), params))
+
+
+def test_bulk_upsert_artifacts_batches_rows_into_one_statement(fake_pool, monkeypatch):
+    monkeypatch.setattr(db_module, "_BULK_UPSERT_ROWS", 2)
+    db = db_module.Database(dsn="postgres://a")
+    conn = db_module._pool_for(db.dsn).conn
+    calls: list = []
+    events: list[str] = []
+
+    @contextmanager
+    def transaction():
+        yield
+        events.append("commit")
+
+    conn.transaction = transaction
+    conn.cursor = lambda: BulkCursor(calls)
+    payload = {
+        "lecture_id": "l1",
+        "course_id": "c1",
+        "preset_id": "p1",
+        "storage_path": "s",
+        "summary_overview": None,
+        "summary_section_count": None,
+        "created_at": "now",
+    }
+    payloads = [
+        {**payload, "id": "a1", "artifact_type": "summary"},
+        {**payload, "id": "a2", "artifact_type": "outline"},
+        {**payload, "id": "a3", "artifact_type": "flashcards"},
+        {**payload, "id": "a1", "artifact_type": "summary", "storage_path": "newer"},
+    ]
+
+    db.bulk_upsert_artifacts(payloads)
+
+    assert len(calls) == 2
+    first_sql, first_params = calls[0]
+    assert first_sql.count("(%s, %s, %s, %s, %s, %s, %s, %s, %s)") == 2
+    assert "on conflict (id) do update set storage_path = excluded.storage_path" in first_sql
+    assert first_params[:6] == ["a1", "l1", "c1", "p1", "summary", "newer"]
+    assert len(calls[1][1]) == 9
+    assert events == ["commit"]
+
+
+def test_bulk_upsert_lectures_keeps_created_at_on_conflict(fake_pool):
+    db = db_module.Database(dsn="postgres://a")
+    conn = db_module._pool_for(db.dsn).conn
+    calls: list = []
+    conn.transaction = nullcontext
+    conn.cursor = lambda: BulkCursor(calls)
+    payload = {
+        "course_id": "c1", "preset_id": "p1", "title": "t", "status": "uploaded", "audio_path": None,
+        "transcript_path": None, "source_type": "audio", "created_at": "then", "updated_at": "now",
+    }
+
+    db.bulk_upsert_lectures([{**payload, "id": "l1"}, {**payload, "id": "l2"}, {**payload, "id": "l1", "title": "t2"}])
+    db.bulk_upsert_lectures([])
+
+    [(sql, params)] = calls
+    assert sql.count("(" + ", ".join(["%s"] * 10) + ")") == 2
+    assert "source_type = excluded.source_type, updated_at = excluded.updated_at;" in sql
+    assert "created_at = excluded" not in sql
+    assert params[:4] == ["l1", "c1", "p1", "t2"]
+
+
+def test_migration_files_are_read_once(monkeypatch):
+    db_module._migrations.cache_clear()
+    reads: list[str] = []
+    original_read_text = Path.read_text
+
+    def counting_read_text(self, *args, **kwargs):
+        reads.append(self.name)
+        return original_read_text(self, *args, **kwargs)
+
+    monkeypatch.setattr(Path, "read_text", counting_read_text)
+
+    first = db_module._migrations()
+    second = db_module._migrations()
+
+    assert first is second
+    assert first[0][0] == "001_init.sql"
+    assert len(reads) == len(first)
+
+
+class MigrationCursor:
+    def __init__(self, conn: "MigrationConnection") -> None:
+        self.conn = conn
+        self._rows: list = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        return None
+
+    def execute(self, sql: str, params=None, *, prepare=None) -> None:
+        threshold = self.conn.prepare_threshold
+        server_prepared = prepare or (prepare is None and threshold is not None and threshold == 0)
+        if server_prepared and sql.strip().rstrip(";").count(";"):
+            raise psycopg.errors.SyntaxError("cannot insert multiple commands into a prepared statement")
+        sql = " ".join(sql.split())
+        self.conn.log.append((sql, self.conn.in_transaction))
+        if sql.startswith("select id from schema_migrations"):
+            if self.conn.applied is None:
+                raise psycopg.errors.UndefinedTable("relation \"schema_migrations\" does not exist")
+            self._rows = [{"id": migration_id} for migration_id in self.conn.applied]
+        elif sql.startswith("create table if not exists schema_migrations"):
+            self.conn.applied = []
+        elif sql.startswith("insert into schema_migrations"):
+            self.conn.applied.append(params[0])
+
+    def fetchall(self) -> list:
+        return self._rows
+
+
+class MigrationConnection(FakeConnection):
+    def __init__(self, applied: list[str], prepare_threshold: int | None = None) -> None:
+        super().__init__()
+        self.applied = applied
+        self.prepare_threshold = prepare_threshold
+        self.log: list = []
+        self.in_transaction = False
+
+    @contextmanager
+    def transaction(self):
+        self.in_transaction = True
+        yield
+        self.in_transaction = False
+        self.log.append(("commit", False))
+
+    def cursor(self):
+        return MigrationCursor(self)
+
+
+def test_migrate_batches_pending_migrations_under_advisory_lock(fake_pool, monkeypatch):
+    migrations = (
+        ("001_a.sql", "create table a ();"),
+        ("002_b.sql", "create table b ();"),
+        ("003_c.sql", "create index concurrently c_idx on a (x);"),
+        ("004_d.sql", "create table d ();"),
+    )
+    monkeypatch.setattr(db_module, "_migrations", lambda: migrations)
+    db = db_module.Database(dsn="postgres://a")
+    db_module._pool_for(db.dsn).conn = conn = MigrationConnection(["001_a.sql"])
+
+    db.migrate()
+
+    assert conn.applied == ["001_a.sql", "002_b.sql", "003_c.sql", "004_d.sql"]
+    statements = [entry for entry in conn.log if not entry[0].startswith(("select id", "create table if not"))]
+    assert statements == [
+        ("select pg_advisory_lock(%s);", False),
+        ("create table b ();", True),
+        ("insert into schema_migrations (id) values (%s);", True),
+        ("commit", False),
+        ("create index concurrently c_idx on a (x);", False),
+        ("insert into schema_migrations (id) values (%s);", False),
+        ("create table d ();", True),
+        ("insert into schema_migrations (id) values (%s);", True),
+        ("commit", False),
+        ("select pg_advisory_unlock(%s);", False),
+    ]
+
+
+def test_multi_statement_migrations_are_not_server_prepared(fake_pool, monkeypatch):
+    migrations = (("001_a.sql", "create table a (x int);\ncreate index a_x_idx on a (x);\n"),)
+    monkeypatch.setattr(db_module, "_migrations", lambda: migrations)
+    db = db_module.Database(dsn="postgres://a")
+    pool = db_module._pool_for(db.dsn)
+    # The connection prepares the way the pool configures it (on first use by default).
+    pool.conn = conn = MigrationConnection([], pool.kwargs["kwargs"]["prepare_threshold"])
+    assert conn.prepare_threshold == 0
+
+    db.migrate()
+
+    assert conn.applied == ["001_a.sql"]
+
+
+def test_migrate_skips_lock_when_nothing_is_pending(fake_pool, monkeypatch):
+    monkeypatch.setattr(db_module, "_migrations", lambda: (("001_a.sql", "select 1;"),))
+    db = db_module.Database(dsn="postgres://a")
+    db_module._pool_for(db.dsn).conn = conn = MigrationConnection(["001_a.sql"])
+
+    db.migrate()
+
+    assert not any("advisory" in sql for sql, _ in conn.log)
+
+
+def test_migrate_creates_the_ledger_only_on_a_fresh_database(fake_pool, monkeypatch):
+    monkeypatch.setattr(db_module, "_migrations", lambda: (("001_a.sql", "select 1;"),))
+    db = db_module.Database(dsn="postgres://a")
+    db_module._pool_for(db.dsn).conn = conn = MigrationConnection(None)
+
+    db.migrate()
+    assert conn.applied == ["001_a.sql"]
+    assert any(sql.startswith("create table if not exists") for sql, _ in conn.log)
+
+    conn.log.clear()
+    db.migrate()
+    assert [sql for sql, _ in conn.log] == ["select id from schema_migrations order by id;"]
+
+
+def test_get_database_migrates_each_dsn_once(monkeypatch):
+    migrated: list[str] = []
+    monkeypatch.setattr(db_module, "_MIGRATED_DSNS", set())
+    monkeypatch.setattr(db_module.Database, "migrate", lambda self: migrated.append(self.dsn))
+    monkeypatch.setenv("DATABASE_URL", "postgres://a")
+
+    first = db_module.get_database()
+    second = db_module.get_database()
+    monkeypatch.setenv("DATABASE_URL", "postgres://b")
+    db_module.get_database()
+
+    assert first == second
+    assert migrated == ["postgres://a", "postgres://b"]
+
+
+def test_update_job_uses_one_statement_for_any_field_subset(fake_pool):
+    db = db_module.Database(dsn="postgres://a")
+    statements: list = []
+    db_module._pool_for(db.dsn).conn.cursor = lambda: PageCursor([], statements)
+
+    db.update_job("job-1", status="running")
+    db.update_job("job-1", error="boom", updated_at="2024-01-01T00:00:00Z")
+    db.update_job("job-1")
+
+    assert len(statements) == 2
+    assert statements[0][0] == statements[1][0]
+    assert statements[0][1] == {"id": "job-1", "status": "running", "result": None, "error": None, "updated_at": None}
+
+
+class ActivityCursor(SqlRecordingCursor):
+    def __iter__(self):
+        base = {"thread_id": "t1", "course_id": "c1", "lecture_id": "l1", "captured_at": "now", "lecture_title": "L1"}
+        yield {
+            **base, "kind": "occurrences", "id": "o1", "artifact_id": "a1", "evidence": "e", "confidence": 0.9,
+            "change_type": None, "summary": None, "details": None,
+        }
+        yield {
+            **base, "kind": "updates", "id": "u1", "artifact_id": None, "evidence": None, "confidence": None,
+            "change_type": "refinement", "summary": "s", "details": {"k": 1},
+        }
+
+
+def test_fetch_thread_activity_splits_one_result_by_kind(fake_pool):
+    db = db_module.Database(dsn="postgres://a")
+    statements: list[str] = []
+    db_module._pool_for(db.dsn).conn.cursor = lambda: ActivityCursor(statements)
+
+    activity = db.fetch_thread_activity("t1")
+
+    assert len(statements) == 1
+    assert "union all" in statements[0]
+    assert [row["id"] for row in activity["occurrences"]] == ["o1"]
+    assert "change_type" not in activity["occurrences"][0]
+    assert activity["updates"][0]["details"] == {"k": 1}
+    assert "evidence" not in activity["updates"][0]
+
+
+class FakeCopy:
+    def __init__(self, log: list) -> None:
+        self.log = log
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.log.append("end")
+
+    def set_types(self, types: list[str]) -> None:
+        self.log.append(("types", tuple(types)))
+
+    def write_row(self, row: tuple) -> None:
+        self.log.append(("row", row))
+
+
+class CopyCursor(SqlRecordingCursor):
+    def __init__(self, statements: list, log: list) -> None:
+        super().__init__(statements)
+        self.log = log
+
+    def copy(self, sql: str) -> FakeCopy:
+        self.statements.append(sql)
+        return FakeCopy(self.log)
+
+
+def test_credit_entries_are_written_with_one_binary_copy(fake_pool):
+    db = db_module.Database(dsn="postgres://a")
+    statements: list[str] = []
+    log: list = []
+    db_module._pool_for(db.dsn).conn.cursor = lambda: CopyCursor(statements, log)
+    entries = [
+        ("e1", "u1", "l1", "j1", "openai", "gpt", 10, 5, 15, 0.01),
+        ("e2", "u1", "l2", "j2", "openai", "gpt", 1, 1, 2, 0.001),
+    ]
+
+    assert db.insert_credit_entries_bulk(entries) == 2
+    db.insert_credit_entry("e3", "u2", "l3", "j3", "gemini", "flash", 3, 4, 7, 0.0)
+
+    assert statements[0] == statements[1]
+    assert statements[0].startswith("copy credit_ledger (") and statements[0].endswith("(format binary)")
+    assert log[0] == ("types", tuple(db_module._CREDIT_LEDGER_COPY_TYPES))
+    rows = [item[1] for item in log if isinstance(item, tuple) and item[0] == "row"]
+    assert [row[9] for row in rows] == [Decimal("0.01"), Decimal("0.001"), Decimal("0.0")]
+    assert [row[:9] for row in rows] == [entry[:9] for entry in entries] + [
+        ("e3", "u2", "l3", "j3", "gemini", "flash", 3, 4, 7)
+    ]
+    assert log.count("end") == 2
+
+
+class BalanceCursor(PageCursor):
+    def fetchone(self):
+        return self.results.pop(0) if self.results else None
+
+
+def test_grant_purchased_tokens_updates_and_logs_in_one_statement(fake_pool):
+    db = db_module.Database(dsn="postgres://a")
+    statements: list = []
+    results = [{"free_token_balance": 10, "purchased_token_balance": 500}]
+    db_module._pool_for(db.dsn).conn.cursor = lambda: BalanceCursor(results, statements)
+
+    balance = db.grant_purchased_tokens("user-1", 400, "purchase-1")
+
+    assert balance == {"freeBalance": 10, "purchasedBalance": 500, "totalBalance": 510}
+    assert len(statements) == 1
+    sql, params = statements[0]
+    assert sql.startswith("with updated as ( update users")
+    assert "insert into token_transactions" in sql
+    assert params["amount"] == 400 and params["transaction_type"] == "purchase"
+
+
+def test_refund_for_unknown_user_raises(fake_pool):
+    db = db_module.Database(dsn="postgres://a")
+    db_module._pool_for(db.dsn).conn.cursor = lambda: BalanceCursor([], [])
+
+    with pytest.raises(ValueError, match="not found"):
+        db.refund_reserved_tokens("ghost", 100, "job-1")
+
+
+def test_credits_summary_reads_per_model_rollup_and_sums_totals(fake_pool):
+    db = db_module.Database(dsn="postgres://a")
+    statements: list = []
+    rows = [
+        {"llm_model": "gpt", "prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15,
+         "cost_usd": 0.5, "generation_count": 2},
+        {"llm_model": "gemini", "prompt_tokens": 4, "completion_tokens": 1, "total_tokens": 5,
+         "cost_usd": 0.25, "generation_count": 1},
+    ]
+    db_module._pool_for(db.dsn).conn.cursor = lambda: PageCursor([rows], statements)
+
+    summary = db.fetch_user_credits_summary("user-1")
+
+    assert len(statements) == 1
+    assert "from credit_ledger_summary where user_id" in statements[0][0]
+    assert summary["totalTokens"] == 20 and summary["generationCount"] == 3
+    assert summary["totalCostUsd"] == 0.75
+    assert [model["model"] for model in summary["perModel"]] == ["gpt", "gemini"]
+    assert summary["perModel"][1]["count"] == 1
+
+def test_token_balance_is_cached_until_a_write_invalidates_it(fake_pool):
+    db = db_module.Database(dsn="postgres://a")
+    statements: list = []
+    results = [
+        {"free_token_balance": 10, "purchased_token_balance": 0, "free_tokens_reset_at": None},
+        {"free_token_balance": 10, "purchased_token_balance": 400},
+        {"free_token_balance": 10, "purchased_token_balance": 400, "free_tokens_reset_at": None},
+    ]
+    db_module._pool_for(db.dsn).conn.cursor = lambda: BalanceCursor(results, statements)
+
+    assert db.get_user_token_balance("user-1")["totalBalance"] == 10
+    assert db.get_user_token_balance("user-1")["totalBalance"] == 10
+    assert len(statements) == 1
+
+    db.grant_purchased_tokens("user-1", 400, "purchase-1")
+
+    assert db.get_user_token_balance("user-1")["totalBalance"] == 410
+    assert len(statements) == 3
+
+
+def test_user_cache_entries_expire_and_evict_oldest(monkeypatch):
+    cache = db_module._UserTTLCache(ttl_seconds=5, max_entries=2)
+    clock = [100.0]
+    monkeypatch.setattr(db_module.time, "monotonic", lambda: clock[0])
+
+    cache.put("dsn", "a", {"v": 1})
+    cache.put("dsn", "b", {"v": 2})
+    cache.put("dsn", "c", {"v": 3})
+    assert cache.get("dsn", "a") is None
+    assert cache.get("dsn", "b") == {"v": 2}
+
+    clock[0] = 105.0
+    assert cache.get("dsn", "c") is None
+
+def test_credits_summary_since_month_reads_monthly_rollup(fake_pool):
+    db = db_module.Database(dsn="postgres://a")
+    statements: list = []
+    rows = [{"llm_model": "gpt", "prompt_tokens": 3, "completion_tokens": 2, "total_tokens": 5,
+             "cost_usd": 0.1, "generation_count": 1}]
+    db_module._pool_for(db.dsn).conn.cursor = lambda: PageCursor([rows, list(rows)], statements)
+
+    summary = db.fetch_user_credits_summary("user-1", since_month=date(2026, 2, 1))
+    db.fetch_user_credits_summary("user-1", since_month=date(2026, 2, 1))
+    with pytest.raises(ValueError):
+        db.fetch_user_credits_summary("user-1", since_month=date(2026, 2, 15))
+
+    sql, params = statements[0]
+    assert "from credit_ledger_monthly_rollup" in sql
+    assert params["month"] == date(2026, 2, 1)
+    assert summary["totalTokens"] == 5
+    assert len(statements) == 2
+
+def test_reserve_tokens_guards_balance_in_the_update(fake_pool):
+    db = db_module.Database(dsn="postgres://a")
+    statements: list = []
+    results = [{"available": 150, "balance_after_free": 0, "balance_after_purchased": 30}]
+    db_module._pool_for(db.dsn).conn.cursor = lambda: BalanceCursor(results, statements)
+
+    result = db.check_and_reserve_tokens("user-1", 120)
+
+    assert result == {"ok": True, "reserved": 120, "balanceAfterFree": 0, "balanceAfterPurchased": 30}
+    assert len(statements) == 1
+    sql, params = statements[0]
+    assert sql.startswith("with updated as ( update users")
+    assert "free_token_balance + purchased_token_balance >= %(amount)s" in sql
+    assert "for update" not in sql and "insert into token_transactions" in sql
+    assert params["amount"] == 120
+
+
+def test_reserve_tokens_reports_insufficient_balance_and_unknown_user(fake_pool):
+    db = db_module.Database(dsn="postgres://a")
+    results = [{"available": 50, "balance_after_free": None, "balance_after_purchased": None}]
+    db_module._pool_for(db.dsn).conn.cursor = lambda: BalanceCursor(results, [])
+
+    assert db.check_and_reserve_tokens("user-1", 120) == {"ok": False, "available": 50, "required": 120}
+    assert db.check_and_reserve_tokens("ghost", 120) == {"ok": False, "error": "user_not_found"}
+
+
+def test_token_balance_applies_monthly_reset_in_one_statement(fake_pool):
+    db = db_module.Database(dsn="postgres://a")
+    statements: list = []
+    reset_at = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    results = [{"free_token_balance": 100000, "purchased_token_balance": 5, "free_tokens_reset_at": reset_at}]
+    db_module._pool_for(db.dsn).conn.cursor = lambda: BalanceCursor(results, statements)
+
+    balance = db.get_user_token_balance("user-1")
+
+    assert balance["totalBalance"] == 100005
+    assert balance["freeResetsAt"] == reset_at.isoformat()
+    assert len(statements) == 1
+    sql, params = statements[0]
+    assert "interval '30 days'" in sql and "insert into token_transactions" in sql
+    assert "for update" not in sql
+    assert params["allowance"] == db.FREE_MONTHLY_TOKENS
+
+
+class MetricsConnection:
+    def __init__(self, results: list, statements: list) -> None:
+        self.results = results
+        self.statements = statements
+
+    def cursor(self, row_factory=None, binary=False):
+        return PageCursor(self.results, self.statements)
+
+
+def _metrics_row(**overrides) -> dict:
+    row = {
+        "id": "m1", "lecture_id": "l1", "course_id": "c1",
+        "detected_at": datetime(2026, 1, 1, tzinfo=timezone.utc),
+        "new_threads_detected": 2, "existing_threads_updated": 1, "total_threads_after": 3,
+        "avg_complexity_level": 2.5, "complexity_distribution": {"2": 1, "3": 1},
+        "change_type_distribution": {"refinement": 1}, "avg_evidence_length": 40.0,
+        "threads_with_evidence": 2, "detection_method": "openai", "api_response_time_ms": 120.0,
+        "token_usage": {"input": 10, "output": 5}, "retry_count": 0, "model_name": "gpt",
+        "llm_provider": "openai", "success": True, "error_message": None, "quality_score": 80.0,
+        "created_at": datetime(2026, 1, 1, tzinfo=timezone.utc),
+    }
+    row.update(overrides)
+    return row
+
+
+def test_thread_metrics_jsonb_columns_round_trip_without_text_encoding():
+    statements: list = []
+    conn = StreamConnection([_metrics_row(), _metrics_row(id="m2", token_usage=None)], statements)
+
+    db_module.insert_thread_metrics(
+        conn, "m1", "l1", "c1", "2026-01-01T00:00:00Z", 2, 1, 3, 2.5, {"2": 1}, {"refinement": 1},
+        40.0, 2, "openai", 120.0, {"input": 10}, 0, "gpt", "openai", True, None, 80.0,
+    )
+    metrics = db_module.fetch_thread_metrics_by_lecture(conn, "l1")
+
+    params = statements[0][1]
+    assert isinstance(params["complexity_distribution"], db_module.Jsonb)
+    assert isinstance(params["token_usage"], db_module.Jsonb)
+    assert metrics[0]["complexityDistribution"] == {"2": 1, "3": 1}
+    assert metrics[0]["tokenUsage"] == {"input": 10, "output": 5}
+    assert metrics[0]["apiResponseTimeMs"] == 120.0
+    assert metrics[1]["tokenUsage"] is None
+    sql = statements[1][0]
+    assert "nullif(token_usage, '{}') AS token_usage" in sql
+    assert sql.endswith("ORDER BY thread_metrics.detected_at DESC")
+
+
+def test_camel_dict_row_keys_rows_by_camel_case_column():
+    cur = RowFactoryCursor([{"id": "f1", "course_id": "c1", "api_response_time_ms": 1.0}], [], db_module.camel_dict_row)
+
+    assert cur.fetchall() == [{"id": "f1", "courseId": "c1", "apiResponseTimeMs": 1.0}]
+
+    cur.description = None
+    assert db_module.camel_dict_row(cur) is db_module.no_result
+
+
+def test_deletion_audit_export_streams_from_a_named_cursor(fake_pool):
+    db = db_module.Database(dsn="postgres://a")
+    conn = db_module._pool_for(db.dsn).conn
+    statements: list = []
+    cursors: list = []
+
+    class NamedCursor(PageCursor):
+        def __iter__(self):
+            return iter(self.results)
+
+    def cursor(name=None):
+        cur = NamedCursor([{"id": "e1"}, {"id": "e2"}], statements)
+        cursors.append((name, cur))
+        return cur
+
+    conn.cursor = cursor
+    conn.transaction = lambda: nullcontext()
+
+    events = db.iter_deletion_audit_events(entity_type="lecture")
+    assert statements == []
+    assert [event["id"] for event in events] == ["e1", "e2"]
+
+    name, cur = cursors[0]
+    assert name == "deletion_audit_export"
+    assert cur.itersize == db_module._AUDIT_EXPORT_BATCH
+    sql, params = statements[0]
+    assert sql.endswith("where entity_type = %(entity_type)s order by created_at desc;")
+    assert params == {"entity_type": "lecture"}
+
+
+def test_purchase_receipt_lookup_skips_raw_receipt_data(fake_pool):
+    db = db_module.Database(dsn="postgres://a")
+    statements: list = []
+    db_module._pool_for(db.dsn).conn.cursor = lambda: BalanceCursor([{"tokens_granted": 500}], statements)
+
+    assert db.fetch_purchase_receipt_by_txn_id("txn-1") == {"tokens_granted": 500}
+
+    sql, params = statements[0]
+    assert "receipt_data" not in sql and "*" not in sql
+    assert params == ("txn-1",)
+
+
+def test_deletion_audit_queries_reuse_cached_sql_per_filter_shape(fake_pool):
+    db = db_module.Database(dsn="postgres://a")
+    statements: list = []
+    results = [[], [], {"total": 0}]
+    db_module._pool_for(db.dsn).conn.cursor = lambda: PageCursor(results, statements)
+
+    db.fetch_deletion_audit_events(entity_id="l1", limit=10, offset=0)
+    db.fetch_deletion_audit_events(entity_id="l2", limit=10, offset=20)
+    db.count_deletion_audit_events(entity_id="l1")
+
+    assert statements[0][0] == statements[1][0]
+    assert statements[0][0] == (
+        f"select {db_module.DELETION_AUDIT_COLUMNS} from deletion_audit_events "
+        "where entity_id = %(entity_id)s order by created_at desc limit %(limit)s offset %(offset)s;"
+    )
+    assert statements[1][1] == {"entity_id": "l2", "limit": 10, "offset": 20}
+    assert statements[2][0] == "select count(*) as total from deletion_audit_events where entity_id = %(entity_id)s;"
+
+
+def test_pool_connections_read_numeric_money_columns_as_float(fake_pool):
+    db_module._pool_for("postgres://a")
+    configure = fake_pool.created[0].kwargs["configure"]
+
+    class Conn:
+        adapters = psycopg.adapt.AdaptersMap(psycopg.adapters)
+
+    configure(Conn)
+    numeric_oid = psycopg.adapters.types["numeric"].oid
+    loader = Conn.adapters.get_loader(numeric_oid, psycopg.pq.Format.TEXT)
+    assert loader(numeric_oid).load(b"12.500000") == 12.5
+
+
+def test_pool_connections_use_orjson_for_jsonb_when_installed(fake_pool):
+    orjson = pytest.importorskip("orjson")
+    db_module._pool_for("postgres://a")
+    configure = fake_pool.created[0].kwargs["configure"]
+
+    class Conn:
+        adapters = psycopg.adapt.AdaptersMap(psycopg.adapters)
+
+    configure(Conn)
+    jsonb_oid = psycopg.adapters.types["jsonb"].oid
+    loader = Conn.adapters.get_loader(jsonb_oid, psycopg.pq.Format.TEXT)(jsonb_oid)
+    assert loader.loads is orjson.loads
+    assert loader.load(b'{"a": [1, 2.5]}') == {"a": [1, 2.5]}
+
+    dumper = Conn.adapters.get_dumper(db_module.Jsonb, psycopg.adapt.PyFormat.TEXT)(db_module.Jsonb)
+    assert dumper.dumps is db_module._orjson_dumps
+    assert bytes(dumper.dump(db_module.Jsonb({1: 2, "k": [0.5]}))) == b'{"1":2,"k":[0.5]}'
+
+
+def test_ensure_ledger_partitions_extends_each_partitioned_ledger(fake_pool):
+    db = db_module.Database(dsn="postgres://a")
+    statements: list = []
+    db_module._pool_for(db.dsn).conn.cursor = lambda: PageCursor([], statements)
+
+    db.ensure_ledger_partitions(months_ahead=3)
+
+    assert [params for _sql, params in statements] == [
+        {"ledger": "credit_ledger", "months_ahead": 3},
+        {"ledger": "token_transactions", "months_ahead": 3},
+    ]
+    assert statements[0][0].startswith("select ensure_monthly_partitions(")
+
+
+def test_insert_purchase_receipt_reports_duplicate_transactions(fake_pool):
+    db = db_module.Database(dsn="postgres://a")
+    statements: list = []
+    results = [{"id": "r1"}]
+    db_module._pool_for(db.dsn).conn.cursor = lambda: BalanceCursor(results, statements)
+    receipt = dict(user_id="u1", platform="apple", product_id="p", transaction_id="txn-1",
+                   receipt_data="blob", tokens_granted=500, price_usd=4.99)
+
+    assert db.insert_purchase_receipt(receipt_id="r1", **receipt) is True
+    assert db.insert_purchase_receipt(receipt_id="r2", **receipt) is False
+    assert statements[0][0].endswith("ON CONFLICT (transaction_id) DO NOTHING RETURNING id;")
+
+
+class PipelineConnection(MetricsConnection):
+    @contextmanager
+    def pipeline(self):
+        self.statements.append(("pipeline", None))
+        yield
+        self.statements.append(("sync", None))
+
+
+def _context_rows(count: int) -> list[dict]:
+    return [
+        dict(file_id=f"f{i}", course_id="c1", filename=f"{i}.md", file_path=f"/ctx/{i}.md",
+             file_size=10, file_type=".md", tag="NOTES", extracted_text="text", created_at="2026-01-01")
+        for i in range(count)
+    ]
+
+
+def test_context_file_writes_can_run_inside_a_pipeline():
+    statements: list = []
+    conn = PipelineConnection([], statements)
+
+    db_module.delete_context_file(conn, "f0", pipeline=True)
+    db_module.delete_context_file(conn, "f1")
+
+    assert [sql for sql, _params in statements] == [
+        "pipeline",
+        "DELETE FROM context_files WHERE id = %(file_id)s",
+        "sync",
+        "DELETE FROM context_files WHERE id = %(file_id)s",
+    ]
+
+
+def test_bulk_context_files_use_executemany_then_copy_for_large_loads(monkeypatch):
+    calls: list = []
+    statements: list = []
+    log: list = []
+    conn = MetricsConnection([], [])
+    conn.cursor = lambda: ExecuteManyCursor(calls)
+
+    assert db_module.bulk_insert_context_files(conn, _context_rows(3)) == 3
+    assert db_module.bulk_insert_context_files(conn, []) == 0
+    assert calls[0][0] == db_module._INSERT_CONTEXT_FILE_SQL
+    assert [row["id"] for row in calls[0][1]] == ["f0", "f1", "f2"]
+    assert calls[0][1][0]["updated_at"] == "2026-01-01"
+
+    monkeypatch.setattr(db_module, "_CONTEXT_FILE_COPY_ROWS", 2)
+    conn.cursor = lambda: CopyCursor(statements, log)
+    assert db_module.bulk_insert_context_files(conn, _context_rows(2)) == 2
+
+    assert statements == [db_module._CONTEXT_FILE_COPY_SQL]
+    assert log[0] == ("row", ["f0", "c1", "0.md", "/ctx/0.md", 10, ".md", "NOTES", "text", "2026-01-01", "2026-01-01"])
+    assert log[-1] == "end"
+
+
+def test_deletion_audit_events_are_batched(fake_pool, monkeypatch):
+    db = db_module.Database(dsn="postgres://a")
+    calls: list = []
+    statements: list = []
+    log: list = []
+    conn = db_module._pool_for(db.dsn).conn
+    conn.cursor = lambda: ExecuteManyCursor(calls)
+    events = [
+        {"id": f"e{i}", "entity_type": "lecture", "entity_id": f"l{i}", "actor": None,
+         "request_id": None, "purge_storage": True, "result": None, "created_at": "2026-01-01"}
+        for i in range(2)
+    ]
+
+    assert db.create_deletion_audit_events(events) == 2
+    assert db.create_deletion_audit_events([]) == 0
+    assert calls[0][0] == db_module._INSERT_DELETION_AUDIT_SQL
+    assert calls[0][1][0]["result"].obj == {}
+
+    monkeypatch.setattr(db_module, "_AUDIT_COPY_ROWS", 2)
+    conn.cursor = lambda: CopyCursor(statements, log)
+    assert db.create_deletion_audit_events(events) == 2
+    assert statements == [db_module._DELETION_AUDIT_COPY_SQL]
+    assert log[1][1][:3] == ["e1", "lecture", "l1"]
+
+
+def test_dice_rotation_states_are_upserted_with_one_multi_row_statement(monkeypatch):
+    monkeypatch.setattr(db_module, "_BULK_UPSERT_ROWS", 2)
+    calls: list = []
+    conn = StreamConnection([], [])
+    conn.cursor = lambda: BulkCursor(calls)
+    states = [
+        {"id": "r1", "lectureId": "l1", "courseId": "c1", "scores": {"RED": 0.9}},
+        {"id": "r2", "lectureId": "l2", "courseId": "c1", "scores": {"BLUE": 0.4}},
+        {"id": "r3", "lectureId": "l3", "courseId": "c1"},
+        {"id": "r1", "lectureId": "l1", "courseId": "c1", "scores": {"GREEN": 0.8}},
+    ]
+
+    assert db_module.upsert_dice_rotation_states_many(conn, states) == 3
+    assert db_module.upsert_dice_rotation_states_many(conn, []) == 0
+
+    assert conn.statements == [("begin", None)]
+    assert len(calls) == 2
+    sql, params = calls[0]
+    width = len(db_module._DICE_ROTATION_COLUMNS)
+    assert sql.count("(" + ", ".join(["%s"] * width) + ")") == 2
+    assert "updated_at = excluded.updated_at" in sql and "max_iterations = excluded" not in sql
+    first = dict(zip(db_module._DICE_ROTATION_COLUMNS, params[:width]))
+    assert (first["id"], first["score_where"]) == ("r1", 0.8)
+    assert "dominant_facet" not in sql
+    assert len(calls[1][1]) == width
+
+
+class Column:
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+
+class RowFactoryCursor(PageCursor):
+    """Serves the same snake_case rows on every read, through camel_dict_row when asked."""
+
+    def __init__(self, rows: list, statements: list, row_factory=None) -> None:
+        super().__init__([], statements)
+        self.rows = rows
+        self.row_factory = row_factory
+
+    def __iter__(self):
+        if self.row_factory is not db_module.camel_dict_row or not self.rows:
+            return iter(self.rows)
+        self.description = [Column(name) for name in self.rows[0]]
+        make_row = self.row_factory(self)
+        return (make_row(tuple(row.values())) for row in self.rows)
+
+    def fetchall(self) -> list:
+        return list(self)
+
+    def fetchone(self):
+        return next(iter(self), None)
+
+
+class StreamConnection:
+    def __init__(self, rows: list, statements: list) -> None:
+        self.rows = rows
+        self.statements = statements
+        self.cursors: list = []
+
+    def transaction(self):
+        self.statements.append(("begin", None))
+        return nullcontext()
+
+    def cursor(self, name=None, row_factory=None, binary=False):
+        cur = RowFactoryCursor(self.rows, self.statements, row_factory)
+        cur.binary = binary
+        self.cursors.append((name, cur))
+        return cur
+
+
+def test_context_files_and_rotation_states_stream_from_named_cursors():
+    file_row = {
+        "id": "f1", "course_id": "c1", "filename": "a.md", "file_path": "/a.md", "file_size": 1,
+        "file_type": ".md", "tag": "NOTES", "created_at": "2026-01-01T00:00:00.000000+00:00",
+        "updated_at": None,
+    }
+    statements: list = []
+    conn = StreamConnection([file_row], statements)
+
+    files = db_module.iter_context_files(conn, course_id="c1", itersize=50)
+    assert statements == []
+    assert [f["createdAt"] for f in files] == ["2026-01-01T00:00:00.000000+00:00"]
+    assert statements[0] == ("begin", None)
+    name, cur = conn.cursors[0]
+    assert name == "ctx_files_stream" and cur.itersize == 50
+    sql, params = statements[1]
+    assert params == {"course_id": "c1"}
+    assert "to_char(created_at at time zone 'UTC'" in sql
+    assert sql.endswith("where course_id = %(course_id)s order by context_files.created_at desc;")
+
+    assert db_module.fetch_context_files(conn, tag="NOTES")[0]["filePath"] == "/a.md"
+    assert conn.cursors[1][0] is None
+
+    rotation_row = {
+        "id": "r1", "lecture_id": "l1", "course_id": "c1", "iterations_completed": 2,
+        "max_iterations": 6, "status": "equilibrium", "score_how": 0.1, "score_what": 0.2,
+        "score_when": 0.3, "score_where": 0.4, "score_who": 0.5, "score_why": 0.6, "entropy": 1.2,
+        "equilibrium_gap": 0.1, "collapsed": False, "dominant_facet": "why", "dominant_score": 0.6,
+        "created_at": None, "updated_at": None,
+    }
+    conn = StreamConnection([rotation_row], [])
+    states = list(db_module.iter_dice_rotation_states_by_course(conn, "c1"))
+    assert states == db_module.fetch_dice_rotation_states_by_course(conn, "c1")
+    assert states[0]["scores"]["PURPLE"] == 0.6
+    assert conn.cursors[0][0] == "dice_states_stream"
+    assert conn.cursors[0][1].itersize == db_module._STREAM_BATCH
+    # real columns read in binary come back widened (0.9 -> 0.8999999761581421).
+    assert not conn.cursors[0][1].binary and not conn.cursors[1][1].binary
+
+
+def test_thread_metrics_summary_uses_filter_aggregates():
+    statements: list = []
+    row = {
+        "total_detections": 4, "avg_new_threads": 1.5, "avg_updates": 0.0, "avg_quality_score": 70.0,
+        "avg_response_time_ms": 110.0, "successful_detections": 3, "methods_used": 2,
+        "openai_avg_quality": 80.0, "fallback_avg_quality": 0.0,
+    }
+    conn = StreamConnection([row], statements)
+
+    summary = db_module.fetch_thread_metrics_summary(conn, "c1")
+
+    sql, params = statements[0]
+    assert "COUNT(*) FILTER (WHERE success)" in sql
+    assert "(AVG(quality_score) FILTER (WHERE detection_method = 'openai'))::float8" in sql
+    assert "CASE" not in sql
+    assert params == {"course_id": "c1"}
+    assert summary["successRate"] == 75.0
+    assert summary["avgUpdates"] == 0.0
+    assert summary["fallbackAvgQuality"] == 0.0
+    assert summary["avgResponseTimeMs"] == 110.0
+
+    empty = dict(row, total_detections=0, successful_detections=0, openai_avg_quality=None)
+    all_statements: list = []
+    summary = db_module.fetch_thread_metrics_summary(StreamConnection([empty], all_statements))
+    assert all_statements == [(sql, {"course_id": None})]
+    assert summary["successRate"] == 0
+    assert summary["openaiAvgQuality"] is None
+
+
+def test_context_text_is_bucketed_by_tag_in_one_row():
+    statements: list = []
+    conn = MetricsConnection([{"syllabus": "=== s.md ===\nplan", "notes": None}], statements)
+
+    assert db_module.fetch_context_text_for_course(conn, "c1") == {
+        "syllabus": "=== s.md ===\nplan",
+        "notes": None,
+    }
+    sql, params = statements[0]
+    assert params == {"course_id": "c1"}
+    assert "FILTER (WHERE tag = 'SYLLABUS') AS syllabus" in sql
+    assert "GROUP BY" not in sql
+
+
+def test_single_row_context_and_rotation_lookups_reuse_module_sql():
+    statements: list = []
+    conn = MetricsConnection([None, None, None], statements)
+
+    assert db_module.fetch_context_file_by_id(conn, "f1") is None
+    assert db_module.fetch_context_file_by_id(conn, "f2") is None
+    assert db_module.fetch_dice_rotation_state_by_lecture(conn, "l1") is None
+
+    assert statements[0][0] == statements[1][0] == " ".join(db_module._FETCH_CONTEXT_FILE_SQL.split())
+    assert statements[2] == (" ".join(db_module._FETCH_DICE_ROTATION_STATE_SQL.split()), {"lecture_id": "l1"})
+
+
+def test_dominant_facet_is_left_to_the_generated_columns():
+    statements: list = []
+    conn = MetricsConnection([], statements)
+
+    db_module.upsert_dice_rotation_state(
+        conn, {"id": "r1", "scores": {"RED": 0.1, "GREEN": 0.7, "PURPLE": 0.2}}
+    )
+
+    sql, params = statements[0]
+    assert "dominant_facet" not in params and "dominant_facet" not in sql
+    assert params["score_where"] == 0.7
+
+
+def test_generated_dominant_facet_keeps_first_facet_for_ties_and_all_zero_scores():
+    migration = (ROOT / "backend" / "migrations" / "022_dice_dominant_facet_generated.sql").read_text()
+    body = migration.split("$$")[1]
+
+    # Like the Python it replaced: a fresh rotation (all scores 0.0) reads ("how", 0.0).
+    assert "null" not in body.lower()
+    branches = [line.split("then")[1].strip() for line in body.splitlines() if " then " in line]
+    assert branches == ["'how'", "'what'", "'when'", "'where'", "'who'"]
+    assert "else 'why'" in body
+    assert "add column dominant_score real generated always as" in migration
+
+
+def test_context_file_listing_sql_is_cached_per_filter_shape():
+    statements: list = []
+    conn = StreamConnection([], statements)
+
+    db_module.fetch_context_files(conn, course_id="c1")
+    db_module.fetch_context_files(conn, course_id="c2")
+    db_module.fetch_context_files(conn, course_id="c1", tag="NOTES")
+    db_module.fetch_context_files(conn)
+
+    assert statements[0][0] == statements[1][0]
+    assert [params for _sql, params in statements] == [
+        {"course_id": "c1"}, {"course_id": "c2"}, {"course_id": "c1", "tag": "NOTES"}, {},
+    ]
+    assert " where " not in statements[3][0]
+
+
+def test_course_thread_metrics_list_skips_heavy_columns_until_detail():
+    statements: list = []
+    conn = StreamConnection([_metrics_row()], statements)
+
+    db_module.fetch_thread_metrics_list(conn, "c1", limit=20)
+    detail = db_module.fetch_thread_metric_detail(conn, "m1")
+
+    list_sql, list_params = statements[0]
+    assert list_params == {"course_id": "c1", "limit": 20}
+    for heavy in ("complexity_distribution", "change_type_distribution", "token_usage", "model_name"):
+        assert heavy not in list_sql
+    assert statements[1][1] == {"id": "m1"}
+    assert detail["tokenUsage"] == {"input": 10, "output": 5}
+    assert all(cur.binary for _name, cur in conn.cursors)
+
+
+def test_rotation_state_by_lecture_unpacks_a_tuple_row():
+    row = ("r1", "l1", "c1", 3, 6, "equilibrium", 0.1, 0.2, 0.3, 0.9, 0.5, 0.6,
+           1.7, 0.1, False, "where", 0.9, {"k": 1}, "2026-01-01T00:00:00.000000+00:00", None)
+    factories: list = []
+    conn = MetricsConnection([row], [])
+    conn.cursor = lambda row_factory=None: factories.append(row_factory) or PageCursor(conn.results, [])
+
+    state = db_module.fetch_dice_rotation_state_by_lecture(conn, "l1")
+
+    assert factories == [db_module.tuple_row]
+    assert state["scores"] == {"RED": 0.1, "ORANGE": 0.2, "YELLOW": 0.3, "GREEN": 0.9, "BLUE": 0.5, "PURPLE": 0.6}
+    assert (state["dominantFacet"], state["fullState"], state["updatedAt"]) == ("where", {"k": 1}, None)
+
+
+class FakeAsyncCursor:
+    def __init__(self, statements: list, rows: list) -> None:
+        self.statements = statements
+        self.rows = rows
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        return None
+
+    async def execute(self, sql, params=None) -> None:
+        self.statements.append((sql, params))
+
+    async def fetchall(self):
+        return list(self.rows)
+
+    async def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+
+class FakeAsyncPool:
+    created: list["FakeAsyncPool"] = []
+
+    def __init__(self, dsn: str, **kwargs) -> None:
+        self.dsn = dsn
+        self.kwargs = kwargs
+        self.opened = 0
+        self.closed = False
+        self.statements: list = []
+        self.rows: list = []
+        FakeAsyncPool.created.append(self)
+
+    async def open(self) -> None:
+        self.opened += 1
+
+    async def close(self) -> None:
+        self.closed = True
+
+    def connection(self):
+        pool = self
+
+        class _Connection:
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *exc) -> None:
+                return None
+
+            def cursor(self):
+                return FakeAsyncCursor(pool.statements, pool.rows)
+
+        return _Connection()
+
+
+def test_async_database_reuses_the_sync_statements_on_one_lazy_pool(monkeypatch):
+    import asyncio
+
+    FakeAsyncPool.created = []
+    monkeypatch.setattr(db_module, "AsyncConnectionPool", FakeAsyncPool)
+    monkeypatch.setattr(db_module, "_ASYNC_POOLS", {})
+    db = db_module.AsyncDatabase(dsn="postgres://a")
+
+    async def scenario():
+        lectures = await db.fetch_lectures(course_id="c1", limit=10)
+        FakeAsyncPool.created[0].rows = [{"total": 3}]
+        total = await db.count_lectures(course_id="c1")
+        await db.fetch_lecture("l1")
+        return lectures, total
+
+    lectures, total = asyncio.run(scenario())
+
+    assert (lectures, total) == ([], 3)
+    [pool] = FakeAsyncPool.created
+    assert pool.opened == 1
+    assert pool.kwargs["open"] is False and pool.kwargs["kwargs"]["autocommit"] is True
+    assert pool.statements == [
+        (
+            db_module._select_sql(
+                "lectures", db_module.LECTURE_COLUMNS, ("course_id",), db_module._RECENT_FIRST, has_limit=True
+            ),
+            {"course_id": "c1", "limit": 10},
+        ),
+        (db_module._count_sql("lectures", ("course_id",)), {"course_id": "c1"}),
+        (db_module._FETCH_LECTURE_SQL, ("l1",)),
+    ]
+
+    asyncio.run(db_module.close_async_pools())
+    assert pool.closed and db_module._ASYNC_POOLS == {}
+
+
+def test_async_lecture_pages_strip_the_window_total_and_seek_one_extra_row(monkeypatch):
+    import asyncio
+
+    FakeAsyncPool.created = []
+    monkeypatch.setattr(db_module, "AsyncConnectionPool", FakeAsyncPool)
+    monkeypatch.setattr(db_module, "_ASYNC_POOLS", {})
+    db = db_module.AsyncDatabase(dsn="postgres://a")
+    before = (datetime(2024, 1, 2, tzinfo=timezone.utc), "l9")
+
+    async def scenario():
+        pool = await db_module._async_pool_for(db.dsn)
+        pool.rows = [{"id": "l2", "_total": 5}, {"id": "l1", "_total": 5}]
+        page = await db.fetch_lectures_page(status="ready", limit=2, offset=0)
+        pool.rows = [{"id": "l3"}, {"id": "l2"}, {"id": "l1"}]
+        seek = await db.fetch_lectures_before(before, course_id="c1", limit=2)
+        return page, seek
+
+    page, seek = asyncio.run(scenario())
+
+    assert page == ([{"id": "l2"}, {"id": "l1"}], 5)
+    assert seek == ([{"id": "l3"}, {"id": "l2"}], True)
+    [pool] = FakeAsyncPool.created
+    assert pool.statements[1] == (
+        db_module._select_sql(
+            "lectures", db_module.LECTURE_COLUMNS, ("course_id",), db_module._RECENT_FIRST, has_limit=True, seek=True
+        ),
+        {"course_id": "c1", "before_created_at": before[0], "before_id": "l9", "limit": 3},
+    )
+    asyncio.run(db_module.close_async_pools())
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import asyncio
+import json
 from pathlib import Path
 import sys
 from typing import Optional
@@ -106,6 +108,13 @@ class FakeDB:
             rows = rows[:limit]
         return rows
 
+    def iter_deletion_audit_events(
+        self,
+        entity_type: Optional[str] = None,
+        entity_id: Optional[str] = None,
+    ):
+        return iter(self.fetch_deletion_audit_events(entity_type=entity_type, entity_id=entity_id))
+
     def count_deletion_audit_events(
         self,
         entity_type: Optional[str] = None,
@@ -221,6 +230,34 @@ def test_delete_course_removes_course_and_all_lectures(monkeypatch, tmp_path):
     assert fake_db.deletion_audit_events[-1]["entity_type"] == "course"
 
 
+def test_delete_course_audits_its_lectures_in_one_batch(monkeypatch, tmp_path):
+    class BatchAuditDB(FakeDB):
+        def __init__(self) -> None:
+            super().__init__()
+            self.audit_batches: list[list[dict]] = []
+
+        def create_deletion_audit_events(self, payloads: list[dict]) -> int:
+            self.audit_batches.append(payloads)
+            self.deletion_audit_events.extend(payloads)
+            return len(payloads)
+
+    fake_db = BatchAuditDB()
+    fake_db.courses["course-1"] = {"id": "course-1", "title": "Course"}
+    for lecture_id in ("lecture-1", "lecture-2"):
+        fake_db.lectures[lecture_id] = {"id": lecture_id, "course_id": "course-1", "audio_path": None}
+
+    monkeypatch.setattr(app_module, "get_database", lambda: fake_db)
+    monkeypatch.setattr(app_module, "STORAGE_DIR", tmp_path)
+    monkeypatch.setattr(app_module, "delete_storage_path", lambda _path: True)
+
+    payload = app_module.delete_course("course-1", _request(), purge_storage=True)
+
+    [batch] = fake_db.audit_batches
+    assert [event["entity_id"] for event in batch] == ["lecture-1", "lecture-2"]
+    assert [lecture["auditEventId"] for lecture in payload["lectureDeletions"]] == [event["id"] for event in batch]
+    assert fake_db.deletion_audit_events[-1]["entity_type"] == "course"
+
+
 def test_list_deletion_audit_events_filters_by_entity(monkeypatch):
     fake_db = FakeDB()
     fake_db.deletion_audit_events = [
@@ -261,6 +298,25 @@ def test_list_deletion_audit_events_rejects_unknown_entity_type(monkeypatch):
         raise AssertionError("Expected HTTPException for invalid entity_type")
 
 
+def test_export_deletion_audit_events_streams_ndjson(monkeypatch):
+    fake_db = FakeDB()
+    fake_db.deletion_audit_events = [
+        {"id": "e1", "entity_type": "lecture", "entity_id": "l1", "created_at": "2026-01-01T00:00:00Z"},
+        {"id": "e2", "entity_type": "course", "entity_id": "c1", "created_at": "2026-01-01T00:00:01Z"},
+        {"id": "e3", "entity_type": "lecture", "entity_id": "l2", "created_at": "2026-01-01T00:00:02Z"},
+    ]
+    monkeypatch.setattr(app_module, "get_database", lambda: fake_db)
+
+    response = app_module.export_deletion_audit_events(_request(), entity_type="lecture", entity_id=None)
+
+    async def body() -> str:
+        return "".join([chunk async for chunk in response.body_iterator])
+
+    lines = asyncio.run(body()).splitlines()
+    assert response.media_type == "application/x-ndjson"
+    assert [json.loads(line)["id"] for line in lines] == ["e1", "e3"]
+
+
 def test_deletion_audit_summary_strips_runtime_fields():
     lecture_result = {
         "lectureId": "l-1",
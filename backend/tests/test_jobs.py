@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+from contextlib import contextmanager
 import json
 import pytest
 import sys
@@ -155,6 +156,10 @@ def test_transcription_provider_defaults_to_openai_when_blank(monkeypatch, tmp_p
     job = fake_db.jobs["job-default"]
     assert job["status"] == "completed"
 
+    written = (storage_dir / "transcripts" / "lecture-default.json").read_text(encoding="utf-8")
+    assert "\n" not in written
+    assert json.loads(written)["segments"][0]["text"] == "openai transcript"
+
 def test_enqueue_job_runs_inline_when_configured(monkeypatch):
     fake_db = FakeDB()
     monkeypatch.setattr(jobs_module, "get_database", lambda: fake_db)
@@ -287,6 +292,74 @@ def test_generation_job_passes_existing_thread_refs_to_pipeline(monkeypatch, tmp
     assert result["lectureId"] == "lecture-xyz"
 
 
+def test_generation_job_saves_metrics_and_rotation_state_on_a_pooled_connection(monkeypatch, tmp_path):
+    import backend.db as db_module
+    import pipeline.thread_engine as thread_engine
+
+    storage_dir = tmp_path / "storage"
+    (storage_dir / "transcripts").mkdir(parents=True, exist_ok=True)
+    (storage_dir / "transcripts" / "lecture-xyz.json").write_text(
+        json.dumps({"text": "Transcript text."}), encoding="utf-8"
+    )
+    conn = object()
+    saved: list[tuple] = []
+
+    class FakeGenerationDB:
+        def update_job(self, job_id: str, status=None, result=None, error=None, updated_at=None):
+            return None
+
+        def fetch_threads_for_course(self, _course_id: str):
+            return []
+
+        def upsert_course(self, payload: dict) -> None:
+            return None
+
+        def upsert_artifact(self, payload: dict) -> None:
+            return None
+
+        @contextmanager
+        def connect(self):
+            yield conn
+
+    def fake_run_pipeline(transcript_text, context, output_dir, **_kwargs):
+        lecture_dir = output_dir / context.lecture_id
+        lecture_dir.mkdir(parents=True, exist_ok=True)
+        (lecture_dir / "rotation-state.json").write_text(
+            json.dumps({"scores": {"RED": 0.4}, "equilibriumGap": 0.1}), encoding="utf-8"
+        )
+
+    metrics = types.SimpleNamespace(
+        lecture_id="lecture-xyz", course_id="course-123", timestamp="2026-01-01T00:00:00Z",
+        new_threads_detected=1, existing_threads_updated=0, total_threads_after=1,
+        avg_complexity_level=2.0, complexity_distribution={}, change_type_distribution={},
+        avg_evidence_length=10.0, threads_with_evidence=1, detection_method="openai",
+        api_response_time_ms=5.0, token_usage=None, retry_count=0, model_name="gpt",
+        llm_provider="openai", success=True, error_message=None,
+    )
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("PLC_STORAGE_DIR", str(storage_dir))
+    monkeypatch.setattr(jobs_module, "get_database", lambda: FakeGenerationDB())
+    monkeypatch.setattr(jobs_module, "run_pipeline", fake_run_pipeline)
+    monkeypatch.setattr(thread_engine, "get_last_metrics", lambda: (metrics, 80.0))
+    monkeypatch.setattr(
+        db_module, "insert_thread_metrics", lambda c, **kwargs: saved.append(("metrics", c, kwargs["quality_score"]))
+    )
+    monkeypatch.setattr(
+        db_module, "upsert_dice_rotation_state", lambda c, state: saved.append(("rotation", c, state["status"]))
+    )
+
+    jobs_module.run_generation_job(
+        "job-5",
+        lecture_id="lecture-xyz",
+        course_id="course-123",
+        preset_id="exam-mode",
+        llm_provider="openai",
+        llm_model="gpt-4o-mini",
+    )
+
+    assert saved == [("metrics", conn, 80.0), ("rotation", conn, "equilibrium")]
+
+
 def test_resolve_thread_refs_deduplicates_and_normalizes_ids():
     class FakeThreadDB:
         def fetch_threads_for_course(self, _course_id: str):
@@ -433,3 +506,14 @@ def test_assert_minimum_artifact_quality_fails_for_empty_summary_overview():
         jobs_module._assert_minimum_artifact_quality(FakeExportDB(), "lecture-1")
 
 
+def test_normalize_segments_handles_dicts_and_objects():
+    dict_segments = [{"start": 0, "end": "1.5", "text": "  hello "}]
+    object_segments = [types.SimpleNamespace(start=1.5, end=3, text="world\n")]
+
+    assert jobs_module._normalize_segments(dict_segments) == [
+        {"startSec": 0.0, "endSec": 1.5, "text": "hello"}
+    ]
+    assert jobs_module._normalize_segments(object_segments) == [
+        {"startSec": 1.5, "endSec": 3.0, "text": "world"}
+    ]
+    assert jobs_module._normalize_segments(None) == []
@@ -3,6 +3,9 @@ from __future__ import annotations
 from pathlib import Path
 import sys
 
+from fastapi import HTTPException
+import pytest
+
 ROOT = Path(__file__).resolve().parents[2]
 sys.path.append(str(ROOT))
 
@@ -21,6 +24,15 @@ class EmptyDB:
     pass
 
 
+class SeekDB:
+    def __init__(self) -> None:
+        self.calls: list[tuple] = []
+
+    def fetch_items_before(self, course_id, before, limit=None):
+        self.calls.append((course_id, before, limit))
+        return [{"id": "item-3", "created_at": "2024-01-01T00:00:00+00:00"}], True
+
+
 def test_pagination_payload_includes_navigation_offsets() -> None:
     payload = app_module._pagination_payload(limit=5, offset=10, count=5, total=23)
 
@@ -101,3 +113,43 @@ def test_pagination_payload_handles_empty_page_with_offset() -> None:
         "nextOffset": None,
         "prevOffset": 5,
     }
+
+
+def test_cursor_round_trips_created_at_and_id() -> None:
+    cursor = app_module._encode_cursor({"id": "lecture-9", "created_at": "2024-01-03T00:00:00Z"})
+
+    created_at, row_id = app_module._decode_cursor(cursor)
+
+    assert row_id == "lecture-9"
+    assert created_at.isoformat() == "2024-01-03T00:00:00+00:00"
+
+
+def test_decode_cursor_rejects_garbage() -> None:
+    with pytest.raises(HTTPException) as excinfo:
+        app_module._decode_cursor("not-a-cursor")
+
+    assert excinfo.value.status_code == 400
+
+
+def test_keyset_page_seeks_from_cursor_without_total() -> None:
+    db = SeekDB()
+    cursor = app_module._encode_cursor({"id": "item-2", "created_at": "2024-01-02T00:00:00+00:00"})
+
+    rows, pagination = app_module._fetch_keyset_page(db, "fetch_items_before", cursor, 1, None, "course-1")
+
+    assert db.calls[0][0] == "course-1"
+    assert db.calls[0][1][1] == "item-2"
+    assert db.calls[0][2] == 1
+    assert pagination == {
+        "limit": 1,
+        "count": 1,
+        "hasMore": True,
+        "nextCursor": app_module._encode_cursor(rows[-1]),
+    }
+
+
+def test_keyset_page_rejects_cursor_with_offset() -> None:
+    with pytest.raises(HTTPException) as excinfo:
+        app_module._fetch_keyset_page(SeekDB(), "fetch_items_before", "abc", 1, 5)
+
+    assert excinfo.value.status_code == 400
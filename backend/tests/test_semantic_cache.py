@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+from pathlib import Path
+import sys
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.append(str(ROOT))
+
+from backend.semantic_cache import ExactCache, SemanticCache, cache_namespace, normalize
+
+
+def test_lookup_returns_closest_entry_above_threshold():
+    cache = SemanticCache(threshold=0.9, ttl_seconds=60, max_entries=8)
+    cache.insert("ns", normalize([1.0, 0.0]), "x-axis", now=0.0)
+    cache.insert("ns", normalize([0.0, 1.0]), "y-axis", now=0.0)
+
+    assert cache.lookup("ns", normalize([0.1, 1.0]), now=1.0) == "y-axis"
+    assert cache.lookup("ns", normalize([1.0, 1.0]), now=1.0) is None
+    assert cache.lookup("other", normalize([0.0, 1.0]), now=1.0) is None
+
+
+def test_entries_expire_after_ttl_and_respect_max_entries():
+    cache = SemanticCache(threshold=0.9, ttl_seconds=10, max_entries=2)
+    cache.insert("ns", normalize([1.0, 0.0, 0.0]), "old", now=0.0)
+    cache.insert("ns", normalize([0.0, 1.0, 0.0]), "mid", now=5.0)
+    cache.insert("ns", normalize([0.0, 0.0, 1.0]), "new", now=6.0)
+
+    assert cache.lookup("ns", normalize([1.0, 0.0, 0.0]), now=7.0) is None
+    assert cache.lookup("ns", normalize([0.0, 1.0, 0.0]), now=7.0) == "mid"
+    assert cache.lookup("ns", normalize([0.0, 1.0, 0.0]), now=15.0) is None
+    assert cache.lookup("ns", normalize([0.0, 0.0, 1.0]), now=15.0) == "new"
+
+
+def test_namespaces_are_bounded_globally_and_swept_when_expired():
+    cache = SemanticCache(threshold=0.9, ttl_seconds=10, max_entries=2, max_total_entries=3)
+    for index in range(5):
+        cache.insert(f"ns-{index}", normalize([1.0, 0.0]), f"reply-{index}", now=float(index))
+
+    assert len(cache) == 3
+    assert cache.lookup("ns-0", normalize([1.0, 0.0]), now=5.0) is None
+    assert cache.lookup("ns-2", normalize([1.0, 0.0]), now=5.0) == "reply-2"
+
+    # ns-2 was just used, so ns-3 is the least recently used namespace.
+    cache.insert("ns-5", normalize([1.0, 0.0]), "reply-5", now=5.0)
+    assert cache.lookup("ns-3", normalize([1.0, 0.0]), now=5.0) is None
+    assert cache.lookup("ns-2", normalize([1.0, 0.0]), now=5.0) == "reply-2"
+
+    # Namespaces nobody touches again still expire on the next sweep.
+    cache.insert("fresh", normalize([0.0, 1.0]), "fresh", now=20.0)
+    assert len(cache) == 1
+
+
+def test_cache_namespace_depends_on_model_context_and_recent_history():
+    history = [{"isUser": True, "text": "hi"}, {"isUser": False, "text": "hello"}]
+    namespace = cache_namespace("m", "c-1", history)
+
+    assert namespace == cache_namespace("m", "c-1", [{"isUser": True, "text": "x"}] + history)
+    assert namespace != cache_namespace("m", "c-2", history)
+    assert namespace != cache_namespace("m", "c-1", history[:1])
+    assert namespace != cache_namespace("m2", "c-1", history)
+    assert cache_namespace("a", "bc", history) != cache_namespace("ab", "c", history)
+
+
+def test_exact_cache_expires_and_evicts_least_recently_used():
+    cache = ExactCache(ttl_seconds=10, max_entries=2)
+    cache.insert("a", "A", now=0.0)
+    cache.insert("b", "B", now=0.0)
+    assert cache.lookup("a", now=1.0) == "A"
+    cache.insert("c", "C", now=1.0)
+
+    assert cache.lookup("b", now=2.0) is None
+    assert cache.lookup("a", now=2.0) == "A"
+    assert cache.lookup("a", now=10.0) is None
+    assert cache.lookup("c", now=10.0) == "C"
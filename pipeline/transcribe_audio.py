@@ -182,7 +182,10 @@ def main() -> int:
     transcript_dir = storage_root / "transcripts"
     transcript_dir.mkdir(parents=True, exist_ok=True)
     output_path = transcript_dir / f"{args.lecture_id}.json"
-    output_path.write_text(json.dumps(transcript_payload, indent=2), encoding="utf-8")
+    output_path.write_text(
+        json.dumps(transcript_payload, separators=(",", ":"), ensure_ascii=False),
+        encoding="utf-8",
+    )
 
     print(f"Wrote transcript: {output_path}")
     return 0